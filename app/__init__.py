@@ -3,48 +3,19 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from os import path
-import os
+from werkzeug.exceptions import HTTPException
 import secrets
-import logging
-import traceback
-import sys
 
 db = SQLAlchemy()
 migrate = Migrate()
 DB_NAME = "car_rental.db"
 
 def configure_logging(app):
-    # Remove all existing handlers
-    del app.logger.handlers[:]
-    
-    # Create console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.DEBUG)
-    
-    # Create file handler for errors
-    log_dir = path.join(path.dirname(path.abspath(__file__)), '..', 'logs')
-    os.makedirs(log_dir, exist_ok=True)
-    file_handler = logging.FileHandler(path.join(log_dir, 'app.log'))
-    file_handler.setLevel(logging.ERROR)
-    
-    # Create formatters
-    console_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
-    file_formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
-    )
-    
-    # Set formatters
-    console_handler.setFormatter(console_formatter)
-    file_handler.setFormatter(file_formatter)
-    
-    # Add handlers to the app logger
-    app.logger.addHandler(console_handler)
-    app.logger.addHandler(file_handler)
-    
-    # Set logging level
-    app.logger.setLevel(logging.DEBUG)
+    # Without a config object (run.py), logging is left as the caller set it up
+    if 'LOGGING_CONFIG' not in app.config:
+        return
+    from . import log_setup
+    log_setup.configure(app)
 
 def create_app(config_object=None):
     app = Flask(__name__)
@@ -73,9 +44,15 @@ def create_app(config_object=None):
         app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
     
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Pool settings follow the DB_* options unless given outright
+    from . import db_pool
+    if 'SQLALCHEMY_ENGINE_OPTIONS' not in app.config:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = db_pool.engine_options(app.config)
     
     db.init_app(app)
-    migrate.init_app(app, db)
+    # Found from any working directory, e.g. by "flask bootstrap" at deploy
+    migrate.init_app(app, db, directory=path.join(path.dirname(base_dir), 'migrations'))
 
     from .auth import auth
     from .routes import main
@@ -84,99 +61,47 @@ def create_app(config_object=None):
     # Add error handling
     @app.errorhandler(Exception)
     def handle_exception(e):
+        # HTTP errors such as a 404 are answers, not failures
+        if isinstance(e, HTTPException):
+            return e
+
         # Log the full traceback
-        app.logger.error(f"Unhandled Exception: {str(e)}")
-        app.logger.error(traceback.format_exc())
+        app.logger.exception(f"Unhandled Exception: {str(e)}")
         
         # For production, return a generic error message
         return "An internal server error occurred", 500
 
+    # No database access here: every worker runs this at boot. The schema
+    # and the admin user are prepared once per deploy by "flask bootstrap".
+    # The engine exists already but connects on first use.
+    from . import instrumentation, nplusone
     with app.app_context():
-        # Ensure database is created with comprehensive error handling
-        try:
-            # Validate database path
-            base_dir = path.abspath(path.dirname(__file__))
-            db_path = path.join(base_dir, DB_NAME)
-            
-            # Check directory permissions
-            if not path.exists(base_dir):
-                raise OSError(f"Base directory does not exist: {base_dir}")
-            
-            if not os.access(base_dir, os.W_OK):
-                raise OSError(f"No write permission for directory: {base_dir}")
-            
-            # Attempt to create database with detailed logging
-            try:
-                db.create_all()
-                app.logger.info(f"Database created successfully at {db_path}")
-            except Exception as create_error:
-                app.logger.critical(
-                    f"Failed to create database at {db_path}:\n"
-                    f"Error: {str(create_error)}\n"
-                    f"Traceback: {traceback.format_exc()}"
-                )
-                raise
-            
-            # Validate database connection
-            try:
-                # Attempt a simple query to test connection
-                from sqlalchemy import text
-                result = db.session.execute(text('SELECT 1'))
-                result.fetchone()
-                app.logger.info("Database connection test successful")
-            except Exception as connection_error:
-                app.logger.critical(
-                    f"Database connection test failed:\n"
-                    f"Error: {str(connection_error)}\n"
-                    f"Traceback: {traceback.format_exc()}"
-                )
-                raise
-            
-            # Check if admin user exists, if not create one
-            admin_email = os.environ.get('ADMIN_EMAIL', 'admin@carrent.com')
-            admin_password = os.environ.get('ADMIN_PASSWORD', 'default_admin_password')
-            
-            from .models import User
-            existing_admin = User.query.filter_by(email=admin_email).first()
-            
-            if not existing_admin:
-                try:
-                    from werkzeug.security import generate_password_hash
-                    new_admin = User(
-                        email=admin_email,
-                        name='System Administrator',
-                        password=generate_password_hash(admin_password),
-                        role='admin'
-                    )
-                    db.session.add(new_admin)
-                    db.session.commit()
-                    app.logger.info("Default admin user created successfully")
-                except Exception as admin_create_error:
-                    app.logger.error(
-                        f"Failed to create default admin user:\n"
-                        f"Error: {str(admin_create_error)}\n"
-                        f"Traceback: {traceback.format_exc()}"
-                    )
-                    db.session.rollback()
-        
-        except Exception as init_error:
-            # Critical error handling for database initialization
-            app.logger.critical(
-                f"CRITICAL DATABASE INITIALIZATION ERROR:\n"
-                f"Error: {str(init_error)}\n"
-                f"Traceback: {traceback.format_exc()}\n"
-                f"System Details:\n"
-                f"  Python Version: {sys.version}\n"
-                f"  Current Directory: {os.getcwd()}\n"
-                f"  Base Directory: {base_dir}\n"
-                f"  Database Path: {db_path}"
-            )
-            # Re-raise to prevent application startup
-            raise
+        db_pool.instrument(db.engine, app.config)
+        instrumentation.init_app(app, db.engine)
+        nplusone.init_app(app, db.engine)
 
     app.register_blueprint(auth)
     app.register_blueprint(main)
 
+    from .ledger import ledger_cli
+    app.cli.add_command(ledger_cli)
+
+    from .customer_search import search_cli
+    app.cli.add_command(search_cli)
+
+    from .dedupe import customers_cli
+    app.cli.add_command(customers_cli)
+
+    from .customer_stats import stats_cli
+    app.cli.add_command(stats_cli)
+
+    from .images import images_cli
+    app.cli.add_command(images_cli)
+
+    from .bootstrap import bootstrap_command, ensure_admin_command
+    app.cli.add_command(bootstrap_command)
+    app.cli.add_command(ensure_admin_command)
+
     login_manager = LoginManager()
     login_manager.login_view = 'auth.login'
     login_manager.init_app(app)
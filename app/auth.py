@@ -13,24 +13,17 @@ def login():
         email = request.form.get('email')
         password = request.form.get('password')
         
-        # Log detailed login attempt information
-        current_app.logger.info(f"Login attempt for email: {email}")
+        current_app.logger.debug(f"Login attempt for email: {email}")
         
         try:
             # Check if user exists
             user = User.query.filter_by(email=email).first()
             
-            # Log user query result
-            if user:
-                current_app.logger.info(f"User found: {user.email}, ID: {user.id}, Role: {user.role}")
-                current_app.logger.info(f"Stored password hash: {user.password}")
-            else:
+            if not user:
                 current_app.logger.warning(f"No user found with email: {email}")
             
-            # Detailed password verification logging
             if user:
                 password_match = check_password_hash(user.password, password)
-                current_app.logger.info(f"Password match result: {password_match}")
                 
                 if password_match:
                     # Check if user is active
@@ -41,6 +34,7 @@ def login():
                     
                     # Login user based on role
                     login_user(user, remember=True)
+                    current_app.logger.info(f"User {user.id} ({user.role}) logged in")
                     
                     # Redirect based on role
                     if user.role == 'agency':
@@ -0,0 +1,223 @@
+from . import db
+from .models import Car, Booking, Maintenance, AgencyCarStatus
+from datetime import datetime
+from itertools import groupby
+from sqlalchemy import and_, or_, exists, cast, func, literal, select, Date, DateTime, Integer
+
+# Booking statuses that hold a car for their dates
+BLOCKING_BOOKING_STATUSES = ('active', 'pending', 'confirmed')
+
+# Maintenance statuses that keep a car off the road
+BLOCKING_MAINTENANCE_STATUSES = ('pending', 'in_progress')
+
+# Rentals are charged per calendar day with both the start and the end day
+# included, so every interval below is a closed [start, end] date range.
+
+
+def _day(value):
+    return datetime(value.year, value.month, value.day)
+
+
+def rental_days(start, end):
+    """
+    Days charged for a rental from start to end, both days included.
+    """
+    return (_day(end) - _day(start)).days + 1
+
+
+def day_offset(column, first_day):
+    """
+    SQL expression for the calendar days from first_day to a datetime
+    column, as an integer (NULL for a NULL column). Interval reports read
+    tens of thousands of rows, and integers come back and add up much
+    cheaper than datetimes.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return cast(column, Date) - cast(literal(first_day, DateTime), Date)
+    return cast(
+        func.julianday(column, 'start of day') - func.julianday(literal(first_day, DateTime), 'start of day'),
+        Integer
+    )
+
+
+def booking_overlaps(start, end):
+    """
+    Predicate matching blocking bookings that overlap [start, end].
+    Served by the (car_id, end_date, start_date) index when combined with
+    a car_id filter: bookings mostly lie in the past, so end_date >= start
+    is the narrow range.
+    """
+    return and_(
+        Booking.status.in_(BLOCKING_BOOKING_STATUSES),
+        Booking.start_date <= _day(end),
+        Booking.end_date >= _day(start)
+    )
+
+
+def maintenance_overlaps(start, end):
+    """
+    Predicate matching open maintenance windows that overlap [start, end].
+    A maintenance record without an end date blocks indefinitely.
+    """
+    return and_(
+        Maintenance.status.in_(BLOCKING_MAINTENANCE_STATUSES),
+        Maintenance.start_date <= _day(end),
+        or_(Maintenance.end_date.is_(None), Maintenance.end_date >= _day(start))
+    )
+
+
+def conflicts(car_id, start, end, exclude_booking_id=None):
+    """
+    Bookings and maintenance records that keep car_id busy during [start, end].
+    Returns a (bookings, maintenance_records) pair.
+    """
+    bookings = Booking.query.filter(
+        Booking.car_id == car_id,
+        booking_overlaps(start, end)
+    )
+    if exclude_booking_id is not None:
+        bookings = bookings.filter(Booking.id != exclude_booking_id)
+
+    maintenance_records = Maintenance.query.filter(
+        Maintenance.car_id == car_id,
+        maintenance_overlaps(start, end)
+    )
+    return bookings.order_by(Booking.start_date).all(), maintenance_records.order_by(Maintenance.start_date).all()
+
+
+def car_is_free(car_id, start, end, exclude_booking_id=None):
+    """
+    Whether car_id has no blocking booking or maintenance during [start, end].
+    Runs a single EXISTS query.
+    """
+    booking_clash = db.session.query(Booking.id).filter(
+        Booking.car_id == car_id,
+        booking_overlaps(start, end)
+    )
+    if exclude_booking_id is not None:
+        booking_clash = booking_clash.filter(Booking.id != exclude_booking_id)
+
+    maintenance_clash = db.session.query(Maintenance.id).filter(
+        Maintenance.car_id == car_id,
+        maintenance_overlaps(start, end)
+    )
+
+    busy = db.session.query(
+        or_(booking_clash.exists(), maintenance_clash.exists())
+    ).scalar()
+    return not busy
+
+
+def free_cars_query(start, end):
+    """
+    Query of the cars with no blocking booking or maintenance during
+    [start, end], as anti-joins evaluated in the database.
+    """
+    booking_clash = exists().where(and_(Booking.car_id == Car.id, booking_overlaps(start, end)))
+    maintenance_clash = exists().where(and_(Maintenance.car_id == Car.id, maintenance_overlaps(start, end)))
+    return Car.query.filter(~booking_clash, ~maintenance_clash)
+
+
+# Day states of the fleet calendar, by increasing precedence
+CALENDAR_STATES = {
+    'F': 'free',
+    'A': 'agency',
+    'B': 'booked',
+    'M': 'maintenance'
+}
+
+# Largest window a single calendar request may cover
+MAX_CALENDAR_DAYS = 366
+
+
+def _paint(days, start, end, state):
+    """
+    Mark the days from offset start to offset end (None for open-ended)
+    that fall inside the window with state. States are painted in
+    increasing order of precedence, so a later one simply overwrites an
+    earlier one.
+    """
+    begin = max(start, 0)
+    stop = len(days) if end is None else min(end + 1, len(days))
+    if begin < stop:
+        days[begin:stop] = [state] * (stop - begin)
+
+
+def _segments(days):
+    """
+    Run-length encode a day list as [state, offset, length] for every
+    run that is not free.
+    """
+    segments = []
+    offset = 0
+    for state, run in groupby(days):
+        length = len(list(run))
+        if state != 'F':
+            segments.append([state, offset, length])
+        offset += length
+    return segments
+
+
+def fleet_calendar(first_day, last_day, car_ids=None):
+    """
+    Cars x days occupancy of the window [first_day, last_day].
+
+    Bookings and maintenance windows overlapping the window are fetched
+    with one range query each, as day offsets into the window. Agency
+    statuses carry no dates, so they only mark the current day. Every car
+    gets its non-free days as run-length segments rather than one entry
+    per day.
+    """
+    first_day = _day(first_day)
+    last_day = _day(last_day)
+    window = (last_day - first_day).days + 1
+    if window < 1 or window > MAX_CALENDAR_DAYS:
+        raise ValueError(f'The calendar window must cover 1 to {MAX_CALENDAR_DAYS} days.')
+
+    cars_query = select(Car.id, Car.model, Car.license_plate)
+    bookings_query = select(
+        Booking.car_id, day_offset(Booking.start_date, first_day), day_offset(Booking.end_date, first_day)
+    ).where(booking_overlaps(first_day, last_day))
+    maintenance_query = select(
+        Maintenance.car_id, day_offset(Maintenance.start_date, first_day), day_offset(Maintenance.end_date, first_day)
+    ).where(maintenance_overlaps(first_day, last_day))
+    agency_query = select(AgencyCarStatus.car_id).where(
+        AgencyCarStatus.status.in_(['booked', 'unavailable'])
+    ).distinct()
+    if car_ids is not None:
+        cars_query = cars_query.where(Car.id.in_(car_ids))
+        bookings_query = bookings_query.where(Booking.car_id.in_(car_ids))
+        maintenance_query = maintenance_query.where(Maintenance.car_id.in_(car_ids))
+        agency_query = agency_query.where(AgencyCarStatus.car_id.in_(car_ids))
+
+    # Plain row tuples: no ORM entity loading for the interval rows
+    cars = db.session.execute(cars_query.order_by(Car.display_order, Car.id)).all()
+    occupancy = {car_id: ['F'] * window for car_id, _, _ in cars}
+
+    # Painted by increasing precedence: agency, booked, maintenance
+    today = (_day(datetime.now()) - first_day).days
+    if 0 <= today < window:
+        for car_id in db.session.execute(agency_query).scalars():
+            if car_id in occupancy:
+                _paint(occupancy[car_id], today, today, 'A')
+
+    for car_id, start, end in db.session.execute(bookings_query):
+        if car_id in occupancy:
+            _paint(occupancy[car_id], start, end, 'B')
+
+    for car_id, start, end in db.session.execute(maintenance_query):
+        if car_id in occupancy:
+            _paint(occupancy[car_id], start, end, 'M')
+
+    return {
+        'from': first_day.strftime('%Y-%m-%d'),
+        'to': last_day.strftime('%Y-%m-%d'),
+        'days': window,
+        'states': CALENDAR_STATES,
+        'cars': [{
+            'id': car_id,
+            'model': model,
+            'license_plate': license_plate,
+            'segments': _segments(occupancy[car_id])
+        } for car_id, model, license_plate in cars]
+    }
@@ -0,0 +1,128 @@
+from . import storage
+from flask import current_app
+import hashlib
+import io
+import os
+import tempfile
+
+# Content-addressed upload store: every file is kept once, in the storage
+# backend (see app.storage), under the key
+# uploads/blobs/<2 hex digits>/<sha256>.<extension>. A blob never changes
+# after it is written, so it can be cached forever.
+BLOB_PREFIX = 'uploads/blobs/'
+
+# One year, the longest max-age caches honour
+MAX_AGE = 365 * 24 * 3600
+
+CHUNK_SIZE = 64 * 1024
+
+# Spellings of the same format, so identical bytes get one name
+EXTENSION_ALIASES = {
+    'jpeg': 'jpg'
+}
+
+
+def root():
+    """
+    Directory of the blobs when they are stored on local disk.
+    """
+    return os.path.join(current_app.static_folder, BLOB_PREFIX)
+
+
+def is_blob(path):
+    return bool(path) and path.startswith(BLOB_PREFIX)
+
+
+def digest(path):
+    """
+    Content hash of a blob, taken from its name; serves as its ETag.
+    """
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+class BlobWriter:
+    """
+    Incremental put_stream, for data that arrives in pieces: write()
+    chunks, then commit() to get the blob path, or abort() to drop them.
+    """
+
+    def __init__(self, extension):
+        extension = extension.lower()
+        self.extension = EXTENSION_ALIASES.get(extension, extension)
+        self.size = 0
+        self._backend = storage.get()
+        self._sha256 = hashlib.sha256()
+        fd, self._temp_path = tempfile.mkstemp(dir=self._backend.staging_dir(), suffix='.part')
+        self._temp = os.fdopen(fd, 'wb')
+
+    def write(self, chunk):
+        self._sha256.update(chunk)
+        self._temp.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        """
+        Store what was written. Returns the blob path. Content already
+        stored is not written again.
+        """
+        try:
+            self._temp.close()
+            name = self._sha256.hexdigest()
+            path = f'{BLOB_PREFIX}{name[:2]}/{name}.{self.extension}'
+            # Stored content is reused, and touched so that images.collect()
+            # keeps it until the upload reusing it is committed
+            if self._backend.touch(path):
+                os.remove(self._temp_path)
+            else:
+                self._backend.put_file(path, self._temp_path)
+        except BaseException:
+            self.abort()
+            raise
+        return path
+
+    def abort(self):
+        self._temp.close()
+        if os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+
+
+def put_stream(stream, extension):
+    """
+    Copy a binary stream into the store chunk by chunk, hashing as it goes.
+    Returns the blob path. Content already stored is not written again.
+    """
+    writer = BlobWriter(extension)
+    try:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            writer.write(chunk)
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.commit()
+
+
+def put_bytes(data, extension):
+    return put_stream(io.BytesIO(data), extension)
+
+
+def open_blob(path):
+    """
+    Binary file object with the content of a blob.
+    """
+    return storage.get().open(path)
+
+
+def delete(path):
+    storage.get().delete(path)
+
+
+def modified(path):
+    """
+    When a blob was stored or last reused, as a timestamp, or None if it
+    is gone.
+    """
+    return storage.get().modified(path)
+
+
+def url(path):
+    return storage.get().url(path)
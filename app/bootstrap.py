@@ -0,0 +1,114 @@
+from . import db, customer_search
+from .models import User
+from flask import current_app
+from sqlalchemy import inspect
+from werkzeug.security import generate_password_hash
+import click
+import os
+
+DEFAULT_ADMIN_EMAIL = 'admin@carrent.com'
+DEFAULT_ADMIN_EMPLOYEE_ID = 'ADMIN001'
+
+
+def schema_state():
+    """
+    'versioned' when the database is managed by the migrations, 'empty'
+    when it has no tables yet, 'unversioned' when its tables were made
+    without them (by db.create_all() at startup, in older releases).
+    """
+    tables = set(inspect(db.engine).get_table_names())
+    if 'alembic_version' in tables:
+        return 'versioned'
+    return 'unversioned' if tables else 'empty'
+
+
+def prepare_schema():
+    """
+    Bring the database schema up to date. Returns what was done.
+    """
+    from flask_migrate import upgrade, stamp
+
+    state = schema_state()
+    if state == 'versioned':
+        upgrade()
+        return 'upgraded'
+    if state == 'unversioned':
+        raise click.ClickException(
+            'The database has tables but no migration history, so it is unclear which migrations '
+            'it needs. Run "flask db stamp <revision>" with the revision matching its schema, '
+            'then "flask db upgrade".'
+        )
+
+    # A new database gets the current schema at once, then the name index
+    # the models do not describe ("flask search rebuild" redoes it)
+    db.create_all()
+    stamp()
+    customer_search.rebuild()
+    return 'created'
+
+
+def ensure_admin(email, password, employee_id=DEFAULT_ADMIN_EMPLOYEE_ID):
+    """
+    Create the admin user unless a user with that email exists.
+    Returns (user, whether it was created).
+    """
+    user = User.query.filter_by(email=email).first()
+    if user is not None:
+        return user, False
+    if not password:
+        raise ValueError('A password is required to create the admin user.')
+
+    user = User(
+        email=email,
+        name='System Administrator',
+        password=generate_password_hash(password),
+        employee_id=employee_id,
+        role='admin',
+        is_admin=True
+    )
+    db.session.add(user)
+    db.session.commit()
+    current_app.logger.info(f"Admin user {email} created")
+    return user, True
+
+
+def _admin_settings():
+    return (
+        os.environ.get('ADMIN_EMAIL', DEFAULT_ADMIN_EMAIL),
+        os.environ.get('ADMIN_PASSWORD'),
+        os.environ.get('ADMIN_EMPLOYEE_ID', DEFAULT_ADMIN_EMPLOYEE_ID)
+    )
+
+
+@click.command('bootstrap')
+def bootstrap_command():
+    """Prepare the database before the app starts: schema and admin user.
+
+    Run once per deploy (it is the render.yaml pre-deploy command), not
+    in every worker. Safe to run again.
+    """
+    result = prepare_schema()
+    click.echo('Database schema created.' if result == 'created' else 'Database schema up to date.')
+
+    email, password, employee_id = _admin_settings()
+    if password:
+        _, created = ensure_admin(email, password, employee_id)
+        click.echo(f'Admin user {email} created.' if created else f'Admin user {email} exists.')
+    elif User.query.filter_by(email=email).first() is None:
+        click.echo(f'No admin user {email}: set ADMIN_PASSWORD or run "flask ensure-admin".')
+
+
+@click.command('ensure-admin')
+@click.option('--email', default=lambda: _admin_settings()[0], show_default='ADMIN_EMAIL or admin@carrent.com')
+@click.option('--employee-id', default=lambda: _admin_settings()[2], show_default='ADMIN_EMPLOYEE_ID or ADMIN001')
+def ensure_admin_command(email, employee_id):
+    """Create the admin user if it does not exist.
+
+    The password comes from ADMIN_PASSWORD, or is asked for.
+    """
+    if User.query.filter_by(email=email).first() is not None:
+        click.echo(f'Admin user {email} exists.')
+        return
+    password = _admin_settings()[1] or click.prompt('Admin password', hide_input=True, confirmation_prompt=True)
+    ensure_admin(email, password, employee_id)
+    click.echo(f'Admin user {email} created.')
@@ -0,0 +1,92 @@
+from . import db
+from .models import Car
+from sqlalchemy import case, func, update
+
+# Cars are listed by display_order, spaced this far apart so that a car
+# moved between two others can take a value in between and be the only
+# row written. The spacing is restored by renumbering once a gap is used
+# up, which takes log2(ORDER_GAP) moves into the same spot.
+ORDER_GAP = 1024
+
+
+def next_position():
+    """
+    display_order for a car added at the end of the list.
+    """
+    last = db.session.query(func.max(Car.display_order)).scalar()
+    return (last or 0) + ORDER_GAP
+
+
+def apply(car_ids):
+    """
+    Put the given cars in this order, ORDER_GAP apart, with a single
+    UPDATE ... CASE statement. Ids of cars that do not exist are ignored.
+    The change joins the caller's transaction; nothing is committed here.
+    """
+    car_ids = [int(car_id) for car_id in car_ids]
+    if not car_ids:
+        return
+    positions = {car_id: index * ORDER_GAP for index, car_id in enumerate(car_ids, start=1)}
+    db.session.execute(
+        update(Car).where(Car.id.in_(list(positions))).values(
+            display_order=case(positions, value=Car.id)
+        ),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def _ordered_ids():
+    return [row[0] for row in db.session.query(Car.id).order_by(Car.display_order, Car.id).all()]
+
+
+def move(car_id, after_id=None, before_id=None):
+    """
+    Place a car between its new neighbours: after after_id and before
+    before_id, where None stands for the start or the end of the list.
+    Normally only the moved car is written; when no value is left between
+    the neighbours, or a neighbour has no display_order yet, the whole
+    list is renumbered in one statement. Returns False if a car does not
+    exist; raises ValueError for a car placed next to itself. Nothing is
+    committed here.
+    """
+    if car_id in (after_id, before_id) or (after_id is not None and after_id == before_id):
+        raise ValueError('A car cannot be placed next to itself.')
+
+    car_ids = {car_id} | {neighbour for neighbour in (after_id, before_id) if neighbour is not None}
+    positions = dict(
+        db.session.query(Car.id, Car.display_order).filter(Car.id.in_(car_ids)).all()
+    )
+    if len(positions) < len(car_ids):
+        return False
+
+    low = positions[after_id] if after_id is not None else None
+    high = positions[before_id] if before_id is not None else None
+    if (after_id is not None and low is None) or (before_id is not None and high is None):
+        # A neighbour without a position has nothing to fit between
+        position = None
+    elif after_id is None and before_id is None:
+        return True
+    elif after_id is None:
+        position = high - ORDER_GAP
+    elif before_id is None:
+        position = low + ORDER_GAP
+    elif high - low > 1:
+        position = (low + high) // 2
+    else:
+        position = None
+
+    if position is not None:
+        db.session.execute(
+            update(Car).where(Car.id == car_id).values(display_order=position),
+            execution_options={'synchronize_session': False}
+        )
+        return True
+
+    # The neighbours are adjacent, tied or unplaced: lay the list out again
+    ordered = [other for other in _ordered_ids() if other != car_id]
+    if before_id is not None:
+        ordered.insert(ordered.index(before_id), car_id)
+    else:
+        ordered.insert(ordered.index(after_id) + 1, car_id)
+    apply(ordered)
+    return True
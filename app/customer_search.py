@@ -0,0 +1,257 @@
+from . import db
+from .models import Customer
+from .normalization import normalize_phone, normalize_document
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import event, text, case, and_, or_, func
+import click
+import re
+
+# Queries shorter than this return nothing rather than half the table
+MIN_QUERY_LENGTH = 2
+
+# SQLite full-text index over customer names, kept in sync by triggers.
+# PostgreSQL uses a pg_trgm GIN index on customer.name instead (see the
+# add_customer_search_index migration).
+FTS_STATEMENTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS customer_fts USING fts5("
+    "name, content='customer', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS customer_fts_ai AFTER INSERT ON customer BEGIN "
+    "INSERT INTO customer_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS customer_fts_ad AFTER DELETE ON customer BEGIN "
+    "INSERT INTO customer_fts(customer_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS customer_fts_au AFTER UPDATE OF name ON customer BEGIN "
+    "INSERT INTO customer_fts(customer_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO customer_fts(rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO customer_fts(customer_fts) VALUES ('rebuild')"
+)
+
+# PostgreSQL name index, also created by the add_customer_search_index
+# migration
+TRGM_STATEMENTS = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_customer_name_trgm ON customer USING gin (name gin_trgm_ops)"
+)
+
+# Engines known to have their name index (the FTS table, or pg_trgm); a
+# missing one is re-checked on every search so that building it later
+# takes effect without a restart
+_name_index_engines = set()
+
+
+def refresh_keys(customer):
+    customer.phone_key = normalize_phone(customer.phone)
+    customer.license_key = normalize_document(customer.license_number)
+    customer.nin_key = normalize_document(customer.nin_passport_number)
+
+
+@event.listens_for(Customer, 'before_insert')
+@event.listens_for(Customer, 'before_update')
+def _refresh_keys(mapper, connection, customer):
+    refresh_keys(customer)
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def _startswith(column, prefix):
+    """
+    Index-friendly prefix predicate. PostgreSQL serves LIKE 'prefix%' from
+    the text_pattern_ops indexes; SQLite's LIKE is case-insensitive and
+    skips plain indexes, so it gets an equivalent range comparison.
+    """
+    if _dialect() == 'postgresql':
+        return column.like(f'{prefix}%')
+    return and_(column >= prefix, column < prefix + '\U0010ffff')
+
+
+def fts_available():
+    """
+    Whether the SQLite FTS5 name index exists in the current database.
+    """
+    if _dialect() != 'sqlite':
+        return False
+    if db.engine in _name_index_engines:
+        return True
+    found = db.session.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'customer_fts'"
+    )).first() is not None
+    if found:
+        _name_index_engines.add(db.engine)
+    return found
+
+
+def trgm_available():
+    """
+    Whether the PostgreSQL pg_trgm extension, which ranks and indexes the
+    name search, is installed in the current database.
+    """
+    if _dialect() != 'postgresql':
+        return False
+    if db.engine in _name_index_engines:
+        return True
+    found = db.session.execute(text(
+        "SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'"
+    )).first() is not None
+    if found:
+        _name_index_engines.add(db.engine)
+    return found
+
+
+def find_by_identity(phone=None, nin_passport_number=None):
+    """
+    Customers whose normalized phone or NIN/passport number equals the
+    given values, by indexed equality lookups. Returns (by_nin, by_phone),
+    either of which may be None.
+    """
+    by_nin = by_phone = None
+    nin = normalize_document(nin_passport_number)
+    if nin:
+        by_nin = Customer.query.filter(Customer.nin_key == nin).first()
+    phone = normalize_phone(phone)
+    if phone:
+        by_phone = Customer.query.filter(Customer.phone_key == phone).first()
+    return by_nin, by_phone
+
+
+def _key_matches(query, limit):
+    """
+    Ids of customers whose phone, licence or ID number starts with the
+    query, exact matches first.
+    """
+    phone = normalize_phone(query) if sum(char.isdigit() for char in query) >= MIN_QUERY_LENGTH else None
+    document = normalize_document(query)
+    conditions = []
+    exact = []
+    if phone:
+        conditions.append(_startswith(Customer.phone_key, phone))
+        exact.append(Customer.phone_key == phone)
+    # Plain words are names, not document numbers
+    if document and any(char.isdigit() for char in document):
+        conditions.append(_startswith(Customer.license_key, document))
+        conditions.append(_startswith(Customer.nin_key, document))
+        exact.extend([Customer.license_key == document, Customer.nin_key == document])
+    if not conditions:
+        return []
+
+    rows = db.session.query(Customer.id).filter(or_(*conditions)).order_by(
+        case((or_(*exact), 0), else_=1),
+        Customer.name
+    ).limit(limit).all()
+    return [row[0] for row in rows]
+
+
+def _name_matches(query, limit):
+    """
+    Ids of customers whose name matches the query, best match first.
+    """
+    if trgm_available():
+        # Served by the pg_trgm GIN index and ranked by trigram similarity
+        pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        rows = db.session.query(Customer.id).filter(
+            Customer.name.ilike(pattern, escape='\\')
+        ).order_by(func.similarity(Customer.name, query).desc(), Customer.id).limit(limit).all()
+        return [row[0] for row in rows]
+
+    if fts_available():
+        # Every word must match as a prefix; bm25 ranks the hits
+        words = re.findall(r'\w+', query)
+        if not words:
+            return []
+        match = ' '.join(f'"{word}"*' for word in words)
+        rows = db.session.execute(
+            text('SELECT rowid FROM customer_fts WHERE customer_fts MATCH :match ORDER BY rank LIMIT :limit'),
+            {'match': match, 'limit': limit}
+        ).all()
+        return [row[0] for row in rows]
+
+    # Without a name index, fall back to a capped substring scan
+    rows = db.session.query(Customer.id).filter(
+        Customer.name.icontains(query, autoescape=True)
+    ).order_by(Customer.name).limit(limit).all()
+    return [row[0] for row in rows]
+
+
+def search(query, limit=None):
+    """
+    Customers matching query. A complete phone or NIN/passport number
+    returns its customer through an equality lookup; otherwise results are
+    ranked: exact licence matches, then number prefix matches, then name
+    matches. At most limit customers are returned (CUSTOMER_SEARCH_LIMIT
+    by default).
+    """
+    query = (query or '').strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+    if limit is None:
+        limit = current_app.config.get('CUSTOMER_SEARCH_LIMIT', 10)
+
+    # A complete phone or NIN/passport number is a unique key
+    if any(char.isdigit() for char in query):
+        by_nin, by_phone = find_by_identity(phone=query, nin_passport_number=query)
+        if by_nin or by_phone:
+            return [by_nin] if by_nin is by_phone else [customer for customer in (by_nin, by_phone) if customer]
+
+    ranked = []
+    for customer_id in _key_matches(query, limit) + _name_matches(query, limit):
+        if customer_id not in ranked:
+            ranked.append(customer_id)
+    ranked = ranked[:limit]
+    if not ranked:
+        return []
+
+    customers = {c.id: c for c in Customer.query.filter(Customer.id.in_(ranked)).all()}
+    return [customers[customer_id] for customer_id in ranked if customer_id in customers]
+
+
+def rebuild():
+    """
+    Recompute every customer's search keys and, on SQLite, (re)build the
+    FTS5 name index; on PostgreSQL, create the trigram name index if it is
+    missing. Returns (customers updated, whether FTS is in use).
+    """
+    rows = db.session.query(
+        Customer.id, Customer.phone, Customer.license_number, Customer.nin_passport_number
+    ).all()
+    keys = [{
+        'id': customer_id,
+        'phone_key': normalize_phone(phone),
+        'license_key': normalize_document(license_number),
+        'nin_key': normalize_document(nin_passport_number)
+    } for customer_id, phone, license_number, nin_passport_number in rows]
+    db.session.bulk_update_mappings(Customer, keys)
+
+    fts = False
+    if _dialect() == 'postgresql':
+        try:
+            with db.session.begin_nested():
+                for statement in TRGM_STATEMENTS:
+                    db.session.execute(text(statement))
+        except Exception as e:
+            # Servers without the pg_trgm extension search names by scan
+            current_app.logger.warning(f"pg_trgm is unavailable, customer names are searched by scan: {str(e)}")
+    elif _dialect() == 'sqlite':
+        try:
+            with db.session.begin_nested():
+                for statement in FTS_STATEMENTS:
+                    db.session.execute(text(statement))
+            fts = True
+        except Exception as e:
+            # SQLite builds without FTS5 keep using the substring fallback
+            current_app.logger.warning(f"FTS5 is unavailable, customer names are searched by scan: {str(e)}")
+
+    db.session.commit()
+    return len(rows), fts
+
+
+search_cli = AppGroup('search', help='Maintain the customer search index.')
+
+
+@search_cli.command('rebuild')
+def rebuild_command():
+    """Recompute customer search keys and rebuild the name index."""
+    count, fts = rebuild()
+    click.echo(f'Search keys rebuilt for {count} customers.')
+    if _dialect() == 'sqlite':
+        click.echo('FTS5 name index rebuilt.' if fts else 'FTS5 is unavailable; names are searched by scan.')
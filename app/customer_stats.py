@@ -0,0 +1,180 @@
+from . import db
+from .models import Booking, Customer, CustomerStats
+from flask.cli import AppGroup
+from sqlalchemy import event, func, case, or_, select, insert, update, delete, inspect
+import click
+
+# Bookings in this status count towards active_booking_count
+ACTIVE_BOOKING_STATUS = 'active'
+
+# Amounts closer than this are considered equal by the consistency checker
+TOLERANCE = 0.005
+
+
+@event.listens_for(Customer, 'after_insert')
+def _create_stats(mapper, connection, customer):
+    # Every customer gets a row, so client lists can sort from its indexes
+    connection.execute(insert(CustomerStats.__table__).values(customer_id=customer.id))
+
+
+def record_booking(booking, sign=1):
+    """
+    Add the booking to its customer's stats, or remove it with sign=-1.
+    The counters move in one UPDATE, so concurrent bookings of the same
+    customer do not overwrite each other. The booking must be flushed;
+    remove it before changing or deleting it. The change joins the
+    caller's transaction; nothing is committed here.
+    """
+    stats = CustomerStats.__table__.c
+    if sign > 0:
+        last_booking_at = case(
+            (or_(stats.last_booking_at.is_(None), stats.last_booking_at < booking.created_at), booking.created_at),
+            else_=stats.last_booking_at
+        )
+    else:
+        # The newest of the customer's other bookings
+        last_booking_at = select(func.max(Booking.created_at)).where(
+            Booking.customer_id == booking.customer_id,
+            Booking.id != booking.id
+        ).scalar_subquery()
+
+    db.session.execute(
+        update(CustomerStats.__table__).where(stats.customer_id == booking.customer_id).values(
+            booking_count=stats.booking_count + sign,
+            total_spent=stats.total_spent + sign * (booking.total_cost or 0),
+            last_booking_at=last_booking_at,
+            active_booking_count=stats.active_booking_count + (sign if booking.status == ACTIVE_BOOKING_STATUS else 0)
+        )
+    )
+
+
+def _booking_aggregates(customer_ids=None):
+    """
+    Stats of every customer with bookings, grouped from the booking table.
+    Returns {customer_id: (count, total spent, last booking at, active count)}.
+    """
+    query = db.session.query(
+        Booking.customer_id,
+        func.count(Booking.id),
+        func.coalesce(func.sum(Booking.total_cost), 0),
+        func.max(Booking.created_at),
+        func.coalesce(func.sum(case((Booking.status == ACTIVE_BOOKING_STATUS, 1), else_=0)), 0)
+    )
+    if customer_ids is not None:
+        query = query.filter(Booking.customer_id.in_(customer_ids))
+    return {
+        row[0]: (row[1], float(row[2]), row[3], row[4])
+        for row in query.group_by(Booking.customer_id).all()
+    }
+
+
+def _rows(customer_ids, aggregates):
+    rows = []
+    for customer_id in customer_ids:
+        count, spent, last_at, active = aggregates.get(customer_id, (0, 0.0, None, 0))
+        rows.append({
+            'customer_id': customer_id,
+            'booking_count': count,
+            'total_spent': spent,
+            'last_booking_at': last_at,
+            'active_booking_count': active
+        })
+    return rows
+
+
+def installed():
+    """
+    Whether the customer_stats table exists. It does not until its
+    migration has run, which fills it from the bookings; jobs allowed to
+    run before that, like the customer dedupe, skip the stats then.
+    """
+    return inspect(db.engine).has_table(CustomerStats.__tablename__)
+
+
+def discard(customer_ids):
+    """
+    Delete the stats rows of customers about to be deleted in bulk.
+    """
+    db.session.execute(
+        delete(CustomerStats).where(CustomerStats.customer_id.in_(customer_ids)),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def refresh(customer_ids):
+    """
+    Recompute the stats rows of the given customers from their bookings,
+    e.g. after bookings were moved between customers in bulk. The change
+    joins the caller's transaction; nothing is committed here.
+    """
+    if not customer_ids:
+        return
+    discard(customer_ids)
+    db.session.execute(insert(CustomerStats), _rows(customer_ids, _booking_aggregates(customer_ids)))
+
+
+def rebuild():
+    """
+    Recompute the stats of every customer from the bookings.
+    Returns the number of stats rows written.
+    """
+    CustomerStats.query.delete()
+    customer_ids = [row[0] for row in db.session.query(Customer.id).all()]
+    rows = _rows(customer_ids, _booking_aggregates())
+    if rows:
+        db.session.execute(insert(CustomerStats), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def check():
+    """
+    Compare the stats rows against the bookings.
+    Returns a list of (customer_id, expected, actual) tuples for every
+    customer that differs, where expected and actual are (count, spent,
+    last booking at, active count) tuples, or None for a missing row.
+    """
+    customer_ids = [row[0] for row in db.session.query(Customer.id).all()]
+    expected = {row['customer_id']: tuple(row.values())[1:] for row in _rows(customer_ids, _booking_aggregates())}
+
+    actual = {}
+    for row in db.session.query(
+        CustomerStats.customer_id,
+        CustomerStats.booking_count,
+        CustomerStats.total_spent,
+        CustomerStats.last_booking_at,
+        CustomerStats.active_booking_count
+    ).all():
+        actual[row[0]] = tuple(row[1:])
+
+    drift = []
+    for customer_id in sorted(set(expected) | set(actual)):
+        want = expected.get(customer_id)
+        have = actual.get(customer_id)
+        if want is None or have is None:
+            drift.append((customer_id, want, have))
+        elif (want[0] != have[0] or abs(want[1] - have[1]) > TOLERANCE
+                or want[2] != have[2] or want[3] != have[3]):
+            drift.append((customer_id, want, have))
+    return drift
+
+
+stats_cli = AppGroup('customer-stats', help='Maintain the per-customer booking stats.')
+
+
+@stats_cli.command('rebuild')
+def rebuild_command():
+    """Rebuild every customer's stats from the bookings."""
+    count = rebuild()
+    click.echo(f'Customer stats rebuilt for {count} customers.')
+
+
+@stats_cli.command('check')
+def check_command():
+    """Report customers whose stats drifted from their bookings."""
+    drift = check()
+    for customer_id, want, have in drift:
+        click.echo(f'customer {customer_id}: expected {want}, stored {have}')
+    if drift:
+        raise click.ClickException(f'{len(drift)} customer stats rows are out of date. Run "flask customer-stats rebuild".')
+    click.echo('Customer stats are consistent.')
@@ -0,0 +1,142 @@
+from flask import has_request_context
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+import os
+import threading
+import time
+
+
+class PoolStats:
+    """
+    Connection pool counters of this process. Each gunicorn worker has
+    its own pool, so every scrape reports one worker (see the pid label).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def add(self, counter, amount=1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.wait_count += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+
+stats = PoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited for a connection,
+    including the time to open a new one.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            stats.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        except Exception:
+            # The pool had room but the database refused or dropped the
+            # new connection: a failure, not a wait for the pool
+            stats.record_wait(time.perf_counter() - started)
+            raise
+        stats.record_wait(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(config):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS built from the DB_* settings of a config.
+    Connections are tested with a cheap ping when checked out, so broken
+    ones are replaced before a request uses them.
+    """
+    options = {'pool_pre_ping': config.get('DB_POOL_PRE_PING', True)}
+    url = make_url(config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        # In-memory SQLite lives in a single connection; nothing to pool
+        return options
+
+    options.update({
+        'poolclass': TimedQueuePool,
+        'pool_size': config.get('DB_POOL_SIZE', 15),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 0),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': config.get('DB_POOL_RECYCLE', 1800)
+    })
+    if url.get_backend_name() == 'postgresql':
+        options['connect_args'] = {'connect_timeout': config.get('DB_CONNECT_TIMEOUT', 5)}
+    return options
+
+
+def instrument(engine, config):
+    """
+    Count the pool's connections and, on PostgreSQL, bound the statements
+    of web requests by DB_STATEMENT_TIMEOUT_MS. Command-line jobs such as
+    migrations and rebuilds are not limited.
+    """
+    @event.listens_for(engine, 'connect')
+    def _connect(dbapi_connection, connection_record):
+        stats.add('connects')
+
+    @event.listens_for(engine, 'checkout')
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.add('checkouts')
+
+    @event.listens_for(engine, 'invalidate')
+    def _invalidate(dbapi_connection, connection_record, exception):
+        stats.add('invalidations')
+
+    timeout = config.get('DB_STATEMENT_TIMEOUT_MS', 0)
+    if timeout and engine.dialect.name == 'postgresql':
+        @event.listens_for(engine, 'begin')
+        def _statement_timeout(connection):
+            # SET LOCAL ends with the transaction, so pooled connections
+            # go back to the server default
+            if has_request_context():
+                connection.exec_driver_sql(f'SET LOCAL statement_timeout = {int(timeout)}')
+
+
+def prometheus_text(engine):
+    """
+    The pool gauges and counters in the Prometheus text format.
+    """
+    pool = engine.pool
+    labels = f'{{pid="{os.getpid()}"}}'
+    lines = []
+
+    def metric(name, kind, help_text, value):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.append(f'{name}{labels} {value}')
+
+    if isinstance(pool, QueuePool):
+        metric('db_pool_size', 'gauge', 'Connections the pool keeps open.', pool.size())
+        metric('db_pool_checked_out', 'gauge', 'Connections in use.', pool.checkedout())
+        metric('db_pool_checked_in', 'gauge', 'Idle connections in the pool.', pool.checkedin())
+        # Negative while the pool has not opened all of its connections yet
+        metric('db_pool_overflow', 'gauge', 'Connections open beyond the pool size.', max(pool.overflow(), 0))
+    metric('db_pool_connects_total', 'counter', 'Connections opened.', stats.connects)
+    metric('db_pool_checkouts_total', 'counter', 'Connections handed out.', stats.checkouts)
+    metric('db_pool_invalidations_total', 'counter', 'Connections found broken and discarded.', stats.invalidations)
+    metric('db_pool_timeouts_total', 'counter', 'Checkouts that gave up waiting for a connection.', stats.timeouts)
+    metric('db_pool_wait_seconds_total', 'counter', 'Time spent waiting for connections.', f'{stats.wait_seconds_total:.6f}')
+    metric('db_pool_wait_seconds_count', 'counter', 'Checkouts that waited on the pool.', stats.wait_count)
+    metric('db_pool_wait_seconds_max', 'gauge', 'Longest wait for a connection.', f'{stats.wait_seconds_max:.6f}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,167 @@
+from . import db, customer_stats
+from .models import Customer, Booking
+from flask.cli import AppGroup
+from .normalization import normalize_phone, normalize_document, normalize_email
+from sqlalchemy import func, update, delete
+import click
+
+# Duplicate groups merged per transaction
+DEFAULT_CHUNK_SIZE = 500
+
+
+def find_duplicate_groups():
+    """
+    Groups of customer ids that share a normalized phone, NIN/passport or
+    email, transitively: two customers sharing a phone and a third sharing
+    an email with either of them form one group.
+
+    Keys are normalized here from the raw columns rather than read from
+    the stored key columns, so the job also finds the duplicates that keep
+    the unique key indexes from being built. Each group is a list of ids,
+    most complete record first, and that record is kept by merge().
+    """
+    rows = db.session.query(
+        Customer.id,
+        Customer.phone,
+        Customer.nin_passport_number,
+        Customer.email,
+        func.length(Customer.name),
+        func.coalesce(func.length(Customer.email), 0),
+        func.coalesce(func.length(Customer.address), 0)
+    ).yield_per(5000)
+
+    # Union-find over the customers, joined through every shared key
+    parent = {}
+
+    def find(customer_id):
+        while parent[customer_id] != customer_id:
+            parent[customer_id] = parent[parent[customer_id]]
+            customer_id = parent[customer_id]
+        return customer_id
+
+    first_with_key = {}
+    completeness = {}
+    for customer_id, phone, nin, email, name_length, email_length, address_length in rows:
+        parent[customer_id] = customer_id
+        # Same ordering as the original merge: longest name, email, address
+        completeness[customer_id] = (-(name_length or 0), -email_length, -address_length, customer_id)
+        keys = (
+            ('phone', normalize_phone(phone)),
+            ('nin', normalize_document(nin)),
+            ('email', normalize_email(email))
+        )
+        for key in keys:
+            if key[1] is None:
+                continue
+            if key in first_with_key:
+                parent[find(customer_id)] = find(first_with_key[key])
+            else:
+                first_with_key[key] = customer_id
+
+    groups = {}
+    for customer_id in parent:
+        groups.setdefault(find(customer_id), []).append(customer_id)
+
+    return [
+        sorted(members, key=completeness.__getitem__)
+        for members in groups.values() if len(members) > 1
+    ]
+
+
+def _merge_group(primary_id, secondary_ids, stats=True):
+    """
+    Fold secondary_ids into primary_id with set-based statements: one
+    UPDATE re-points the bookings, missing contact details are copied from
+    the secondaries and the secondaries are deleted, with their stats
+    unless stats is false.
+    """
+    db.session.execute(
+        update(Booking).where(Booking.customer_id.in_(secondary_ids)).values(customer_id=primary_id)
+    )
+
+    contacts = {
+        customer_id: (email, address)
+        for customer_id, email, address in db.session.query(
+            Customer.id, Customer.email, Customer.address
+        ).filter(Customer.id.in_([primary_id] + secondary_ids)).all()
+    }
+    email, address = contacts[primary_id]
+    for customer_id in secondary_ids:
+        email = email or contacts[customer_id][0]
+        address = address or contacts[customer_id][1]
+
+    # Delete first so a copied email does not clash with its unique constraint
+    if stats:
+        customer_stats.discard(secondary_ids)
+    db.session.execute(
+        delete(Customer).where(Customer.id.in_(secondary_ids)),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.execute(
+        update(Customer).where(Customer.id == primary_id).values(email=email, address=address),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def merge(groups, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+    """
+    Merge every duplicate group into its first member, committing once per
+    chunk_size groups so a large run neither holds one huge transaction
+    nor commits per row. Returns a report dict with groups, customers
+    merged and bookings moved; with dry_run nothing is written.
+    """
+    secondary_ids = [customer_id for group in groups for customer_id in group[1:]]
+    report = {
+        'groups': len(groups),
+        'customers_merged': len(secondary_ids),
+        'bookings_moved': 0
+    }
+
+    # Count the bookings that will move, in chunks to bound the IN lists
+    for start in range(0, len(secondary_ids), chunk_size):
+        chunk = secondary_ids[start:start + chunk_size]
+        report['bookings_moved'] += db.session.query(func.count(Booking.id)).filter(
+            Booking.customer_id.in_(chunk)
+        ).scalar()
+
+    if dry_run:
+        return report
+
+    # The unique key migration asks for this job before the stats table
+    # exists; its own migration computes the stats from the merged rows
+    stats = customer_stats.installed()
+    for start in range(0, len(groups), chunk_size):
+        try:
+            chunk = groups[start:start + chunk_size]
+            for group in chunk:
+                _merge_group(group[0], group[1:], stats)
+            if stats:
+                # The kept customers now own the moved bookings
+                customer_stats.refresh([group[0] for group in chunk])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    return report
+
+
+customers_cli = AppGroup('customers', help='Maintain customer records.')
+
+
+@customers_cli.command('dedupe')
+@click.option('--dry-run', is_flag=True, help='Report the duplicates without merging them.')
+@click.option('--chunk-size', default=DEFAULT_CHUNK_SIZE, show_default=True,
+              help='Duplicate groups merged per transaction.')
+@click.option('--verbose', is_flag=True, help='List every duplicate group.')
+def dedupe_command(dry_run, chunk_size, verbose):
+    """Merge customers sharing a phone, NIN/passport or email."""
+    groups = find_duplicate_groups()
+    if verbose:
+        for group in groups:
+            click.echo(f'keep {group[0]}, merge {", ".join(str(customer_id) for customer_id in group[1:])}')
+
+    report = merge(groups, chunk_size=chunk_size, dry_run=dry_run)
+    verb = 'Would merge' if dry_run else 'Merged'
+    click.echo(f'{verb} {report["customers_merged"]} customers in {report["groups"]} groups, '
+               f'moving {report["bookings_moved"]} bookings.')
@@ -0,0 +1,175 @@
+from . import db
+from .models import Car, CarImage, Booking, Customer, User, AgencyVisibleCar, AgencyCarStatus
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import func
+import json
+import threading
+import time
+
+
+class FleetStatus:
+    """
+    Per-car availability board shown on the home page.
+
+    The snapshot is computed with a single query and cached in-process.
+    Write paths that change bookings, maintenance, agency statuses or cars
+    call invalidate(); the FLEET_STATUS_TTL setting (seconds) bounds how
+    long another worker process can serve a snapshot it was not told about.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._built_at = 0.0
+        # Bumped by every invalidate(), so that a build overlapping one is
+        # not stored
+        self._generation = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._generation += 1
+
+    def snapshot(self):
+        """
+        Return {'cars': [...], 'booked_count': n}, building it if needed.
+        Cars are plain dicts ordered by display_order.
+        """
+        ttl = current_app.config.get('FLEET_STATUS_TTL', 30)
+        with self._lock:
+            if self._snapshot is not None and time.monotonic() - self._built_at < ttl:
+                return self._snapshot
+            generation = self._generation
+
+        snapshot = self._build()
+
+        with self._lock:
+            # An invalidate() during the build may have come after the rows
+            # were read; the board is still returned, but the next request
+            # builds a fresh one
+            if self._generation == generation:
+                self._snapshot = snapshot
+                self._built_at = time.monotonic()
+        return snapshot
+
+    def for_agency(self, agency_id):
+        """
+        The snapshot restricted to the cars visible to one agency.
+        """
+        snapshot = self.snapshot()
+        visible_car_ids = {
+            row[0] for row in db.session.query(AgencyVisibleCar.car_id)
+            .filter(AgencyVisibleCar.agency_id == agency_id).all()
+        }
+        return {
+            'cars': [car for car in snapshot['cars'] if car['id'] in visible_car_ids],
+            'booked_count': snapshot['booked_count']
+        }
+
+    def _build(self):
+        # Started active bookings made by admins or managers
+        active_bookings = db.session.query(
+            Booking.car_id.label('car_id'),
+            Customer.name.label('customer_name'),
+            Booking.start_date.label('start_date'),
+            Booking.end_date.label('end_date'),
+            User.role.label('booked_by_role')
+        ).join(Customer, Customer.id == Booking.customer_id).join(
+            User, User.id == Booking.employee_id
+        ).filter(
+            Booking.status == 'active',
+            Booking.start_date <= datetime.now(),
+            User.role.in_(['admin', 'manager'])
+        ).subquery()
+
+        # Agency statuses that override the default availability
+        agency_statuses = db.session.query(
+            AgencyCarStatus.car_id.label('car_id'),
+            func.min(AgencyCarStatus.status).label('status')
+        ).filter(
+            AgencyCarStatus.status.in_(['booked', 'unavailable'])
+        ).group_by(AgencyCarStatus.car_id).subquery()
+
+        # Fallback picture for cars without a main image
+        first_image = db.session.query(CarImage.image_path).filter(
+            CarImage.car_id == Car.id
+        ).order_by(CarImage.id).limit(1).correlate(Car).scalar_subquery()
+        image = func.coalesce(Car.main_image, first_image)
+
+        # Resized variants of that picture
+        image_variants = db.session.query(CarImage.variants).filter(
+            CarImage.car_id == Car.id,
+            CarImage.image_path == image
+        ).order_by(CarImage.id).limit(1).scalar_subquery()
+
+        rows = db.session.query(
+            Car.id,
+            Car.model,
+            Car.year,
+            Car.license_plate,
+            Car.daily_rate,
+            Car.category,
+            Car.description,
+            Car.features,
+            Car.is_available,
+            image,
+            image_variants,
+            active_bookings.c.customer_name,
+            active_bookings.c.start_date,
+            active_bookings.c.end_date,
+            active_bookings.c.booked_by_role,
+            agency_statuses.c.status
+        ).outerjoin(
+            active_bookings, active_bookings.c.car_id == Car.id
+        ).outerjoin(
+            agency_statuses, agency_statuses.c.car_id == Car.id
+        ).order_by(Car.display_order, Car.id).all()
+
+        cars = []
+        seen = set()
+        booked_count = 0
+        for row in rows:
+            (car_id, model, year, license_plate, daily_rate, category, description,
+             features, is_available, image, image_variants, customer_name, start_date, end_date,
+             booked_by_role, agency_status) = row
+
+            if booked_by_role:
+                booked_count += 1
+            if car_id in seen:
+                continue
+            seen.add(car_id)
+
+            current_booking = None
+            if booked_by_role:
+                current_booking = {
+                    'customer_name': customer_name,
+                    'start_date': start_date,
+                    'end_date': end_date,
+                    'booked_by_role': booked_by_role
+                }
+                is_available = False
+            elif agency_status == 'booked':
+                current_booking = {'customer_name': 'Agency Marked', 'start_date': datetime.now(), 'end_date': datetime.now()}
+            elif agency_status == 'unavailable':
+                is_available = False
+
+            cars.append({
+                'id': car_id,
+                'model': model,
+                'year': year,
+                'license_plate': license_plate,
+                'daily_rate': daily_rate,
+                'category': category,
+                'description': description,
+                'features': features,
+                'is_available': is_available,
+                'image': image,
+                'image_variants': json.loads(image_variants) if image_variants else {},
+                'current_booking': current_booking
+            })
+
+        return {'cars': cars, 'booked_count': booked_count}
+
+
+fleet_status = FleetStatus()
@@ -0,0 +1,366 @@
+from . import db, blobs, storage
+from .models import Car, CarImage
+from .fleet import fleet_status
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, url_for
+from flask.cli import AppGroup
+from PIL import Image, ImageOps
+from sqlalchemy import or_
+import click
+import io
+import json
+import os
+import threading
+import time
+
+# Resized copies written for every upload: variant -> maximum width in
+# pixels. Pictures are never enlarged, so a small upload may share one
+# copy between several variants.
+VARIANT_WIDTHS = {
+    'thumb': 320,
+    'card': 640,
+    'full': 1600
+}
+
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+
+# Seconds a blob stored or reused by an upload is kept by collect(), even
+# unreferenced: the upload's CarImage is only committed at the end of its
+# request
+COLLECT_GRACE = 3600
+
+# Created on first use with IMAGE_WORKERS threads
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _static_path(relative_path):
+    return os.path.join(current_app.static_folder, relative_path)
+
+
+def _open(path):
+    # Blobs live in the storage backend, older uploads in the static folder
+    if blobs.is_blob(path):
+        return blobs.open_blob(path)
+    return open(_static_path(path), 'rb')
+
+
+def _size(path):
+    if blobs.is_blob(path):
+        return storage.get().size(path)
+    try:
+        return os.path.getsize(_static_path(path))
+    except OSError:
+        return None
+
+
+def _store(picture, image_format, **options):
+    buffer = io.BytesIO()
+    picture.save(buffer, image_format, **options)
+    return blobs.put_bytes(buffer.getvalue(), image_format)
+
+
+def render_variants(image_path):
+    """
+    Store WebP and JPEG copies of the upload at image_path (a blob, or a
+    path relative to the static folder) as blobs, without EXIF or other
+    metadata. Returns the dict stored in CarImage.variants.
+    """
+    with _open(image_path) as stream, Image.open(stream) as original:
+        # Apply the camera orientation before the EXIF data is dropped
+        picture = ImageOps.exif_transpose(original)
+        has_alpha = picture.mode in ('RGBA', 'LA', 'PA') or 'transparency' in picture.info
+        picture = picture.convert('RGBA' if has_alpha else 'RGB')
+
+    variants = {}
+    by_width = {}
+    for name, max_width in VARIANT_WIDTHS.items():
+        width = min(max_width, picture.width)
+        if width in by_width:
+            variants[name] = by_width[width]
+            continue
+
+        height = max(1, round(picture.height * width / picture.width))
+        resized = picture.resize((width, height), Image.LANCZOS) if width < picture.width else picture.copy()
+        resized.info = {}
+
+        webp = _store(resized, 'WEBP', quality=WEBP_QUALITY, method=4)
+
+        if has_alpha:
+            # JPEG has no transparency; flatten onto white
+            flattened = Image.new('RGB', resized.size, 'white')
+            flattened.paste(resized, mask=resized.getchannel('A'))
+            resized = flattened
+        jpeg = _store(resized, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+        variants[name] = by_width[width] = {'width': width, 'webp': webp, 'jpeg': jpeg}
+    return variants
+
+
+def process(image_id, force=False):
+    """
+    Resize one CarImage and store its variants. The variants of another
+    image with the same content are reused unless force is set. Returns
+    whether it worked; failures are logged and the image keeps being
+    served as uploaded.
+    """
+    image = db.session.get(CarImage, image_id)
+    if image is None:
+        # Deleted before its turn came
+        return False
+
+    previous = file_paths(image)
+    try:
+        twin = None
+        if not force:
+            twin = CarImage.query.filter(
+                CarImage.image_path == image.image_path,
+                CarImage.id != image.id,
+                CarImage.variants.isnot(None)
+            ).first()
+        image.variants = twin.variants if twin else json.dumps(render_variants(image.image_path))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error resizing car image {image_id}: {str(e)}")
+        return False
+
+    collect(previous - file_paths(image))
+    fleet_status.invalidate()
+    return True
+
+
+def _process_all(app, image_ids):
+    with app.app_context():
+        for image_id in image_ids:
+            process(image_id)
+
+
+def schedule(image_ids):
+    """
+    Resize the given uploads on the worker pool, off the request thread.
+    Call it once their CarImage rows are committed. With IMAGE_WORKERS set
+    to 0 they are resized before it returns.
+    """
+    global _executor
+    image_ids = list(image_ids)
+    if not image_ids:
+        return
+
+    workers = current_app.config.get('IMAGE_WORKERS', 2)
+    if workers <= 0:
+        for image_id in image_ids:
+            process(image_id)
+        return
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='car-images')
+    _executor.submit(_process_all, current_app._get_current_object(), image_ids)
+
+
+def file_paths(image):
+    """
+    Paths of the upload and all of its variants.
+    """
+    paths = {image.image_path}
+    for variant in image.variant_paths.values():
+        paths.update((variant['webp'], variant['jpeg']))
+    return paths
+
+
+def remove_files(paths):
+    """
+    Delete files, such as those of file_paths(image): blobs from the
+    storage backend, older uploads from the static folder. Files already
+    gone are skipped; files that cannot be deleted are logged and left
+    behind, since the rows that used them are already gone.
+    """
+    for path in paths:
+        try:
+            if blobs.is_blob(path):
+                blobs.delete(path)
+                continue
+            file_path = _static_path(path)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except Exception as e:
+            current_app.logger.error(f"Error deleting image file {path}: {str(e)}")
+
+
+def _referenced(path):
+    """
+    Whether a CarImage uses path, as its upload or one of its variants.
+    """
+    candidates = CarImage.query.filter(or_(
+        CarImage.image_path == path,
+        CarImage.variants.contains(path, autoescape=True)
+    )).all()
+    return any(path in file_paths(image) for image in candidates)
+
+
+def collect(paths):
+    """
+    Garbage-collect files: delete those among paths that no CarImage
+    references any more, as its upload or one of its variants. Call it
+    after the rows that let go of them are committed.
+
+    An upload of content already stored reuses its blob, and references
+    it only once its request commits. So every path is checked again
+    right before it is deleted, and blobs stored or reused in the last
+    COLLECT_GRACE seconds are left for "flask images collect". Returns
+    the number of paths deleted.
+    """
+    cutoff = time.time() - COLLECT_GRACE
+    removed = 0
+    for path in set(paths):
+        if _referenced(path):
+            continue
+        if blobs.is_blob(path):
+            modified = blobs.modified(path)
+            if modified is None or modified > cutoff:
+                continue
+        remove_files([path])
+        removed += 1
+    return removed
+
+
+def adopt(image):
+    """
+    Move an upload saved before the blob store existed into it, pointing
+    the CarImage and its car's main image at the blob. Returns the old
+    paths, to be collected once the change is committed.
+    """
+    previous = file_paths(image)
+    extension = os.path.splitext(image.image_path)[1].lstrip('.') or 'bin'
+    with open(_static_path(image.image_path), 'rb') as stream:
+        path = blobs.put_stream(stream, extension)
+
+    Car.query.filter(Car.id == image.car_id, Car.main_image == image.image_path).update(
+        {Car.main_image: path}, synchronize_session=False
+    )
+    image.image_path = path
+    # Variants are redone in the store
+    image.variants = None
+    return previous
+
+
+def url(path):
+    """
+    URL of an image path. Blobs are linked where the storage backend
+    serves them: the immutable media route, the bucket or a CDN.
+    """
+    if blobs.is_blob(path):
+        return blobs.url(path)
+    return url_for('static', filename=path)
+
+
+def srcset(variants, image_format):
+    """
+    srcset attribute value listing each variant of one format by width.
+    """
+    urls = {}
+    for variant in variants.values():
+        urls[variant['width']] = url(variant[image_format])
+    return ', '.join(f'{url} {width}w' for width, url in sorted(urls.items()))
+
+
+def thumbnail(image):
+    """
+    Path of the JPEG thumbnail, or of the upload itself
+    until it has been resized.
+    """
+    variants = image.variant_paths
+    return variants['thumb']['jpeg'] if variants else image.image_path
+
+
+def savings():
+    """
+    Bytes stored for the resized uploads against their variants.
+    Returns {'images', 'original', variant: {'webp', 'jpeg'}}, counting
+    each stored file once, over the images whose files all exist.
+    """
+    sizes = {}
+    originals = set()
+    copies = {name: {'webp': set(), 'jpeg': set()} for name in VARIANT_WIDTHS}
+    for image in CarImage.query.filter(CarImage.variants.isnot(None)).all():
+        paths = file_paths(image)
+        for path in paths - sizes.keys():
+            sizes[path] = _size(path)
+        if any(sizes[path] is None for path in paths):
+            continue
+        originals.add(image.image_path)
+        for name, variant in image.variant_paths.items():
+            for image_format in ('webp', 'jpeg'):
+                copies[name][image_format].add(variant[image_format])
+
+    def size(paths):
+        return sum(sizes[path] for path in paths)
+
+    report = {'images': len(originals), 'original': size(originals)}
+    for name, formats in copies.items():
+        report[name] = {image_format: size(paths) for image_format, paths in formats.items()}
+    return report
+
+
+images_cli = AppGroup('images', help='Maintain the resized car images.')
+
+
+def _megabytes(size):
+    return f'{size / 1024 / 1024:.1f} MB'
+
+
+@images_cli.command('backfill')
+@click.option('--force', is_flag=True, help='Also redo images that already have variants.')
+def backfill_command(force):
+    """Move uploads into the blob store, resize them and report the bytes saved."""
+    legacy = CarImage.query.filter(~CarImage.image_path.startswith(blobs.BLOB_PREFIX)).all()
+    moved = 0
+    for image in legacy:
+        try:
+            previous = adopt(image)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error moving car image {image.id} into the blob store: {str(e)}")
+            continue
+        collect(previous)
+        moved += 1
+    if legacy:
+        click.echo(f'Moved {moved} of {len(legacy)} uploads into the blob store.')
+
+    query = db.session.query(CarImage.id).order_by(CarImage.id)
+    if not force:
+        query = query.filter(CarImage.variants.is_(None))
+    image_ids = [row[0] for row in query.all()]
+
+    resized = sum(1 for image_id in image_ids if process(image_id, force=force))
+    click.echo(f'Resized {resized} of {len(image_ids)} images.')
+    if resized < len(image_ids):
+        click.echo('Some uploads could not be resized; see the log. They are served as uploaded.')
+
+    report = savings()
+    if not report['images']:
+        return
+    click.echo(f'{report["images"]} originals: {_megabytes(report["original"])}')
+    for name, max_width in VARIANT_WIDTHS.items():
+        webp = report[name]['webp']
+        click.echo(f'{name} ({max_width}px): WebP {_megabytes(webp)} '
+                   f'({100 - 100 * webp / report["original"]:.0f}% smaller), '
+                   f'JPEG {_megabytes(report[name]["jpeg"])}')
+
+
+@images_cli.command('collect')
+def collect_command():
+    """Delete stored images that no car uses any more."""
+    referenced = {row[0] for row in db.session.query(Car.main_image).filter(Car.main_image.isnot(None))}
+    for image in CarImage.query.all():
+        referenced |= file_paths(image)
+    unused = [key for key in storage.get().keys(blobs.BLOB_PREFIX) if key not in referenced]
+
+    removed = collect(unused)
+    click.echo(f'Deleted {removed} unused images.')
+    if removed < len(unused):
+        click.echo(f'Kept {len(unused) - removed} stored or reused in the last {COLLECT_GRACE} seconds; '
+                   f'run this again later.')
@@ -0,0 +1,239 @@
+from flask import before_render_template, request, request_started, request_tearing_down, template_rendered
+from sqlalchemy import event
+import collections
+import contextvars
+import math
+import os
+import random
+import threading
+import time
+
+# Blueprints whose endpoints are measured
+BLUEPRINTS = ('main', 'auth')
+
+# Upper bounds of the request duration histogram, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Latest requests kept per endpoint for the percentiles of the
+# performance page
+WINDOW = 1000
+
+
+class RequestTiming:
+    """
+    What one request spent, filled in by the signal and SQLAlchemy hooks.
+    """
+
+    __slots__ = ('started', 'sql_count', 'sql_seconds', 'rows', 'render_seconds',
+                 'statement_started', 'render_started', 'render_depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.render_seconds = 0.0
+        self.statement_started = None
+        self.render_started = None
+        self.render_depth = 0
+
+
+class EndpointStats:
+    """
+    Running totals of one endpoint, plus its latest requests.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.rows = 0
+        self.render_seconds = 0.0
+        # Requests at or under each DURATION_BUCKETS bound
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        # (seconds, sql_count, sql_seconds, rows, render_seconds)
+        self.recent = collections.deque(maxlen=WINDOW)
+
+    def add(self, timing, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.sql_count += timing.sql_count
+        self.sql_seconds += timing.sql_seconds
+        self.rows += timing.rows
+        self.render_seconds += timing.render_seconds
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if seconds <= bound:
+                self.buckets[index] += 1
+        self.recent.append((seconds, timing.sql_count, timing.sql_seconds, timing.rows, timing.render_seconds))
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of sorted values: the smallest value that at
+    least the given fraction of them do not exceed.
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))]
+
+
+class Recorder:
+    """
+    Per-endpoint request statistics of this process. Each gunicorn worker
+    keeps its own, so every scrape reports one worker (see the pid label).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+
+    def record(self, endpoint, timing, seconds):
+        with self._lock:
+            stats = self.endpoints.get(endpoint)
+            if stats is None:
+                stats = self.endpoints[endpoint] = EndpointStats()
+            stats.add(timing, seconds)
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+
+    def summary(self):
+        """
+        One dict per endpoint, slowest p95 first: p50/p95/p99 of the
+        latest WINDOW requests, in milliseconds, and per-request averages.
+        """
+        with self._lock:
+            items = [(endpoint, stats.count, list(stats.recent)) for endpoint, stats in self.endpoints.items()]
+
+        rows = []
+        for endpoint, count, recent in items:
+            durations = sorted(1000 * item[0] for item in recent)
+            statements = sorted(item[1] for item in recent)
+            rows.append({
+                'endpoint': endpoint,
+                'count': count,
+                'window': len(recent),
+                'p50_ms': percentile(durations, 0.50),
+                'p95_ms': percentile(durations, 0.95),
+                'p99_ms': percentile(durations, 0.99),
+                'sql_avg': sum(statements) / len(recent),
+                'sql_p95': percentile(statements, 0.95),
+                'sql_ms_avg': 1000 * sum(item[2] for item in recent) / len(recent),
+                'rows_avg': sum(item[3] for item in recent) / len(recent),
+                'render_ms_avg': 1000 * sum(item[4] for item in recent) / len(recent)
+            })
+        rows.sort(key=lambda row: row['p95_ms'], reverse=True)
+        return rows
+
+    def prometheus_text(self, sample_rate):
+        """
+        The request metrics in the Prometheus text format.
+        """
+        pid = os.getpid()
+        with self._lock:
+            items = sorted(
+                (endpoint, stats.count, stats.seconds, stats.sql_count, stats.sql_seconds, stats.rows,
+                 stats.render_seconds, list(stats.buckets))
+                for endpoint, stats in self.endpoints.items()
+            )
+
+        lines = [
+            '# HELP http_requests_sample_rate Share of requests measured; the other metrics count only those.',
+            '# TYPE http_requests_sample_rate gauge',
+            f'http_requests_sample_rate{{pid="{pid}"}} {sample_rate}',
+            '# HELP http_request_duration_seconds Time to handle a request, by endpoint.',
+            '# TYPE http_request_duration_seconds histogram'
+        ]
+        for endpoint, count, seconds, _, _, _, _, buckets in items:
+            labels = f'endpoint="{endpoint}",pid="{pid}"'
+            for bound, bucket in zip(DURATION_BUCKETS, buckets):
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {bucket}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {seconds:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {count}')
+
+        counters = [
+            ('http_request_sql_statements_total', 'SQL statements run by requests.', 3, '{}'),
+            ('http_request_sql_seconds_total', 'Time requests spent in SQL statements.', 4, '{:.6f}'),
+            ('http_request_rows_total', 'Rows returned to requests, where the database driver reports them.', 5, '{}'),
+            ('http_request_render_seconds_total', 'Time requests spent rendering templates.', 6, '{:.6f}')
+        ]
+        for name, help_text, index, value_format in counters:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for item in items:
+                lines.append(f'{name}{{endpoint="{item[0]}",pid="{pid}"}} {value_format.format(item[index])}')
+        return '\n'.join(lines) + '\n'
+
+
+recorder = Recorder()
+
+# The timing of the request being served by this thread, if it is measured
+_current = contextvars.ContextVar('request_timing', default=None)
+
+
+def _request_started(app, **extra):
+    rate = app.config.get('METRICS_SAMPLE_RATE', 1.0)
+    measured = request.blueprint in BLUEPRINTS and (rate >= 1 or random.random() < rate)
+    _current.set(RequestTiming() if measured else None)
+
+
+def _request_tearing_down(app, **extra):
+    timing = _current.get()
+    if timing is None:
+        return
+    _current.set(None)
+    recorder.record(request.endpoint, timing, time.perf_counter() - timing.started)
+
+
+def _before_render(app, template, context, **extra):
+    timing = _current.get()
+    if timing is not None:
+        # Only the outermost render counts, should a template render another
+        if timing.render_depth == 0:
+            timing.render_started = time.perf_counter()
+        timing.render_depth += 1
+
+
+def _rendered(app, template, context, **extra):
+    timing = _current.get()
+    if timing is not None and timing.render_depth:
+        timing.render_depth -= 1
+        if timing.render_depth == 0:
+            timing.render_seconds += time.perf_counter() - timing.render_started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = _current.get()
+    if timing is not None:
+        timing.statement_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timing = _current.get()
+    if timing is not None and timing.statement_started is not None:
+        timing.sql_count += 1
+        timing.sql_seconds += time.perf_counter() - timing.statement_started
+        timing.statement_started = None
+        # PostgreSQL drivers report the rows of a query; SQLite's does not
+        if cursor.description is not None and cursor.rowcount > 0:
+            timing.rows += cursor.rowcount
+
+
+def init_app(app, engine):
+    """
+    Measure the requests to BLUEPRINTS: a METRICS_SAMPLE_RATE share of
+    them, or none at all when it is 0, in which case no hook is installed
+    and requests and queries run exactly as without this module.
+    """
+    if app.config.get('METRICS_SAMPLE_RATE', 1.0) <= 0:
+        return
+
+    request_started.connect(_request_started, app)
+    request_tearing_down.connect(_request_tearing_down, app)
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_rendered, app)
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
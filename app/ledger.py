@@ -0,0 +1,215 @@
+from . import db
+from .models import Booking, Expense, Income, MonthlyLedger
+from flask.cli import AppGroup
+from sqlalchemy import and_, delete, extract, func, insert, update
+from sqlalchemy.dialects import postgresql, sqlite
+import click
+
+# Bookings are rolled up under a single bucket keyed by their start date
+BOOKING_CATEGORY = 'Rental'
+
+# Amounts closer than this are considered equal by the consistency checker
+TOLERANCE = 0.005
+
+# INSERT ... ON CONFLICT DO UPDATE, on the databases that have it
+UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert
+}
+
+
+def apply(source, date, category, subcategory, amount, count=1):
+    """
+    Add count entries totalling amount to the ledger bucket of the given date.
+    Pass negative values to remove entries. Empty buckets are deleted.
+    The counters move in one statement that inserts the bucket if needed,
+    so concurrent writers neither lose increments nor collide on a new
+    bucket. The change joins the caller's transaction; nothing is
+    committed here.
+    """
+    ledger = MonthlyLedger.__table__
+    key = {
+        'year': date.year,
+        'month': date.month,
+        'source': source,
+        'category': category,
+        'subcategory': subcategory or ''
+    }
+    bucket = and_(*(ledger.c[column] == value for column, value in key.items()))
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect in UPSERT_INSERTS:
+        statement = UPSERT_INSERTS[dialect](ledger).values(entry_count=count, total_amount=amount, **key)
+        db.session.execute(statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={
+                'entry_count': ledger.c.entry_count + statement.excluded.entry_count,
+                'total_amount': ledger.c.total_amount + statement.excluded.total_amount
+            }
+        ))
+    else:
+        result = db.session.execute(update(ledger).where(bucket).values(
+            entry_count=ledger.c.entry_count + count,
+            total_amount=ledger.c.total_amount + amount
+        ))
+        if result.rowcount == 0:
+            db.session.execute(insert(ledger).values(entry_count=count, total_amount=amount, **key))
+
+    if count < 0:
+        db.session.execute(delete(ledger).where(bucket, ledger.c.entry_count <= 0))
+
+
+def record_income(income, sign=1):
+    apply('income', income.date, income.category, income.subcategory, sign * income.amount, sign)
+
+
+def record_expense(expense, sign=1):
+    apply('expense', expense.date, expense.category, expense.subcategory, sign * expense.amount, sign)
+
+
+def record_booking(booking, sign=1):
+    apply('booking', booking.start_date, BOOKING_CATEGORY, '', sign * (booking.total_cost or 0), sign)
+
+
+def month_summary(source, year, month):
+    """
+    Entry count, total amount and per-category totals for one month,
+    read from the rollup rows rather than the underlying transactions.
+    """
+    rows = db.session.query(
+        MonthlyLedger.category,
+        func.sum(MonthlyLedger.entry_count),
+        func.sum(MonthlyLedger.total_amount)
+    ).filter_by(
+        source=source,
+        year=year,
+        month=month
+    ).group_by(MonthlyLedger.category).all()
+
+    by_category = {}
+    count = 0
+    total = 0.0
+    for category, category_count, category_total in rows:
+        by_category[category] = float(category_total)
+        count += category_count
+        total += float(category_total)
+
+    return {
+        'count': count,
+        'total': total,
+        'by_category': by_category
+    }
+
+
+def yearly_by_month(source, year):
+    """
+    Total amount per month (1-12) of the given year for one source.
+    """
+    rows = db.session.query(
+        MonthlyLedger.month,
+        func.sum(MonthlyLedger.total_amount)
+    ).filter_by(
+        source=source,
+        year=year
+    ).group_by(MonthlyLedger.month).all()
+
+    totals = {m: 0 for m in range(1, 13)}
+    for month, total in rows:
+        totals[month] = float(total)
+    return totals
+
+
+def _source_aggregates():
+    """
+    Group every raw transaction table into ledger buckets.
+    Yields (year, month, source, category, subcategory, count, total).
+    """
+    sources = [
+        ('income', Income.date, Income.category, Income.subcategory, Income.amount, Income.id),
+        ('expense', Expense.date, Expense.category, Expense.subcategory, Expense.amount, Expense.id),
+    ]
+    for source, date_column, category, subcategory, amount, id_column in sources:
+        year = extract('year', date_column)
+        month = extract('month', date_column)
+        rows = db.session.query(
+            year, month, category, func.coalesce(subcategory, ''),
+            func.count(id_column), func.coalesce(func.sum(amount), 0)
+        ).group_by(year, month, category, func.coalesce(subcategory, '')).all()
+        for row in rows:
+            yield (int(row[0]), int(row[1]), source, row[2], row[3], row[4], float(row[5]))
+
+    year = extract('year', Booking.start_date)
+    month = extract('month', Booking.start_date)
+    rows = db.session.query(
+        year, month, func.count(Booking.id), func.coalesce(func.sum(Booking.total_cost), 0)
+    ).group_by(year, month).all()
+    for row in rows:
+        yield (int(row[0]), int(row[1]), 'booking', BOOKING_CATEGORY, '', row[2], float(row[3]))
+
+
+def rebuild():
+    """
+    Recompute the whole ledger from the raw transactions.
+    Returns the number of rollup rows written.
+    """
+    MonthlyLedger.query.delete()
+    rows = [
+        MonthlyLedger(
+            year=year,
+            month=month,
+            source=source,
+            category=category,
+            subcategory=subcategory,
+            entry_count=count,
+            total_amount=total
+        )
+        for year, month, source, category, subcategory, count, total in _source_aggregates()
+    ]
+    db.session.add_all(rows)
+    db.session.commit()
+    return len(rows)
+
+
+def check():
+    """
+    Compare the ledger against the raw transactions.
+    Returns a list of (key, expected, actual) tuples for every bucket that
+    differs, where expected and actual are (count, total) pairs.
+    """
+    expected = {}
+    for year, month, source, category, subcategory, count, total in _source_aggregates():
+        expected[(year, month, source, category, subcategory)] = (count, total)
+
+    actual = {}
+    for row in MonthlyLedger.query.all():
+        actual[(row.year, row.month, row.source, row.category, row.subcategory)] = (row.entry_count, row.total_amount)
+
+    drift = []
+    for key in sorted(set(expected) | set(actual), key=str):
+        want = expected.get(key, (0, 0.0))
+        have = actual.get(key, (0, 0.0))
+        if want[0] != have[0] or abs(want[1] - have[1]) > TOLERANCE:
+            drift.append((key, want, have))
+    return drift
+
+
+ledger_cli = AppGroup('ledger', help='Maintain the monthly ledger rollup.')
+
+
+@ledger_cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the monthly ledger from incomes, expenses and bookings."""
+    count = rebuild()
+    click.echo(f'Monthly ledger rebuilt with {count} rows.')
+
+
+@ledger_cli.command('check')
+def check_command():
+    """Report ledger buckets that drifted from the raw transactions."""
+    drift = check()
+    for key, want, have in drift:
+        click.echo(f'{key}: expected count={want[0]} total={want[1]:.2f}, '
+                   f'ledger count={have[0]} total={have[1]:.2f}')
+    if drift:
+        raise click.ClickException(f'{len(drift)} ledger buckets are out of date. Run "flask ledger rebuild".')
+    click.echo('Monthly ledger is consistent.')
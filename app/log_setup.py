@@ -0,0 +1,248 @@
+from flask import g, has_request_context, request
+import atexit
+import copy
+import itertools
+import json
+import logging
+import logging.config
+import logging.handlers
+import os
+import queue
+import re
+import uuid
+
+# Secrets that must not reach a log sink, whatever a message contains:
+# (pattern, replacement)
+REDACTIONS = [
+    # Werkzeug password hashes, e.g. pbkdf2:sha256:600000$salt$hash
+    (re.compile(r'\b(?:pbkdf2:[\w:]+|scrypt:[\d:]+)\$[^\s$]+\$[0-9a-f]+'), '[REDACTED HASH]'),
+    (re.compile(r'(?i)\b(Bearer|Basic)\s+[\w\-.~+/=]+'), r'\1 [REDACTED]'),
+    # password=..., "secret": "...", token: ...
+    (re.compile(r'''(?i)(["']?\b\w*(?:password|passwd|secret|token|api_key)\w*["']?\s*[=:]\s*)("[^"]*"|'[^']*'|[^\s,;&}]+)'''),
+     r'\1[REDACTED]'),
+]
+
+
+def redact(text):
+    for pattern, replacement in REDACTIONS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass only every Nth record of a level from the same line of code, so
+    a debug line inside a loop or a hot route cannot flood the sinks.
+    every maps level names to N, e.g. {'DEBUG': 10}; other levels pass.
+    Records that pass carry sample_every=N.
+    """
+
+    def __init__(self, every):
+        super().__init__()
+        self.every = {logging.getLevelName(level): int(n) for level, n in every.items() if int(n) > 1}
+        self._counters = {}
+
+    def filter(self, record):
+        every = self.every.get(record.levelno)
+        if not every:
+            return True
+        # Decided once per record, however many handlers it reaches
+        if hasattr(record, 'sampled'):
+            return record.sampled
+        key = (record.pathname, record.lineno)
+        counter = self._counters.get(key)
+        if counter is None:
+            counter = self._counters.setdefault(key, itertools.count())
+        record.sampled = next(counter) % every == 0
+        if record.sampled:
+            record.sample_every = every
+        return record.sampled
+
+
+class RedactingFilter(logging.Filter):
+    """
+    Give the record its final message, with secrets redacted, and its
+    traceback as text, redacted too.
+    """
+
+    def filter(self, record):
+        record.msg = redact(record.getMessage())
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        return True
+
+
+class RequestFilter(logging.Filter):
+    """
+    Tag records logged while serving a request with that request: its
+    X-Request-ID (or a generated id), method and path.
+    """
+
+    def filter(self, record):
+        if has_request_context():
+            if 'request_id' not in g:
+                g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+            record.request_id = g.request_id
+            record.method = request.method
+            record.path = request.path
+        return True
+
+
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to a listener thread instead of writing them in the
+    request. The filters have run by then, in the request's thread; the
+    sinks format and write the record later. When the queue is full,
+    records are dropped (and counted) rather than slowing requests down.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Unlike the stock prepare(), the traceback stays apart from the
+        # message (as exc_text) so that formatters can still place it
+        record = copy.copy(record)
+        record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line, for log collectors to index.
+    """
+
+    FIELDS = ('request_id', 'method', 'path', 'sample_every')
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'source': f'{record.module}:{record.lineno}'
+        }
+        for field in self.FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class _Pipeline:
+    """
+    The queue handler in front of each group of sinks and the listener
+    threads behind them. Threads do not survive fork(), so a forked
+    worker (gunicorn --preload) starts its own.
+    """
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self.listeners = []
+
+    def route(self, sinks):
+        handler = QueueHandler(queue.Queue(self.queue_size))
+        self._listen(handler, sinks)
+        return handler
+
+    def _listen(self, handler, sinks):
+        listener = logging.handlers.QueueListener(handler.queue, *sinks, respect_handler_level=True)
+        listener.handler = handler
+        listener.start()
+        self.listeners.append(listener)
+
+    def restart(self):
+        # In the child: the parent's threads are gone, and so may be the
+        # records they had not written yet. Each listener is stopped and
+        # replaced by a new one on a new queue, as a parent thread may have
+        # held the old queue's lock when the process forked; stop() only
+        # joins the thread, stopped by the fork, after queueing its sentinel
+        # on a queue nobody else uses.
+        listeners, self.listeners = self.listeners, []
+        for listener in listeners:
+            listener.queue = queue.Queue(1)
+            listener.stop()
+            listener.handler.queue = queue.Queue(self.queue_size)
+            self._listen(listener.handler, listener.handlers)
+
+    def stop(self):
+        # Writes out what is queued
+        for listener in self.listeners:
+            listener.stop()
+        self.listeners = []
+
+
+_pipeline = None
+
+
+def _stop():
+    if _pipeline is not None:
+        _pipeline.stop()
+
+
+def _restart():
+    if _pipeline is not None:
+        _pipeline.restart()
+
+
+atexit.register(_stop)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart)
+
+
+def configure(app):
+    """
+    Apply the app's LOGGING_CONFIG, then, with LOG_QUEUE set, move the
+    handlers it put on each logger behind a queue written by a listener
+    thread. Loggers keep their levels. Every record is sampled by
+    LOG_SAMPLE_EVERY and redacted before it is queued or written.
+    """
+    global _pipeline
+
+    config = app.config
+    _stop()
+    _pipeline = None
+
+    for handler in config['LOGGING_CONFIG'].get('handlers', {}).values():
+        if handler.get('filename'):
+            os.makedirs(os.path.dirname(handler['filename']), exist_ok=True)
+    logging.config.dictConfig(config['LOGGING_CONFIG'])
+
+    # Run in the thread that logs, before a record is queued
+    filters = [SamplingFilter(config.get('LOG_SAMPLE_EVERY', {})), RedactingFilter(), RequestFilter()]
+    loggers = [logging.getLogger()] + [
+        logging.getLogger(name) for name in config['LOGGING_CONFIG'].get('loggers', {}) if name
+    ]
+    if config.get('LOG_QUEUE', True):
+        _pipeline = _Pipeline(config.get('LOG_QUEUE_SIZE', 10000))
+        # Loggers sending to the same sinks share a queue
+        routes = {}
+        for logger in loggers:
+            sinks = tuple(logger.handlers)
+            if not sinks:
+                continue
+            if sinks not in routes:
+                routes[sinks] = _pipeline.route(sinks)
+            logger.handlers = [routes[sinks]]
+
+    for logger in loggers:
+        for handler in logger.handlers:
+            for log_filter in filters:
+                if log_filter not in handler.filters:
+                    handler.addFilter(log_filter)
@@ -1,6 +1,7 @@
 from . import db
 from flask_login import UserMixin
 from datetime import datetime
+import json
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -17,6 +18,12 @@ class User(db.Model, UserMixin):
     user_expenses = db.relationship('Expense', backref='user', lazy=True)
     user_incomes = db.relationship('Income', backref='user_income', lazy=True)
 
+    # Logins look users up by email; listings filter on role and status
+    __table_args__ = (
+        db.Index('ix_user_email', 'email'),
+        db.Index('ix_user_role_is_active', 'role', 'is_active'),
+    )
+
 class Customer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -27,69 +34,50 @@ class Customer(db.Model):
     nin_passport_number = db.Column(db.String(50), unique=True, nullable=True)
     nationality = db.Column(db.String(50), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Normalized copies (see app.normalization) maintained by customer_search.
+    # The phone and NIN/passport keys identify a customer.
+    phone_key = db.Column(db.String(20), nullable=True)
+    license_key = db.Column(db.String(50), nullable=True)
+    nin_key = db.Column(db.String(50), nullable=True)
     bookings = db.relationship('Booking', backref='customer', lazy='dynamic')
 
+    # text_pattern_ops lets PostgreSQL serve LIKE 'prefix%' from the index
+    __table_args__ = (
+        db.Index('ix_customer_phone_key', 'phone_key', unique=True, postgresql_ops={'phone_key': 'text_pattern_ops'}),
+        db.Index('ix_customer_license_key', 'license_key', postgresql_ops={'license_key': 'text_pattern_ops'}),
+        db.Index('ix_customer_nin_key', 'nin_key', unique=True, postgresql_ops={'nin_key': 'text_pattern_ops'}),
+    )
+
     @staticmethod
     def merge_duplicate_clients(db):
         """
-        Find and merge clients with the same phone number.
-        Keeps the client with the most complete information.
+        Find and merge clients sharing a phone number, NIN/passport or email.
+        Keeps the client with the most complete information and returns the
+        number of clients merged. See app.dedupe and "flask customers dedupe".
         """
-        from sqlalchemy import func
-        
-        # Find phone numbers with multiple clients
-        duplicate_phones = (
-            db.session.query(Customer.phone)
-            .group_by(Customer.phone)
-            .having(func.count(Customer.id) > 1)
-            .all()
-        )
-        
-        merged_count = 0
-        for (phone,) in duplicate_phones:
-            # Get all clients with this phone number
-            duplicate_clients = Customer.query.filter_by(phone=phone).order_by(
-                # Prioritize clients with more complete information
-                func.length(Customer.name).desc(),
-                func.length(Customer.email).desc(),
-                func.length(Customer.address).desc()
-            ).all()
-            
-            # Skip if no duplicates or only one client
-            if len(duplicate_clients) <= 1:
-                continue
-            
-            # Keep the first (most complete) client
-            primary_client = duplicate_clients[0]
-            
-            # Merge other clients into the primary client
-            for secondary_client in duplicate_clients[1:]:
-                # Transfer bookings to primary client
-                bookings = Booking.query.filter_by(customer_id=secondary_client.id).all()
-                for booking in bookings:
-                    booking.customer_id = primary_client.id
-                
-                # Merge additional information if primary client's info is less complete
-                if not primary_client.email and secondary_client.email:
-                    primary_client.email = secondary_client.email
-                
-                if not primary_client.address and secondary_client.address:
-                    primary_client.address = secondary_client.address
-                
-                # Delete the secondary client
-                db.session.delete(secondary_client)
-                
-                # Increment merged count
-                merged_count += 1
-            
-            # Commit changes
-            db.session.commit()
-        
-        return merged_count
+        from . import dedupe
+
+        return dedupe.merge(dedupe.find_duplicate_groups())['customers_merged']
 
     def __repr__(self):
         return f'<Customer {self.name}>'
 
+class CustomerStats(db.Model):
+    __tablename__ = 'customer_stats'
+    # One row per customer, maintained on booking writes by app.customer_stats
+    customer_id = db.Column(db.Integer, db.ForeignKey('customer.id'), primary_key=True)
+    booking_count = db.Column(db.Integer, nullable=False, default=0)
+    total_spent = db.Column(db.Float, nullable=False, default=0.0)
+    last_booking_at = db.Column(db.DateTime, nullable=True)  # created_at of the newest booking
+    active_booking_count = db.Column(db.Integer, nullable=False, default=0)
+    customer = db.relationship('Customer', backref=db.backref('stats', uselist=False, cascade='all, delete-orphan'))
+
+    # Client lists sort by spend and recency straight from these indexes
+    __table_args__ = (
+        db.Index('ix_customer_stats_total_spent', 'total_spent', 'customer_id'),
+        db.Index('ix_customer_stats_last_booking_at', 'last_booking_at', 'customer_id'),
+    )
+
 class Car(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     model = db.Column(db.String(100), nullable=False)
@@ -101,11 +89,24 @@ class Car(db.Model):
     description = db.Column(db.Text)
     features = db.Column(db.Text)  # Store as JSON string
     main_image = db.Column(db.String(200))  # Path to main display image
-    display_order = db.Column(db.Integer, default=0)  # New field for custom ordering
+    display_order = db.Column(db.Integer, default=0)  # Custom ordering, spaced apart (see app.car_order)
     images = db.relationship('CarImage', backref='car', lazy=True, cascade='all, delete-orphan')
-    bookings = db.relationship('Booking', backref='car', lazy=False)
+    bookings = db.relationship('Booking', backref='car', lazy=True)  # views opt in to loading via query options
     maintenance_records = db.relationship('Maintenance', backref='car', lazy=True, cascade='all, delete-orphan')
 
+    # Car lists are ordered by display_order, ties broken by id
+    __table_args__ = (
+        db.Index('ix_car_display_order', 'display_order', 'id'),
+    )
+
+    @property
+    def main_image_variants(self):
+        # Load the images with the car to avoid a query per car
+        for image in self.images:
+            if image.image_path == self.main_image:
+                return image.variant_paths
+        return {}
+
 class CarImage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     car_id = db.Column(db.Integer, db.ForeignKey('car.id'), nullable=False)
@@ -113,6 +114,17 @@ class CarImage(db.Model):
     caption = db.Column(db.String(200))
     is_main = db.Column(db.Boolean, default=False)
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
+    # Resized copies as a JSON string, {variant: {'width', 'webp', 'jpeg'}};
+    # empty until app.images has processed the upload
+    variants = db.Column(db.Text)
+
+    __table_args__ = (
+        db.Index('ix_car_image_car_id', 'car_id'),
+    )
+
+    @property
+    def variant_paths(self):
+        return json.loads(self.variants) if self.variants else {}
 
 class Booking(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -127,6 +139,19 @@ class Booking(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Month and range reports filter on start_date; the remaining indexes
+    # cover the foreign keys, the status lookups done per car and employee,
+    # the per-car interval overlap checks and the newest-first booking list
+    __table_args__ = (
+        db.Index('ix_booking_start_date', 'start_date'),
+        db.Index('ix_booking_car_id_status', 'car_id', 'status'),
+        db.Index('ix_booking_status_employee_id', 'status', 'employee_id'),
+        db.Index('ix_booking_customer_id', 'customer_id'),
+        db.Index('ix_booking_employee_id', 'employee_id'),
+        db.Index('ix_booking_car_id_end_date_start_date', 'car_id', 'end_date', 'start_date'),
+        db.Index('ix_booking_created_at_id', 'created_at', 'id'),
+    )
+
 class Maintenance(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     car_id = db.Column(db.Integer, db.ForeignKey('car.id'), nullable=False)
@@ -140,6 +165,11 @@ class Maintenance(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_maintenance_car_id_status', 'car_id', 'status'),
+        db.Index('ix_maintenance_employee_id', 'employee_id'),
+    )
+
 class Expense(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -148,6 +178,12 @@ class Expense(db.Model):
     subcategory = db.Column(db.String(100), nullable=False)  # e.g., 'Office Supplies', 'Electricity', 'Rent'
     description = db.Column(db.Text, nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    # Monthly views filter on a date range and summarize by category
+    __table_args__ = (
+        db.Index('ix_expense_date_category', 'date', 'category'),
+        db.Index('ix_expense_user_id', 'user_id'),
+    )
     
     def to_dict(self):
         return {
@@ -168,6 +204,12 @@ class Income(db.Model):
     subcategory = db.Column(db.String(50), nullable=True)  # New field for subcategory
     description = db.Column(db.Text, nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+
+    # Monthly views filter on a date range and summarize by category
+    __table_args__ = (
+        db.Index('ix_income_date_category', 'date', 'category'),
+        db.Index('ix_income_user_id', 'user_id'),
+    )
     
     def to_dict(self):
         return {
@@ -191,7 +233,11 @@ class AgencyVisibleCar(db.Model):
     car = db.relationship('Car', backref=db.backref('agency_visible_cars', cascade='all, delete-orphan'))
     
     # Ensure unique constraint to prevent duplicate entries
-    __table_args__ = (db.UniqueConstraint('agency_id', 'car_id', name='_agency_car_uc'),)
+    # (it also serves as the agency_id index)
+    __table_args__ = (
+        db.UniqueConstraint('agency_id', 'car_id', name='_agency_car_uc'),
+        db.Index('ix_agency_visible_cars_car_id', 'car_id'),
+    )
 
 class AgencyCarStatus(db.Model):
     __tablename__ = 'agency_car_status'
@@ -207,4 +253,25 @@ class AgencyCarStatus(db.Model):
     car = db.relationship('Car', backref=db.backref('agency_statuses', cascade='all, delete-orphan'))
 
     # Ensure unique constraint to prevent duplicate entries
-    __table_args__ = (db.UniqueConstraint('agency_id', 'car_id', name='_agency_car_status_uc'),)
+    # (it also serves as the agency_id index)
+    __table_args__ = (
+        db.UniqueConstraint('agency_id', 'car_id', name='_agency_car_status_uc'),
+        db.Index('ix_agency_car_status_car_id', 'car_id'),
+        db.Index('ix_agency_car_status_status', 'status'),
+    )
+
+class MonthlyLedger(db.Model):
+    __tablename__ = 'monthly_ledger'
+    id = db.Column(db.Integer, primary_key=True)
+    year = db.Column(db.Integer, nullable=False)
+    month = db.Column(db.Integer, nullable=False)
+    source = db.Column(db.String(20), nullable=False)  # 'income', 'expense', 'booking'
+    category = db.Column(db.String(50), nullable=False)
+    subcategory = db.Column(db.String(100), nullable=False, default='')  # '' when the entry has none
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(db.Float, nullable=False, default=0.0)
+
+    # One rollup row per month and category bucket
+    __table_args__ = (
+        db.UniqueConstraint('year', 'month', 'source', 'category', 'subcategory', name='_monthly_ledger_uc'),
+    )
@@ -0,0 +1,45 @@
+import re
+
+# Country calling code assumed for numbers written without one (Comoros)
+DEFAULT_COUNTRY_CODE = '269'
+
+# Digits of the shortest national number; a longer number that starts with
+# the default country code already carries it
+NATIONAL_NUMBER_LENGTH = 7
+
+
+def normalize_phone(value, country_code=DEFAULT_COUNTRY_CODE):
+    """
+    E.164-style form of a phone number: '+' followed by the country code
+    and the national number, with spaces and punctuation removed.
+
+    '+269 333 44 55', '00269 3334455', '269-333-4455' and '333 44 55' all
+    become '+2693334455'. A leading trunk 0 of a national number is
+    dropped. Returns None when the value has no digits.
+    """
+    value = (value or '').strip()
+    digits = re.sub(r'\D', '', value)
+    if not digits:
+        return None
+    if value.startswith('+'):
+        return '+' + digits
+    if digits.startswith('00'):
+        return '+' + digits[2:]
+    if digits.startswith(country_code) and len(digits) >= len(country_code) + NATIONAL_NUMBER_LENGTH:
+        return '+' + digits
+    return '+' + country_code + digits.lstrip('0')
+
+
+def normalize_document(value):
+    """
+    Upper-cased letters and digits of a licence, NIN or passport number:
+    'ab-12 345' becomes 'AB12345'. Returns None when nothing is left.
+    """
+    return re.sub(r'[^0-9A-Z]', '', (value or '').upper()) or None
+
+
+def normalize_email(value):
+    """
+    Trimmed, lower-cased email address, or None when blank.
+    """
+    return (value or '').strip().lower() or None
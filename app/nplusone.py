@@ -0,0 +1,104 @@
+from flask import request, request_started, request_tearing_down
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+import collections
+import contextvars
+
+
+class NPlusOneError(RuntimeError):
+    """
+    Raised at the end of a request that crossed NPLUSONE_THRESHOLD, when
+    NPLUSONE_RAISE is set (in tests).
+    """
+
+
+class RequestQueries:
+    """
+    The lazy loads and SQL statements of one request.
+    """
+
+    __slots__ = ('lazy_loads', 'statements', 'lazy_pending')
+
+    def __init__(self):
+        # 'Booking.car' -> times it was loaded lazily
+        self.lazy_loads = collections.Counter()
+        # SQL text -> times it was run, lazy loads left out
+        self.statements = collections.Counter()
+        # The next statement is the lazy load just counted
+        self.lazy_pending = False
+
+    def offenders(self, threshold):
+        """
+        (what, count) for everything repeated threshold times or more.
+        """
+        found = [(f'{relationship} loaded lazily', count)
+                 for relationship, count in self.lazy_loads.items() if count >= threshold]
+        found += [(f'statement run: {" ".join(statement.split())[:300]}', count)
+                  for statement, count in self.statements.items() if count >= threshold]
+        return sorted(found, key=lambda item: item[1], reverse=True)
+
+
+# The queries of the request being served by this thread
+_current = contextvars.ContextVar('request_queries', default=None)
+
+
+def _request_started(app, **extra):
+    _current.set(RequestQueries() if request.endpoint else None)
+
+
+def _request_tearing_down(app, **extra):
+    queries = _current.get()
+    if queries is None:
+        return
+    _current.set(None)
+
+    offenders = queries.offenders(app.config.get('NPLUSONE_THRESHOLD', 5))
+    if not offenders:
+        return
+    report = '; '.join(f'{what} {count} times' for what, count in offenders)
+    message = f"Possible N+1 queries in {request.endpoint} ({request.method} {request.path}): {report}"
+    if app.config.get('NPLUSONE_RAISE'):
+        raise NPlusOneError(message)
+    app.logger.warning(message)
+
+
+def _do_orm_execute(orm_execute_state):
+    queries = _current.get()
+    # Only SELECTs have load options; asking an UPDATE, DELETE or text()
+    # statement for lazy_loaded_from raises
+    if queries is None or not orm_execute_state.is_select:
+        return
+    # Eager loads (selectinload and the like) run once per query and have
+    # no instance they are loaded from
+    if orm_execute_state.lazy_loaded_from is not None:
+        path = orm_execute_state.loader_strategy_path
+        queries.lazy_loads[str(path[-1]) if path else 'relationship'] += 1
+        queries.lazy_pending = True
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    queries = _current.get()
+    if queries is not None:
+        if queries.lazy_pending:
+            queries.lazy_pending = False
+        else:
+            queries.statements[statement] += 1
+
+
+def init_app(app, engine):
+    """
+    With NPLUSONE_DETECT set, check every request for relationships loaded
+    lazily, or SQL statements run, NPLUSONE_THRESHOLD times or more: the
+    signs of a query per row inside a loop. Such requests are logged as
+    warnings naming the endpoint and the relationship or statement, or
+    fail with NPlusOneError when NPLUSONE_RAISE is set.
+    """
+    if not app.config.get('NPLUSONE_DETECT'):
+        return
+
+    request_started.connect(_request_started, app)
+    request_tearing_down.connect(_request_tearing_down, app)
+    # Sessions of every app; requests of apps without detection are not tracked
+    if not event.contains(Session, 'do_orm_execute', _do_orm_execute):
+        event.listen(Session, 'do_orm_execute', _do_orm_execute)
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from sqlalchemy import and_
+
+# Every helper returns a half-open (start, end) datetime pair so that
+# filters compare the raw indexed column: column >= start AND column < end.
+
+
+def month_range(year, month):
+    """
+    Range covering one calendar month (1-12).
+    """
+    if month not in range(1, 13):
+        raise ValueError(f'Invalid month: {month}')
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def quarter_range(year, quarter):
+    """
+    Range covering one calendar quarter (1-4).
+    """
+    if quarter not in (1, 2, 3, 4):
+        raise ValueError(f'Invalid quarter: {quarter}')
+    start, _ = month_range(year, (quarter - 1) * 3 + 1)
+    _, end = month_range(year, quarter * 3)
+    return start, end
+
+
+def year_range(year):
+    """
+    Range covering one calendar year.
+    """
+    return datetime(year, 1, 1), datetime(year + 1, 1, 1)
+
+
+def day_range(first_day, last_day):
+    """
+    Range covering the days first_day through last_day, both included.
+    Accepts date or datetime values; times are truncated to midnight.
+    """
+    start = datetime(first_day.year, first_day.month, first_day.day)
+    end = datetime(last_day.year, last_day.month, last_day.day) + timedelta(days=1)
+    if end <= start:
+        raise ValueError('The last day must not be before the first day.')
+    return start, end
+
+
+def within(column, period):
+    """
+    Sargable predicate selecting rows whose column falls inside period.
+    """
+    start, end = period
+    return and_(column >= start, column < end)
@@ -0,0 +1,566 @@
+from . import db
+from .models import Car, Booking, Customer, CustomerStats, Maintenance
+from .periods import within, day_range
+from .availability import BLOCKING_MAINTENANCE_STATUSES, day_offset
+from datetime import datetime, timedelta
+from sqlalchemy.orm import joinedload, contains_eager
+from sqlalchemy import func, and_, or_, case, cast, literal, select, union_all, Float, Integer
+from bisect import bisect_right
+from collections import Counter
+import base64
+import json
+
+
+def booking_totals(period):
+    """
+    Count and sum the bookings starting in period with a single aggregate.
+    Returns a dict with total_bookings, total_revenue and total_deposit.
+    """
+    row = db.session.query(
+        func.count(Booking.id),
+        func.coalesce(func.sum(Booking.total_cost), 0),
+        func.coalesce(func.sum(Booking.deposit_amount), 0)
+    ).filter(
+        within(Booking.start_date, period)
+    ).one()
+
+    return {
+        'total_bookings': row[0],
+        'total_revenue': float(row[1]),
+        'total_deposit': float(row[2])
+    }
+
+
+def maintenance_totals(period):
+    """
+    Count maintenance records started in period and sum their cost.
+    """
+    row = db.session.query(
+        func.count(Maintenance.id),
+        func.coalesce(func.sum(Maintenance.cost), 0)
+    ).filter(
+        within(Maintenance.start_date, period)
+    ).one()
+
+    return {
+        'total_records': row[0],
+        'total_cost': float(row[1])
+    }
+
+
+def car_performance():
+    """
+    Lifetime rentals, income, maintenance cost and net revenue for every car.
+    Bookings and maintenance are aggregated per car_id in subqueries and
+    joined onto the car list, so the whole report is a single statement.
+    """
+    booking_stats = db.session.query(
+        Booking.car_id.label('car_id'),
+        func.count(Booking.id).label('total_rentals'),
+        func.coalesce(func.sum(Booking.total_cost), 0).label('total_income')
+    ).group_by(Booking.car_id).subquery()
+
+    maintenance_stats = db.session.query(
+        Maintenance.car_id.label('car_id'),
+        func.coalesce(func.sum(Maintenance.cost), 0).label('total_maintenance_cost')
+    ).group_by(Maintenance.car_id).subquery()
+
+    rows = db.session.query(
+        Car.id,
+        Car.model,
+        Car.license_plate,
+        func.coalesce(booking_stats.c.total_rentals, 0),
+        func.coalesce(booking_stats.c.total_income, 0),
+        func.coalesce(maintenance_stats.c.total_maintenance_cost, 0)
+    ).outerjoin(
+        booking_stats, booking_stats.c.car_id == Car.id
+    ).outerjoin(
+        maintenance_stats, maintenance_stats.c.car_id == Car.id
+    ).order_by(Car.id).all()
+
+    performance = {}
+    for car_id, model, license_plate, total_rentals, total_income, total_maintenance_cost in rows:
+        total_income = float(total_income)
+        total_maintenance_cost = float(total_maintenance_cost)
+        performance[car_id] = {
+            'model': model or 'Unknown',
+            'license_plate': license_plate or 'N/A',
+            'total_rentals': total_rentals,
+            'total_income': total_income,
+            'total_maintenance_cost': total_maintenance_cost,
+            'net_revenue': total_income - total_maintenance_cost
+        }
+    return performance
+
+
+# Client list sort orders: sort key -> descending
+CLIENT_SORTS = {
+    'name': False,
+    'spent': True,
+    'recent': True
+}
+
+
+def encode_cursor(value, row_id):
+    """
+    Opaque keyset cursor for the row (value, row_id).
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([value, row_id]).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_cursor(cursor):
+    """
+    The (value, row_id) of an encode_cursor() cursor. Raises ValueError
+    for anything else, such as a cursor edited or cut short in a URL.
+    """
+    try:
+        # Bad base64 and bad JSON raise ValueErrors; the wrong JSON shape,
+        # a TypeError
+        value, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        row_id = int(row_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f'Invalid cursor: {cursor}') from e
+    if value is not None and not isinstance(value, (str, int, float)):
+        raise ValueError(f'Invalid cursor: {cursor}')
+    return value, row_id
+
+
+def client_stats_page(sort='name', cursor=None, per_page=50, nationality=None):
+    """
+    One page of clients with their booking count, amount spent and last
+    booking time, read from the customer_stats rows and keyset-paginated on
+    (sort key, id), so the spend and recency sorts walk their indexes.
+    Clients who never booked come last in the recency sort. Returns (rows,
+    next_cursor); next_cursor is None on the last page. Each row is a dict
+    with client, total_bookings, total_amount_spent, active_bookings and
+    last_booking_at. Raises ValueError for an invalid cursor.
+    """
+    if sort not in CLIENT_SORTS:
+        sort = 'name'
+    descending = CLIENT_SORTS[sort]
+
+    sort_key, row_id = {
+        'name': (Customer.name, Customer.id),
+        'spent': (CustomerStats.total_spent, CustomerStats.customer_id),
+        'recent': (CustomerStats.last_booking_at, CustomerStats.customer_id)
+    }[sort]
+
+    query = db.session.query(Customer, CustomerStats).join(
+        CustomerStats, CustomerStats.customer_id == Customer.id
+    )
+
+    if nationality:
+        query = query.filter(Customer.nationality == nationality)
+
+    value = last_id = None
+    if cursor:
+        value, last_id = decode_cursor(cursor)
+        # Refuse a cursor of another sort rather than compare unlike values
+        if value is not None and not isinstance(value, (int, float) if sort == 'spent' else str):
+            raise ValueError(f'Invalid cursor for the {sort} sort: {cursor}')
+        if sort == 'recent' and value is not None:
+            value = datetime.fromisoformat(value)
+
+    def page(query):
+        if cursor:
+            if descending:
+                query = query.filter(or_(sort_key < value, and_(sort_key == value, row_id < last_id)))
+            else:
+                query = query.filter(or_(sort_key > value, and_(sort_key == value, row_id > last_id)))
+        if descending:
+            return query.order_by(sort_key.desc(), row_id.desc())
+        return query.order_by(sort_key.asc(), row_id.asc())
+
+    if sort == 'recent':
+        # Booked clients newest first, then the never-booked ones (a None
+        # cursor value) by id; each part stays on the recency index
+        rows = []
+        if not cursor or value is not None:
+            rows = page(query.filter(sort_key.isnot(None))).limit(per_page + 1).all()
+        if len(rows) <= per_page:
+            never_booked = query.filter(sort_key.is_(None))
+            if cursor and value is None:
+                never_booked = never_booked.filter(row_id < last_id)
+            rows += never_booked.order_by(row_id.desc()).limit(per_page + 1 - len(rows)).all()
+    else:
+        rows = page(query).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        client, stats = rows[-1]
+        last_value = {
+            'name': client.name,
+            'spent': stats.total_spent,
+            'recent': stats.last_booking_at
+        }[sort]
+        next_cursor = encode_cursor(last_value, client.id)
+
+    return [{
+        'client': client,
+        'total_bookings': stats.booking_count,
+        'total_amount_spent': stats.total_spent,
+        'active_bookings': stats.active_booking_count,
+        'last_booking_at': stats.last_booking_at
+    } for client, stats in rows], next_cursor
+
+
+def latest_bookings(customer_ids):
+    """
+    The most recent booking of each given customer, with the car model,
+    fetched in one query. Returns {customer_id: {'created_at', 'car_model'}}.
+    """
+    if not customer_ids:
+        return {}
+
+    latest = db.session.query(
+        Booking.customer_id.label('customer_id'),
+        func.max(Booking.created_at).label('created_at')
+    ).filter(
+        Booking.customer_id.in_(customer_ids)
+    ).group_by(Booking.customer_id).subquery()
+
+    rows = db.session.query(
+        Booking.customer_id,
+        Booking.created_at,
+        Car.model
+    ).join(
+        latest,
+        and_(latest.c.customer_id == Booking.customer_id, latest.c.created_at == Booking.created_at)
+    ).join(Car, Car.id == Booking.car_id).all()
+
+    return {
+        customer_id: {'created_at': created_at, 'car_model': model}
+        for customer_id, created_at, model in rows
+    }
+
+
+def filtered_bookings(status=None, car_id=None, customer=None, first_day=None, last_day=None, employee_id=None):
+    """
+    Booking query joined to its customer and narrowed by the booking list
+    filters. customer matches part of the customer name; first_day and
+    last_day bound the start date, both included.
+    """
+    query = Booking.query.join(Booking.customer)
+    if status:
+        query = query.filter(Booking.status == status)
+    if car_id:
+        query = query.filter(Booking.car_id == car_id)
+    if customer:
+        query = query.filter(Customer.name.ilike(f'%{customer}%'))
+    if first_day and last_day:
+        query = query.filter(within(Booking.start_date, day_range(first_day, last_day)))
+    elif first_day:
+        query = query.filter(Booking.start_date >= day_range(first_day, first_day)[0])
+    elif last_day:
+        query = query.filter(Booking.start_date < day_range(last_day, last_day)[1])
+    if employee_id is not None:
+        query = query.filter(Booking.employee_id == employee_id)
+    return query
+
+
+def bookings_page(query, cursor=None, per_page=50):
+    """
+    One page of a filtered_bookings() query, newest first, keyset-paginated
+    on (created_at, id). The car, customer and employee are loaded in the
+    same statement. Returns (bookings, next_cursor); next_cursor is None
+    on the last page.
+    """
+    query = query.options(
+        contains_eager(Booking.customer),
+        joinedload(Booking.car),
+        joinedload(Booking.employee)
+    )
+
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        created_at = datetime.fromisoformat(created_at)
+        query = query.filter(or_(
+            Booking.created_at < created_at,
+            and_(Booking.created_at == created_at, Booking.id < last_id)
+        ))
+
+    bookings = query.order_by(Booking.created_at.desc(), Booking.id.desc()).limit(per_page + 1).all()
+    next_cursor = None
+    if len(bookings) > per_page:
+        bookings = bookings[:per_page]
+        next_cursor = encode_cursor(bookings[-1].created_at, bookings[-1].id)
+    return bookings, next_cursor
+
+
+def bookings_summary(query):
+    """
+    Count, active count and total cost of every booking matched by a
+    filtered_bookings() query, in one aggregate.
+    """
+    row = query.with_entities(
+        func.count(Booking.id),
+        func.coalesce(func.sum(case((Booking.status == 'active', 1), else_=0)), 0),
+        func.coalesce(func.sum(Booking.total_cost), 0)
+    ).one()
+
+    return {
+        'total_bookings': row[0],
+        'active_bookings': int(row[1]),
+        'total_revenue': float(row[2])
+    }
+
+
+# Bookings in this status do not count as rented days in the utilisation
+# report
+CANCELLED_BOOKING_STATUS = 'cancelled'
+
+# Ways the utilisation report can be grouped
+UTILISATION_GROUPS = ('car', 'category', 'month')
+
+
+def _greatest(*values):
+    """
+    The largest of values, in SQL; SQLite spells it max().
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return func.greatest(*values)
+    return func.max(*values)
+
+
+def _least(*values):
+    """
+    The smallest of values, in SQL; SQLite spells it min().
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return func.least(*values)
+    return func.min(*values)
+
+
+def _grouped_apart(columns, aggregates, *criteria):
+    """
+    Rows of the aggregates grouped by each of columns in turn, as
+    (*columns, *aggregates) with all but the grouping column NULL. One
+    scan with PostgreSQL's grouping sets, a union elsewhere.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return db.session.execute(
+            select(*columns, *aggregates).where(*criteria).group_by(func.grouping_sets(*columns))
+        ).all()
+    nulls = [literal(None, Integer)] * len(columns)
+    return db.session.execute(union_all(*[
+        select(*nulls[:index], column, *nulls[index + 1:], *aggregates).where(*criteria).group_by(column)
+        for index, column in enumerate(columns)
+    ])).all()
+
+
+def _buckets(first_day, last_day, by_month):
+    """
+    The reporting window as (bucket_start, first, last) tuples: the whole
+    window, or one per calendar month clipped to the window. first and
+    last are the day offsets of the bucket's first and last day from
+    first_day.
+    """
+    buckets = []
+    start = first_day
+    while start <= last_day:
+        last = last_day
+        if by_month:
+            next_month = datetime(start.year + 1, 1, 1) if start.month == 12 else datetime(start.year, start.month + 1, 1)
+            last = min(last_day, next_month - timedelta(days=1))
+        buckets.append((start, (start - first_day).days, (last - first_day).days))
+        start = last + timedelta(days=1)
+    return buckets
+
+
+def _spread(buckets, bucket_firsts, first, last):
+    """
+    (bucket first, days) for each bucket overlapping the days first to
+    last, both day offsets inside the window. bucket_firsts lists the
+    buckets' first days, which are searched rather than scanned.
+    """
+    index = bisect_right(bucket_firsts, first) - 1
+    while index < len(buckets) and bucket_firsts[index] <= last:
+        _, bucket, bucket_last = buckets[index]
+        yield bucket, min(last, bucket_last) - max(first, bucket) + 1
+        index += 1
+
+
+def utilisation(first_day, last_day, group_by='car'):
+    """
+    Fleet utilisation over the window [first_day, last_day], grouped per
+    car, per category or per month.
+
+    Booking and maintenance intervals are clipped to the window as day
+    offsets and summed in the database, so that the heavy lifting is done
+    there whatever the table sizes: per car over the whole window, or per
+    day a booking starts or ends when grouping per month, the days in
+    between being filled in here. Booking revenue is prorated by the
+    share of its days falling inside the bucket, and booking length and
+    lead time are averaged over bookings starting in the bucket. Days are
+    calendar days, both ends included, as rentals are charged. Three
+    statements whatever the window: the cars, the bookings and the
+    maintenance records.
+    """
+    if group_by not in UTILISATION_GROUPS:
+        raise ValueError(f'Invalid grouping: {group_by}')
+    first_day = datetime(first_day.year, first_day.month, first_day.day)
+    last_day = datetime(last_day.year, last_day.month, last_day.day)
+    if last_day < first_day:
+        raise ValueError('The last day must not be before the first day.')
+
+    buckets = _buckets(first_day, last_day, by_month=group_by == 'month')
+    bucket_firsts = [bucket for _, bucket, _ in buckets]
+    window = buckets[-1][2] + 1
+    after_last_day = last_day + timedelta(days=1)
+
+    cars = db.session.execute(
+        select(Car.id, Car.model, Car.license_plate, Car.category).order_by(Car.id)
+    ).all()
+
+    start = day_offset(Booking.start_date, first_day)
+    end = day_offset(Booking.end_date, first_day)
+    first = _greatest(start, 0)
+    last = _least(end, window - 1)
+    booking_days = cast(end - start + 1, Float)
+    started = Booking.start_date >= first_day
+    started_sums = [
+        func.sum(case((started, 1), else_=0)).label('started'),
+        func.sum(case((started, end - start + 1), else_=0)).label('booking_days'),
+        func.sum(case((started, _greatest(start - day_offset(Booking.created_at, first_day), 0)), else_=0)).label('lead_days'),
+        func.sum(case((and_(started, Booking.created_at.isnot(None)), 1), else_=0)).label('lead_count')
+    ]
+    in_window = and_(
+        Booking.status != CANCELLED_BOOKING_STATUS,
+        Booking.start_date < after_last_day,
+        Booking.end_date >= first_day
+    )
+
+    if group_by == 'month':
+        # Bookings on the road and their daily revenue only change on the
+        # days bookings start and the days after they end. Summed per such
+        # day they are a few thousand rows whatever the table size, and the
+        # days in between are filled in here.
+        rented = _grouped_apart(
+            [first, last], [func.count(), func.sum(Booking.total_cost / booking_days), *started_sums], in_window
+        )
+    else:
+        # The window is the only bucket, so each car's days are summed in
+        # one pass
+        days = last - first + 1
+        rented = db.session.execute(
+            select(
+                Booking.car_id,
+                func.sum(days),
+                func.sum(Booking.total_cost * days / booking_days),
+                *started_sums
+            ).where(in_window).group_by(Booking.car_id)
+        ).all()
+
+    # Days off the road per car. Open maintenance without an end date runs
+    # to the window end; completed work without one takes its start day.
+    start = day_offset(Maintenance.start_date, first_day)
+    end = func.coalesce(
+        day_offset(Maintenance.end_date, first_day),
+        case((Maintenance.status == 'completed', start), else_=window - 1)
+    )
+    first = _greatest(start, 0)
+    last = _least(end, window - 1)
+    maintenance_spans = db.session.execute(
+        select(Maintenance.car_id, first, last, func.count()).where(
+            Maintenance.status.in_(BLOCKING_MAINTENANCE_STATUSES + ('completed',)),
+            Maintenance.start_date < after_last_day,
+            or_(Maintenance.end_date.is_(None), Maintenance.end_date >= first_day)
+        ).group_by(Maintenance.car_id, first, last)
+    ).all()
+
+    maintenance = {}
+    for car_id, span_first, span_last, records in maintenance_spans:
+        for bucket, days in _spread(buckets, bucket_firsts, span_first, span_last):
+            maintenance[bucket, car_id] = maintenance.get((bucket, car_id), 0) + records * days
+
+    def key(bucket, car):
+        return {'car': car.id, 'category': car.category, 'month': bucket}[group_by]
+
+    totals = {}
+    cars_by_id = {car.id: car for car in cars}
+    bucket_days = {bucket: bucket_last - bucket + 1 for _, bucket, bucket_last in buckets}
+    groups = Counter(key(0, car) for car in cars) if group_by != 'month' else dict.fromkeys(bucket_days, len(cars))
+    for group, count in groups.items():
+        totals[group] = dict.fromkeys(
+            ('maintenance_days', 'rented_days', 'revenue', 'bookings', 'booking_days', 'lead_days', 'lead_count'), 0
+        )
+        totals[group].update(cars=count, calendar_days=count * bucket_days[group if group_by == 'month' else 0])
+
+    # Overlapping maintenance records can not take more days than the bucket has
+    for (bucket, car_id), days in maintenance.items():
+        totals[key(bucket, cars_by_id[car_id])]['maintenance_days'] += min(days, bucket_days[bucket])
+
+    if group_by == 'month':
+        changes = {}
+        for starting, ending, bookings, daily_revenue, *started in rented:
+            if starting is not None:
+                change = changes.setdefault(starting, [0, 0, 0, 0, 0, 0])
+                change[0] += bookings
+                change[1] += daily_revenue
+                for index, value in enumerate(started, 2):
+                    change[index] += value
+            else:
+                change = changes.setdefault(ending + 1, [0, 0, 0, 0, 0, 0])
+                change[0] -= bookings
+                change[1] -= daily_revenue
+
+        bookings = daily_revenue = 0
+        for _, bucket, bucket_last in buckets:
+            values = totals[bucket]
+            for day in range(bucket, bucket_last + 1):
+                if day in changes:
+                    change = changes[day]
+                    bookings += change[0]
+                    daily_revenue += change[1]
+                    # A booking is counted in the month it starts in
+                    values['bookings'] += change[2]
+                    values['booking_days'] += change[3]
+                    values['lead_days'] += change[4]
+                    values['lead_count'] += change[5]
+                values['rented_days'] += bookings
+                values['revenue'] += daily_revenue
+    else:
+        for car_id, rented_days, revenue, started, booking_days, lead_days, lead_count in rented:
+            values = totals[key(0, cars_by_id[car_id])]
+            values['rented_days'] += rented_days
+            values['revenue'] += revenue
+            values['bookings'] += started
+            values['booking_days'] += booking_days
+            values['lead_days'] += lead_days
+            values['lead_count'] += lead_count
+
+    starts = {bucket: bucket_start for bucket_start, bucket, _ in buckets}
+    report = []
+    for group in sorted(totals, key=lambda group: (group is None, group)):
+        # PostgreSQL sums integers as numeric
+        values = {name: float(value) if name == 'revenue' else int(value) for name, value in totals[group].items()}
+        available_days = values['calendar_days'] - values['maintenance_days']
+        entry = {
+            'cars': values['cars'],
+            'calendar_days': values['calendar_days'],
+            'maintenance_days': values['maintenance_days'],
+            'available_days': available_days,
+            'rented_days': values['rented_days'],
+            'utilisation': values['rented_days'] / available_days if available_days > 0 else 0,
+            'revenue': values['revenue'],
+            'revenue_per_available_day': values['revenue'] / available_days if available_days > 0 else 0,
+            'bookings': values['bookings'],
+            'avg_booking_days': values['booking_days'] / values['bookings'] if values['bookings'] else 0,
+            'avg_lead_days': values['lead_days'] / values['lead_count'] if values['lead_count'] else 0
+        }
+
+        if group_by == 'car':
+            car = cars_by_id[group]
+            entry.update({'car_id': car.id, 'model': car.model, 'license_plate': car.license_plate,
+                          'category': car.category})
+        elif group_by == 'category':
+            entry['category'] = group
+        else:
+            entry['month'] = starts[group].strftime('%Y-%m')
+        report.append(entry)
+
+    return report
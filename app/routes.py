@@ -1,18 +1,20 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify, current_app
 from flask_login import login_required, current_user
 from .models import Car, Booking, Customer, CarImage, Maintenance, Expense, Income, User, AgencyVisibleCar, AgencyCarStatus
-from . import db
+from . import db, availability, blobs, car_order, customer_search, customer_stats, db_pool, images, instrumentation, ledger, reports, storage, uploads
+from .fleet import fleet_status
+from .periods import within, month_range, year_range
 from datetime import datetime
 import os
-from werkzeug.utils import secure_filename
 import json
 from datetime import timedelta
 from werkzeug.security import generate_password_hash
 from functools import wraps
-from sqlalchemy import extract
-from sqlalchemy.orm import joinedload
+import hmac
+from sqlalchemy.orm import joinedload, selectinload
 from flask import send_from_directory
 from sqlalchemy.exc import SQLAlchemyError, DatabaseError
+from werkzeug.exceptions import RequestEntityTooLarge
 
 def admin_required(f):
     @wraps(f)
@@ -58,92 +60,30 @@ def agency_only(f):
 
 main = Blueprint('main', __name__)
 
-# Configure upload folder
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'app', 'static', 'uploads', 'cars')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+# Templates pick resized car image variants through these
+main.add_app_template_global(images.url, 'image_url')
+main.add_app_template_global(images.srcset, 'image_srcset')
+main.add_app_template_global(images.thumbnail, 'image_thumbnail')
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Page size of the client list
+CLIENTS_PER_PAGE = 50
 
-def save_image(file, car_id):
-    if file and allowed_file(file.filename):
-        # Create car directory if it doesn't exist
-        car_dir = os.path.join(UPLOAD_FOLDER, str(car_id))
-        os.makedirs(car_dir, exist_ok=True)
-        
-        # Secure the filename and save the file
-        filename = secure_filename(file.filename)
-        file_path = os.path.join(car_dir, filename)
-        file.save(file_path)
-        
-        # Return the relative path for database storage
-        return os.path.join('uploads', 'cars', str(car_id), filename)
-    return None
+# Page size of the dashboard booking list
+BOOKINGS_PER_PAGE = 50
 
 @main.route('/')
 @login_required
 def home():
-    # Check if the current user is an agency
+    # Agencies only see the cars made visible to them
     if current_user.role == 'agency':
-        # Get the IDs of cars visible to this agency
-        visible_car_ids = [vc.car_id for vc in current_user.agency_visible_cars]
-        
-        # Filter cars based on visibility and sort by display_order
-        cars = Car.query.filter(Car.id.in_(visible_car_ids)).order_by(Car.display_order).all()
+        board = fleet_status.for_agency(current_user.id)
     else:
-        # For non-agency users, show all cars sorted by display_order
-        cars = Car.query.order_by(Car.display_order).all()
-
-    # Get active bookings with their associated cars and customers
-    active_bookings = Booking.query.join(Customer).join(User, Booking.employee_id == User.id).filter(
-        Booking.status == 'active',
-        User.role.in_(['admin', 'manager'])
-    ).options(
-        joinedload(Booking.car),
-        joinedload(Booking.customer),
-        joinedload(Booking.employee)
-    ).all()
-
-    # Create a dictionary to store booking information for each car
-    car_bookings = {}
-    for booking in active_bookings:
-        car_bookings[booking.car_id] = {
-            'customer_name': booking.customer.name,
-            'start_date': booking.start_date,
-            'end_date': booking.end_date,
-            'booked_by_role': booking.employee.role
-        }
-
-    # Get agency car statuses that override default availability
-    agency_car_statuses = AgencyCarStatus.query.filter(
-        AgencyCarStatus.status.in_(['booked', 'unavailable'])
-    ).all()
-
-    # Create a dictionary to store agency-specific car statuses
-    agency_statuses = {}
-    for status in agency_car_statuses:
-        agency_statuses[status.car_id] = status.status
-
-    # Annotate cars with their booking and agency status information
-    for car in cars:
-        car.current_booking = car_bookings.get(car.id)
-        
-        # Override car availability based on booking and agency status
-        if car.current_booking:
-            # If booked by admin/manager, prevent agency status modification
-            if car.current_booking['booked_by_role'] in ['admin', 'manager']:
-                car.is_available = False
-        elif car.id in agency_statuses:
-            # Agency-specific status for non-booked cars
-            if agency_statuses[car.id] == 'booked':
-                car.current_booking = {'customer_name': 'Agency Marked', 'start_date': datetime.now(), 'end_date': datetime.now()}
-            elif agency_statuses[car.id] == 'unavailable':
-                car.is_available = False
+        board = fleet_status.snapshot()
 
     return render_template('home.html', 
-                           cars=cars, 
-                           total_cars=len(cars), 
-                           booked_cars_count=len(active_bookings))
+                           cars=board['cars'], 
+                           total_cars=len(board['cars']), 
+                           booked_cars_count=board['booked_count'])
 
 @main.route('/dashboard')
 @login_required
@@ -153,42 +93,24 @@ def dashboard():
     current_month = datetime.now().month
     current_year = datetime.now().year
 
-    # Income Summary
-    incomes = Income.query.filter(
-        extract('year', Income.date) == current_year,
-        extract('month', Income.date) == current_month
-    ).all()
-    total_income = sum(income.amount for income in incomes)
-    income_by_category = {}
-    for income in incomes:
-        income_by_category[income.category] = income_by_category.get(income.category, 0) + income.amount
-
-    # Expense Summary
-    expenses = Expense.query.filter(
-        extract('year', Expense.date) == current_year,
-        extract('month', Expense.date) == current_month
-    ).all()
-    total_expenses = sum(expense.amount for expense in expenses)
-    expense_by_category = {}
-    for expense in expenses:
-        expense_by_category[expense.category] = expense_by_category.get(expense.category, 0) + expense.amount
+    # Income and expense summaries from the monthly ledger
+    income_summary = ledger.month_summary('income', current_year, current_month)
+    expense_summary = ledger.month_summary('expense', current_year, current_month)
 
     # Booking Summary
-    total_bookings = Booking.query.filter(
-        extract('year', Booking.start_date) == current_year,
-        extract('month', Booking.start_date) == current_month
-    ).count()
+    total_bookings = ledger.month_summary('booking', current_year, current_month)['count']
 
-    # Car Availability
+    # Car Availability: cars with no booking or maintenance today
     total_cars = Car.query.count()
-    available_cars = Car.query.filter_by(is_available=True).count()
+    today = datetime.now()
+    available_cars = availability.free_cars_query(today, today).count()
 
     # Prepare context for dashboard
     dashboard_context = {
-        'total_income': total_income,
-        'income_by_category': income_by_category,
-        'total_expenses': total_expenses,
-        'expense_by_category': expense_by_category,
+        'total_income': income_summary['total'],
+        'income_by_category': income_summary['by_category'],
+        'total_expenses': expense_summary['total'],
+        'expense_by_category': expense_summary['by_category'],
         'total_bookings': total_bookings,
         'total_cars': total_cars,
         'available_cars': available_cars,
@@ -197,15 +119,52 @@ def dashboard():
         'current_datetime': datetime.now()
     }
 
-    # If not admin or manager/secretary, show only user's bookings
-    if not (current_user.is_admin or current_user.role in ['manager', 'secretary']):
-        dashboard_context['bookings'] = Booking.query.filter_by(employee_id=current_user.id).order_by(Booking.created_at.desc()).all()
-    else:
-        dashboard_context['bookings'] = Booking.query.order_by(Booking.created_at.desc()).all()
-        dashboard_context['cars'] = Car.query.all()
-
+    # The booking list is loaded page by page from /api/bookings
     return render_template('dashboard.html', **dashboard_context)
 
+@main.route('/api/bookings')
+@login_required
+def api_bookings():
+    try:
+        first_day = datetime.strptime(request.args['from'], '%Y-%m-%d') if request.args.get('from') else None
+        last_day = datetime.strptime(request.args['to'], '%Y-%m-%d') if request.args.get('to') else None
+        query = reports.filtered_bookings(
+            status=request.args.get('status') or None,
+            car_id=request.args.get('car_id', type=int),
+            customer=request.args.get('customer', '').strip() or None,
+            first_day=first_day,
+            last_day=last_day,
+            # If not admin or manager/secretary, show only user's bookings
+            employee_id=None if current_user.is_admin or current_user.role in ['manager', 'secretary'] else current_user.id
+        )
+        cursor = request.args.get('cursor') or None
+        bookings, next_cursor = reports.bookings_page(query, cursor=cursor, per_page=BOOKINGS_PER_PAGE)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': f'Invalid booking filters: {str(e)}'}), 400
+
+    response = {
+        'bookings': [{
+            'id': b.id,
+            'customer_name': b.customer.name,
+            'car_model': b.car.model,
+            'car_daily_rate': b.car.daily_rate,
+            'employee_name': b.employee.name,
+            'start_date': b.start_date.strftime('%Y-%m-%d'),
+            'end_date': b.end_date.strftime('%Y-%m-%d'),
+            'status': b.status,
+            'total_cost': b.total_cost,
+            'deposit_amount': b.deposit_amount,
+            'created_at': b.created_at.isoformat() if b.created_at else None
+        } for b in bookings],
+        'next_cursor': next_cursor
+    }
+
+    # Totals over every matching booking come with the first page only
+    if not cursor:
+        response['summary'] = reports.bookings_summary(query)
+
+    return jsonify(response)
+
 @main.route('/car/<int:car_id>')
 def car_details(car_id):
     car = Car.query.get_or_404(car_id)
@@ -221,16 +180,10 @@ def book_car(car_id):
     
     car = Car.query.get_or_404(car_id)
     
-    if not car.is_available:
-        flash('This car is currently rented and not available for booking.', 'error')
-        return redirect(url_for('main.home'))
-    
     if request.method == 'POST':
         try:
-            # Detailed logging of form data
-            print("Booking Form Data:")
-            for key, value in request.form.items():
-                print(f"{key}: {value}")
+            # Field names only: the values are customer details
+            current_app.logger.debug(f"Booking form for car {car_id}: fields {sorted(request.form.keys())}")
             
             # Comprehensive field validation
             required_fields = [
@@ -242,7 +195,7 @@ def book_car(car_id):
             missing_fields = [field for field in required_fields if not request.form.get(field)]
             if missing_fields:
                 error_msg = f"Missing required fields: {', '.join(missing_fields)}"
-                print(error_msg)
+                current_app.logger.debug(error_msg)
                 flash(error_msg, 'error')
                 return render_template('book_car.html', car=car)
             
@@ -260,8 +213,13 @@ def book_car(car_id):
                 flash('Name, Phone, and NIN/Passport Number are required.', 'error')
                 return render_template('book_car.html', car=car)
             
-            # Check for existing customer
-            existing_customer = Customer.query.filter_by(nin_passport_number=nin_passport_number).first()
+            # Check for existing customer by normalized NIN/passport, then phone
+            by_nin, by_phone = customer_search.find_by_identity(phone=phone, nin_passport_number=nin_passport_number)
+            # A phone match is the same customer only if it has no NIN/passport yet
+            existing_customer = by_nin or (by_phone if by_phone and not by_phone.nin_key else None)
+            if by_phone and by_phone is not existing_customer:
+                flash('This phone number already belongs to another customer.', 'error')
+                return render_template('book_car.html', car=car)
             
             # Determine customer (existing or new)
             if existing_customer:
@@ -271,9 +229,10 @@ def book_car(car_id):
                 existing_customer.email = email
                 existing_customer.address = address
                 existing_customer.license_number = license_number
+                existing_customer.nin_passport_number = nin_passport_number
                 existing_customer.nationality = nationality
                 customer = existing_customer
-                print(f"Updating existing customer: {customer.id}")
+                current_app.logger.debug(f"Updating existing customer: {customer.id}")
             else:
                 # Create new customer
                 customer = Customer(
@@ -291,16 +250,16 @@ def book_car(car_id):
                 # Flush to get the customer ID
                 try:
                     db.session.flush()
-                    print(f"New customer created with ID: {customer.id}")
+                    current_app.logger.debug(f"New customer created with ID: {customer.id}")
                 except Exception as customer_save_error:
-                    print(f"Error saving customer: {customer_save_error}")
+                    current_app.logger.error(f"Error saving customer: {customer_save_error}")
                     db.session.rollback()
                     flash('Error creating customer.', 'error')
                     return render_template('book_car.html', car=car)
             
             # Validate customer has an ID
             if not customer.id:
-                print("Customer ID is None")
+                current_app.logger.error("Customer ID is None")
                 flash('Error: Could not create or retrieve customer.', 'error')
                 return render_template('book_car.html', car=car)
             
@@ -316,8 +275,13 @@ def book_car(car_id):
                 flash('Invalid date format. Please use YYYY-MM-DD', 'error')
                 return render_template('book_car.html', car=car)
             
+            # Reject dates that clash with another booking or a maintenance window
+            if not availability.car_is_free(car.id, start_date, end_date):
+                flash('This car is already booked or under maintenance for the selected dates.', 'error')
+                return render_template('book_car.html', car=car)
+            
             # Calculate total cost and deposit
-            days = (end_date - start_date).days + 1
+            days = availability.rental_days(start_date, end_date)
             total_cost = car.daily_rate * days
             deposit_amount = total_cost * 0.3  # 30% deposit
             
@@ -336,26 +300,32 @@ def book_car(car_id):
                 booking_source_id = admin_agencies[0].id
                 booking_source_type = "Secretary"
             
+            # Only a booking that has already started takes the car off the road;
+            # future reservations are held by the availability check instead
+            starts_now = start_date <= datetime.now()
+            
             # Update car status with specific 'booked' status
-            car.is_available = False
+            if starts_now:
+                car.is_available = False
             
             # Create or update AgencyCarStatus for all admin agencies
             for admin_agency in admin_agencies:
                 # Update or create AgencyCarStatus
-                agency_car_status = AgencyCarStatus.query.filter_by(
-                    agency_id=admin_agency.id, 
-                    car_id=car.id
-                ).first()
-                
-                if agency_car_status:
-                    agency_car_status.status = 'booked'
-                else:
-                    agency_car_status = AgencyCarStatus(
+                if starts_now:
+                    agency_car_status = AgencyCarStatus.query.filter_by(
                         agency_id=admin_agency.id, 
-                        car_id=car.id, 
-                        status='booked'
-                    )
-                    db.session.add(agency_car_status)
+                        car_id=car.id
+                    ).first()
+                    
+                    if agency_car_status:
+                        agency_car_status.status = 'booked'
+                    else:
+                        agency_car_status = AgencyCarStatus(
+                            agency_id=admin_agency.id, 
+                            car_id=car.id, 
+                            status='booked'
+                        )
+                        db.session.add(agency_car_status)
                 
                 # Create or update AgencyVisibleCar
                 agency_visible_car = AgencyVisibleCar.query.filter_by(
@@ -383,9 +353,14 @@ def book_car(car_id):
                 notes=f"Booked through {booking_source_type} {current_user.name}"
             )
             db.session.add(new_booking)
+            ledger.record_booking(new_booking)
+            # Flush so the booking has its created_at for the customer stats
+            db.session.flush()
+            customer_stats.record_booking(new_booking)
             
             # Commit transaction
             db.session.commit()
+            fleet_status.invalidate()
             
             # Flash success message
             if not existing_customer:
@@ -398,9 +373,7 @@ def book_car(car_id):
         except Exception as e:
             # Rollback transaction and log error
             db.session.rollback()
-            print(f"Booking Error: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            current_app.logger.exception(f"Booking Error: {str(e)}")
             
             flash(f'Error creating booking: {str(e)}', 'error')
             return render_template('book_car.html', car=car)
@@ -411,50 +384,139 @@ def book_car(car_id):
 @login_required
 def search_customer():
     query = request.args.get('query', '')
-    
-    # Search across multiple fields
-    customers = Customer.query.filter(
-        (Customer.phone.contains(query)) |
-        (Customer.name.contains(query)) |
-        (Customer.license_number.contains(query)) |
-        (Customer.nin_passport_number.contains(query))
-    ).all()
-    
-    return jsonify([{
-        'id': c.id,
-        'name': c.name,
-        'phone': c.phone,
-        'email': c.email,
-        'address': c.address,
-        'license_number': c.license_number,
-        'nin_passport_number': c.nin_passport_number,
-        'nationality': c.nationality
-    } for c in customers])
+
+    # Ranked prefix/full-text search capped at CUSTOMER_SEARCH_LIMIT results.
+    # The client's token is echoed back so it can drop stale responses.
+    customers = customer_search.search(query)
+
+    return jsonify({
+        'token': request.args.get('token'),
+        'customers': [{
+            'id': c.id,
+            'name': c.name,
+            'phone': c.phone,
+            'email': c.email,
+            'address': c.address,
+            'license_number': c.license_number,
+            'nin_passport_number': c.nin_passport_number,
+            'nationality': c.nationality
+        } for c in customers]
+    })
+
+@main.route('/api/availability')
+@login_required
+def api_availability():
+    try:
+        start_date = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d')
+        end_date = datetime.strptime(request.args.get('end', ''), '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'start and end are required in YYYY-MM-DD format'}), 400
+
+    if end_date < start_date:
+        return jsonify({'error': 'end must not be before start'}), 400
+
+    car_id = request.args.get('car_id', type=int)
+    if car_id:
+        car = Car.query.get_or_404(car_id)
+        bookings, maintenance_records = availability.conflicts(car.id, start_date, end_date)
+        return jsonify({
+            'car_id': car.id,
+            'start': start_date.strftime('%Y-%m-%d'),
+            'end': end_date.strftime('%Y-%m-%d'),
+            'available': not bookings and not maintenance_records,
+            'conflicts': {
+                'bookings': [{
+                    'id': b.id,
+                    'start_date': b.start_date.strftime('%Y-%m-%d'),
+                    'end_date': b.end_date.strftime('%Y-%m-%d'),
+                    'status': b.status
+                } for b in bookings],
+                'maintenance': [{
+                    'id': m.id,
+                    'start_date': m.start_date.strftime('%Y-%m-%d'),
+                    'end_date': m.end_date.strftime('%Y-%m-%d') if m.end_date else None,
+                    'status': m.status
+                } for m in maintenance_records]
+            }
+        })
+
+    cars = availability.free_cars_query(start_date, end_date).order_by(Car.display_order).all()
+    return jsonify({
+        'start': start_date.strftime('%Y-%m-%d'),
+        'end': end_date.strftime('%Y-%m-%d'),
+        'cars': [{
+            'id': car.id,
+            'model': car.model,
+            'license_plate': car.license_plate,
+            'category': car.category,
+            'daily_rate': car.daily_rate
+        } for car in cars]
+    })
+
+@main.route('/api/fleet_calendar')
+@login_required
+@agency_only
+def api_fleet_calendar():
+    try:
+        first_day = datetime.strptime(request.args.get('from', ''), '%Y-%m-%d')
+        last_day = datetime.strptime(request.args.get('to', ''), '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'error': 'from and to are required in YYYY-MM-DD format'}), 400
+
+    car_ids = [int(car_id) for car_id in request.args.getlist('car_id') if car_id.isdigit()] or None
+
+    try:
+        calendar = availability.fleet_calendar(first_day, last_day, car_ids=car_ids)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify(calendar)
+
+@main.route('/fleet_calendar')
+@login_required
+@agency_only
+def fleet_calendar():
+    return render_template('fleet_calendar.html', today=datetime.now())
 
 @main.route('/customer_history/<int:customer_id>')
 @login_required
 def customer_history(customer_id):
     customer = Customer.query.get_or_404(customer_id)
-    bookings = Booking.query.filter_by(customer_id=customer_id).order_by(Booking.created_at.desc()).all()
-    return render_template('customer_history.html', customer=customer, bookings=bookings)
+    bookings = Booking.query.options(
+        joinedload(Booking.car),
+        joinedload(Booking.employee)
+    ).filter_by(customer_id=customer_id).order_by(Booking.created_at.desc()).all()
+    average_days = sum((booking.end_date - booking.start_date).days for booking in bookings) / len(bookings) if bookings else 0
+    return render_template('customer_history.html', customer=customer, bookings=bookings, average_days=average_days)
 
 @main.route('/manage_cars', methods=['GET', 'POST'])
 @login_required
 @manager_or_admin_required
 def manage_cars():
     if request.method == 'POST':
-        # Existing car addition logic
-        model = request.form.get('model')
-        year = request.form.get('year')
-        license_plate = request.form.get('license_plate')
-        daily_rate = request.form.get('daily_rate')
-        category = request.form.get('category')
-        description = request.form.get('description')
-        features = request.form.get('features')
+        # The images are streamed into storage while the form is read
+        try:
+            form, stored, rejected = uploads.receive_images()
+        except RequestEntityTooLarge as e:
+            flash(f'Upload too large: {e.description}', 'danger')
+            return redirect(url_for('main.manage_cars'))
+        except ValueError as e:
+            current_app.logger.warning(f"Unreadable car upload: {str(e)}")
+            flash('The upload could not be read. Please try again.', 'danger')
+            return redirect(url_for('main.manage_cars'))
+
+        model = form.get('model')
+        year = form.get('year')
+        license_plate = form.get('license_plate')
+        daily_rate = form.get('daily_rate')
+        category = form.get('category')
+        description = form.get('description')
+        features = form.get('features')
 
         # Check if car with same license plate already exists
         existing_car = Car.query.filter_by(license_plate=license_plate).first()
         if existing_car:
+            images.collect(item['path'] for item in stored)
             flash('A car with this license plate already exists.', 'danger')
             return redirect(url_for('main.manage_cars'))
 
@@ -469,49 +531,39 @@ def manage_cars():
             features=features
         )
         
-        # Set display order to the next available order
-        max_order = db.session.query(db.func.max(Car.display_order)).scalar() or 0
-        new_car.display_order = max_order + 1
+        # Listed last
+        new_car.display_order = car_order.next_position()
 
-        # Handle image upload
-        images = request.files.getlist('images')
         db.session.add(new_car)
         db.session.flush()  # To get the new car's ID
 
         # Save car images
-        for image in images:
-            if image and allowed_file(image.filename):
-                filename = save_image(image, new_car.id)
-                if filename:
-                    car_image = CarImage(car_id=new_car.id, image_path=filename)
-                    db.session.add(car_image)
+        car_images = []
+        for item in stored:
+            car_image = CarImage(car_id=new_car.id, image_path=item['path'])
+            db.session.add(car_image)
+            car_images.append(car_image)
 
-                    # Set first image as main image if not already set
-                    if not new_car.main_image:
-                        new_car.main_image = filename
+            # Set first image as main image if not already set
+            if not new_car.main_image:
+                new_car.main_image = item['path']
 
         try:
             db.session.commit()
+            fleet_status.invalidate()
+            images.schedule([car_image.id for car_image in car_images])
             flash('Car added successfully!', 'success')
+            if rejected:
+                flash(f'Skipped files that are not PNG, JPEG, GIF or WebP images: {", ".join(rejected)}', 'warning')
         except Exception as e:
             db.session.rollback()
+            images.collect(item['path'] for item in stored)
             flash(f'Error adding car: {str(e)}', 'danger')
 
         return redirect(url_for('main.manage_cars'))
 
-    # Fetch cars, ordered by display_order
-    cars = Car.query.order_by(Car.display_order).all()
-
-    # Ensure all cars have a display_order
-    for index, car in enumerate(cars, start=1):
-        if car.display_order == 0:
-            car.display_order = index
-    
-    try:
-        db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        flash(f'Error setting display order: {str(e)}', 'danger')
+    # Fetch cars, ordered by display_order, with their images for the thumbnails
+    cars = Car.query.options(selectinload(Car.images)).order_by(Car.display_order, Car.id).all()
 
     return render_template('manage_cars.html', cars=cars)
 
@@ -523,29 +575,44 @@ def upload_car_images(car_id):
         return jsonify({'error': 'Access denied'}), 403
     
     car = Car.query.get_or_404(car_id)
-    images = request.files.getlist('images')
+
+    # Each file goes to storage chunk by chunk as it arrives
+    try:
+        form, stored, rejected = uploads.receive_images()
+    except RequestEntityTooLarge as e:
+        return jsonify({'error': f'Upload too large: {e.description}'}), 413
+    except ValueError as e:
+        current_app.logger.warning(f"Unreadable upload for car {car_id}: {str(e)}")
+        return jsonify({'error': 'The upload could not be read'}), 400
     
     try:
-        for image in images:
-            if image and allowed_file(image.filename):
-                image_path = save_image(image, car.id)
-                if image_path:
-                    car_image = CarImage(
-                        car_id=car.id,
-                        image_path=image_path,
-                        caption=request.form.get('caption')
-                    )
-                    db.session.add(car_image)
-                    
-                    # Set as main image if car doesn't have one
-                    if not car.main_image:
-                        car.main_image = image_path
+        car_images = []
+        for item in stored:
+            car_image = CarImage(
+                car_id=car.id,
+                image_path=item['path'],
+                caption=form.get('caption')
+            )
+            db.session.add(car_image)
+            car_images.append(car_image)
+            
+            # Set as main image if car doesn't have one
+            if not car.main_image:
+                car.main_image = item['path']
         
         db.session.commit()
-        return jsonify({'message': 'Images uploaded successfully'})
+        fleet_status.invalidate()
+        # Resized off the request; pages show the uploads until then
+        images.schedule([car_image.id for car_image in car_images])
+        return jsonify({
+            'message': 'Images uploaded successfully',
+            'uploaded': [{'filename': item['filename'], 'size': item['size']} for item in stored],
+            'rejected': rejected
+        })
         
     except Exception as e:
         db.session.rollback()
+        images.collect(item['path'] for item in stored)
         return jsonify({'error': 'Error uploading images'}), 500
 
 @main.route('/manage_cars/delete_image/<int:image_id>', methods=['DELETE'])
@@ -569,15 +636,8 @@ def delete_car_image(image_id):
         
         car = image.car  # Store reference to car before deleting image
         
-        # Delete the physical file
-        file_path = os.path.join(current_app.root_path, 'static', image.image_path)
-        current_app.logger.info(f"Attempting to delete file: {file_path}")
-        
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            current_app.logger.info(f"File deleted successfully: {file_path}")
-        else:
-            current_app.logger.warning(f"File does not exist: {file_path}")
+        # The upload and its variants, deleted below unless shared
+        file_paths = images.file_paths(image)
         
         # If this was the main image, set another image as main
         if image.is_main:
@@ -593,6 +653,8 @@ def delete_car_image(image_id):
         # Delete the image record
         db.session.delete(image)
         db.session.commit()
+        fleet_status.invalidate()
+        images.collect(file_paths)
         
         current_app.logger.info(f"Image {image_id} deleted successfully")
         return jsonify({'message': 'Image deleted successfully', 'car_id': car.id}), 200
@@ -647,6 +709,7 @@ def edit_car(car_id):
         car.features = request.form.get('features', car.features or '')
         
         db.session.commit()
+        fleet_status.invalidate()
         
         # Log successful update
         current_app.logger.info(f"Successfully updated car {car_id}")
@@ -680,8 +743,12 @@ def delete_car(car_id):
     car = Car.query.get_or_404(car_id)
     
     try:
+        file_paths = set().union(*(images.file_paths(image) for image in car.images))
         db.session.delete(car)
         db.session.commit()
+        fleet_status.invalidate()
+        # Remove the files no other car image uses, once the rows are gone
+        images.collect(file_paths)
         return jsonify({'message': 'Car deleted successfully'})
     except Exception as e:
         db.session.rollback()
@@ -691,17 +758,82 @@ def delete_car(car_id):
 @login_required
 def get_car_images(car_id):
     car = Car.query.get_or_404(car_id)
-    images = []
+    car_images = []
     
     for image in car.images:
-        images.append({
+        car_images.append({
             'id': image.id,
-            'path': url_for('static', filename=image.image_path),
+            'path': images.url(image.image_path),
+            'thumbnail': images.url(images.thumbnail(image)),
             'caption': image.caption,
             'is_main': image.is_main
         })
     
-    return jsonify(images)
+    return jsonify(car_images)
+
+def _metrics_allowed():
+    # Scrapers send the METRICS_TOKEN bearer token; people log in as admin
+    token = current_app.config.get('METRICS_TOKEN')
+    if token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return True
+    return current_user.is_authenticated and current_user.is_admin
+
+@main.route('/metrics')
+def metrics():
+    if not _metrics_allowed():
+        return jsonify({'error': 'Access denied'}), 403
+    return current_app.response_class(
+        instrumentation.recorder.prometheus_text(current_app.config.get('METRICS_SAMPLE_RATE', 1.0)) +
+        db_pool.prometheus_text(db.engine),
+        mimetype='text/plain; version=0.0.4'
+    )
+
+@main.route('/metrics/db_pool')
+def db_pool_metrics():
+    if not _metrics_allowed():
+        return jsonify({'error': 'Access denied'}), 403
+    return current_app.response_class(
+        db_pool.prometheus_text(db.engine),
+        mimetype='text/plain; version=0.0.4'
+    )
+
+@main.route('/admin/performance', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def performance():
+    # Request timings of this worker process; POST starts them afresh
+    if request.method == 'POST':
+        instrumentation.recorder.reset()
+        flash('Request statistics cleared for this worker.', 'success')
+        return redirect(url_for('main.performance'))
+
+    return render_template(
+        'performance.html',
+        routes=instrumentation.recorder.summary(),
+        sample_rate=current_app.config.get('METRICS_SAMPLE_RATE', 1.0),
+        window=instrumentation.WINDOW,
+        pid=os.getpid()
+    )
+
+@main.route('/media/<path:filename>')
+def media(filename):
+    # With a bucket behind the store, the image bytes come from there and
+    # never pass through the workers; this only catches stale links
+    backend = storage.get()
+    if not isinstance(backend, storage.LocalStorage):
+        return redirect(backend.url(blobs.BLOB_PREFIX + filename))
+
+    # Blobs are named by the hash of their content, so the bytes behind a
+    # URL never change: caches may keep them forever without revalidating
+    response = send_from_directory(
+        blobs.root(),
+        filename,
+        etag=blobs.digest(filename),
+        max_age=blobs.MAX_AGE
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 @main.route('/manage_cars/set_main_image/<int:image_id>', methods=['POST'])
 @login_required
@@ -723,6 +855,7 @@ def set_main_image(image_id):
     
     try:
         db.session.commit()
+        fleet_status.invalidate()
         return jsonify({'message': 'Main image updated successfully'})
     except Exception as e:
         db.session.rollback()
@@ -770,19 +903,31 @@ def update_return_date():
                 'error': 'End date must be after start date'
             }), 400
             
-        # Calculate new total cost
-        days = (new_end_date - booking.start_date).days
+        # The car must be free for the new dates, this booking aside
+        if not availability.car_is_free(booking.car_id, booking.start_date, new_end_date, exclude_booking_id=booking.id):
+            return jsonify({
+                'success': False,
+                'error': 'This car is already booked or under maintenance for the new dates.'
+            }), 409
+
+        # Calculate new total cost, charged as in book_car
+        days = availability.rental_days(booking.start_date, new_end_date)
         total_cost = days * booking.car.daily_rate
         
         # Update booking
+        ledger.record_booking(booking, -1)
+        customer_stats.record_booking(booking, -1)
         booking.end_date = new_end_date
         booking.total_cost = total_cost
+        ledger.record_booking(booking)
+        customer_stats.record_booking(booking)
         
         # If edited by a secretary, update the notes to reflect this
         if current_user.role == 'secretary':
             booking.notes += f" (Edited by Secretary {current_user.name} on {datetime.now().strftime('%Y-%m-%d %H:%M')})"
         
         db.session.commit()
+        fleet_status.invalidate()
         
         # Log the booking update
         current_app.logger.info(
@@ -810,12 +955,7 @@ def update_return_date():
 @main.route('/delete_booking/<int:booking_id>', methods=['POST'])
 @login_required
 def delete_booking(booking_id):
-    # Import additional debugging tools
-    import traceback
-    
-    # Detailed logging of the deletion attempt
-    current_app.logger.info(f"Attempting to delete booking {booking_id}")
-    current_app.logger.info(f"Current user: {current_user.id}, Name: {current_user.name}, Role: {current_user.role}")
+    current_app.logger.debug(f"User {current_user.id} ({current_user.role}) deleting booking {booking_id}")
     
     try:
         # Find the booking with comprehensive error checking
@@ -827,8 +967,7 @@ def delete_booking(booking_id):
                 'error': 'Booking not found.'
             }), 404
         
-        # Log detailed booking information
-        current_app.logger.info(f"Booking details - ID: {booking.id}, Car ID: {booking.car_id}, "
+        current_app.logger.debug(f"Booking details - ID: {booking.id}, Car ID: {booking.car_id}, "
                                 f"Customer ID: {booking.customer_id}, Employee ID: {booking.employee_id}, "
                                 f"Status: {booking.status}")
         
@@ -875,8 +1014,7 @@ def delete_booking(booking_id):
                 'error': 'Associated car not found.'
             }), 404
         
-        # Log car details before deletion
-        current_app.logger.info(f"Car details before deletion - ID: {car.id}, "
+        current_app.logger.debug(f"Car details before deletion - ID: {car.id}, "
                                 f"License Plate: {car.license_plate}, "
                                 f"Current Availability: {car.is_available}")
         
@@ -904,37 +1042,32 @@ def delete_booking(booking_id):
                 f"Error looking up agency for user {current_user.id}: {str(agency_lookup_error)}"
             )
         
-        # Comprehensive car availability reset
-        car.is_available = True
+        # Release the car only if no other booking or maintenance holds it today
+        today = datetime.now()
+        car_released = availability.car_is_free(car.id, today, today, exclude_booking_id=booking.id)
         
         # Remove any agency-specific booking status
         try:
-            # Find and update any agency-specific car statuses
-            agency_car_statuses = AgencyCarStatus.query.filter_by(car_id=car.id).all()
-            for status in agency_car_statuses:
-                # Reset status to available and clear notes
-                status.status = 'available'
-                status.notes = None
-            
-            # Cancel all active bookings for this car
-            Booking.query.filter_by(
-                car_id=car.id, 
-                status='active'
-            ).update({
-                'status': 'cancelled'
-            })
+            agency_car_statuses = []
+            if car_released:
+                car.is_available = True
+                
+                # Find and update any agency-specific car statuses
+                agency_car_statuses = AgencyCarStatus.query.filter_by(car_id=car.id).all()
+                for status in agency_car_statuses:
+                    # Reset status to available and clear notes
+                    status.status = 'available'
+                    status.notes = None
             
-            # Log the comprehensive reset
-            current_app.logger.info(
-                f"Comprehensively reset car {car.id} availability. "
+            current_app.logger.debug(
+                f"Car {car.id} released: {car_released}. "
                 f"Updated {len(agency_car_statuses)} agency car statuses."
             )
         
         except Exception as status_update_error:
-            current_app.logger.error(
+            current_app.logger.exception(
                 f"Error updating car availability status: {str(status_update_error)}"
             )
-            current_app.logger.error(traceback.format_exc())
             return jsonify({
                 'success': False, 
                 'error': f'Error resetting car availability: {str(status_update_error)}'
@@ -942,10 +1075,11 @@ def delete_booking(booking_id):
         
         # Delete the booking
         try:
+            ledger.record_booking(booking, -1)
+            customer_stats.record_booking(booking, -1)
             db.session.delete(booking)
         except Exception as booking_delete_error:
-            current_app.logger.error(f"Error deleting booking: {str(booking_delete_error)}")
-            current_app.logger.error(traceback.format_exc())
+            current_app.logger.exception(f"Error deleting booking: {str(booking_delete_error)}")
             return jsonify({
                 'success': False, 
                 'error': f'Error deleting booking: {str(booking_delete_error)}'
@@ -954,19 +1088,17 @@ def delete_booking(booking_id):
         # Commit changes
         try:
             db.session.commit()
+            fleet_status.invalidate()
         except Exception as commit_error:
             db.session.rollback()
-            current_app.logger.error(f"Error committing transaction: {str(commit_error)}")
-            current_app.logger.error(traceback.format_exc())
+            current_app.logger.exception(f"Error committing transaction: {str(commit_error)}")
             return jsonify({
                 'success': False, 
                 'error': f'Error committing transaction: {str(commit_error)}'
             }), 500
         
-        # Log successful deletion with detailed information
         current_app.logger.info(
-            f"Successfully deleted booking {booking_id}. "
-            f"Car {car.id} is now available. "
+            f"User {current_user.id} deleted booking {booking_id} for car {car.id}."
         )
         
         return jsonify({
@@ -977,21 +1109,10 @@ def delete_booking(booking_id):
         # Catch-all error handling
         db.session.rollback()
         
-        # Extremely detailed error logging
-        current_app.logger.error(
-            f"Critical error deleting booking {booking_id}: {str(e)}\n"
-            f"User: {current_user.id} ({current_user.name})\n"
-            f"Full Traceback: {traceback.format_exc()}"
+        current_app.logger.exception(
+            f"Critical error deleting booking {booking_id} for user {current_user.id}: {str(e)}"
         )
         
-        # Additional context logging
-        try:
-            import sys
-            current_app.logger.error(f"Python version: {sys.version}")
-            current_app.logger.error(f"Exception type: {type(e).__name__}")
-        except Exception as log_error:
-            current_app.logger.error(f"Error during additional logging: {log_error}")
-        
         return jsonify({
             'success': False, 
             'error': f'An unexpected error occurred: {str(e)}'
@@ -1000,22 +1121,7 @@ def delete_booking(booking_id):
 @main.route('/maintenance')
 @login_required
 def maintenance():
-    # Extremely verbose logging for debugging
-    import traceback
-    import sys
-    from sqlalchemy.exc import SQLAlchemyError, DatabaseError
-    
-    # Log the start of the maintenance route access with maximum detail
-    current_app.logger.info(
-        f"Maintenance page access attempt. "
-        f"User Details:\n"
-        f"  ID: {current_user.id}\n"
-        f"  Name: {current_user.name}\n"
-        f"  Role: {current_user.role}\n"
-        f"  Is Authenticated: {current_user.is_authenticated}\n"
-        f"Python Version: {sys.version}\n"
-        f"Current Working Directory: {os.getcwd()}"
-    )
+    current_app.logger.debug(f"Maintenance page requested by user {current_user.id} ({current_user.role})")
     
     # Validate user permissions early
     if not (current_user.is_admin or current_user.role in ['manager', 'secretary']):
@@ -1028,18 +1134,8 @@ def maintenance():
     
     # Comprehensive error handling with multiple fallback mechanisms
     try:
-        # Validate database connection
-        try:
-            from sqlalchemy import text
-            db.session.execute(text('SELECT 1'))
-            current_app.logger.info("Database connection is active and responsive.")
-        except Exception as db_connection_error:
-            current_app.logger.critical(
-                f"Database connection error: {str(db_connection_error)}\n"
-                f"Full Traceback: {traceback.format_exc()}"
-            )
-            flash('Database connection error. Please contact support.', 'error')
-            return redirect(url_for('main.dashboard'))
+        # Broken connections are replaced by the pool's pre-ping (see
+        # app.db_pool); query errors are handled below
         
         # Fetch maintenance records with multiple error handling layers
         maintenance_records = []
@@ -1047,9 +1143,9 @@ def maintenance():
         
         # Attempt to fetch maintenance records
         try:
-            # Detailed query logging with SQLAlchemy error handling
-            current_app.logger.info("Attempting to query maintenance records...")
-            maintenance_records = Maintenance.query.order_by(Maintenance.created_at.desc()).all()
+            maintenance_records = Maintenance.query.options(
+                joinedload(Maintenance.car)
+            ).order_by(Maintenance.created_at.desc()).all()
             
             # Safely handle None cost values
             for record in maintenance_records:
@@ -1060,41 +1156,23 @@ def maintenance():
                     )
                     record.cost = 0
             
-            current_app.logger.info(f"Successfully retrieved {len(maintenance_records)} maintenance records.")
         except SQLAlchemyError as maintenance_query_error:
-            current_app.logger.error(
-                f"Critical SQLAlchemy error querying maintenance records:\n"
-                f"Error Type: {type(maintenance_query_error).__name__}\n"
-                f"Error Details: {str(maintenance_query_error)}\n"
-                f"Full Traceback: {traceback.format_exc()}"
+            current_app.logger.exception(
+                f"SQLAlchemy error querying maintenance records: {str(maintenance_query_error)}"
             )
-            # Additional logging of database connection state
             try:
                 db.session.rollback()
-                current_app.logger.info("Database session rolled back successfully.")
             except Exception as rollback_error:
                 current_app.logger.error(f"Error during rollback: {str(rollback_error)}")
         
         # Attempt to fetch cars
         try:
-            current_app.logger.info("Attempting to query cars...")
             cars = Car.query.all()
-            current_app.logger.info(f"Successfully retrieved {len(cars)} cars.")
         except SQLAlchemyError as car_query_error:
-            current_app.logger.error(
-                f"Critical SQLAlchemy error querying cars:\n"
-                f"Error Type: {type(car_query_error).__name__}\n"
-                f"Error Details: {str(car_query_error)}\n"
-                f"Full Traceback: {traceback.format_exc()}"
-            )
+            current_app.logger.exception(f"SQLAlchemy error querying cars: {str(car_query_error)}")
         
-        # Log query results with extensive details
-        current_app.logger.info(
-            f"Maintenance Page Query Results:\n"
-            f"  Maintenance Records: {len(maintenance_records)}\n"
-            f"  Cars: {len(cars)}\n"
-            f"  User: {current_user.name} (ID: {current_user.id})\n"
-            f"  Timestamp: {datetime.now()}"
+        current_app.logger.debug(
+            f"Maintenance page: {len(maintenance_records)} records, {len(cars)} cars"
         )
         
         # Render template with available data
@@ -1104,27 +1182,11 @@ def maintenance():
                              now=datetime.now())
     
     except Exception as critical_error:
-        # Extremely detailed critical error logging
         current_app.logger.critical(
-            f"CRITICAL ERROR in maintenance route:\n"
-            f"Error: {str(critical_error)}\n"
-            f"Error Type: {type(critical_error).__name__}\n"
-            f"User Details:\n"
-            f"  ID: {current_user.id}\n"
-            f"  Name: {current_user.name}\n"
-            f"  Role: {current_user.role}\n"
-            f"Python Details:\n"
-            f"  Version: {sys.version}\n"
-            f"  Path: {sys.path}\n"
-            f"Full Traceback:\n{traceback.format_exc()}"
+            f"Error in maintenance route for user {current_user.id}: {str(critical_error)}",
+            exc_info=True
         )
         
-        # Additional context logging
-        try:
-            current_app.logger.error(f"Exception module: {critical_error.__class__.__module__}")
-        except Exception as log_error:
-            current_app.logger.error(f"Error during additional logging: {log_error}")
-        
         # Provide a more informative error message
         flash(
             'A critical error occurred while accessing the maintenance page. '
@@ -1244,6 +1306,7 @@ def add_maintenance():
         )
         
         db.session.commit()
+        fleet_status.invalidate()
         return jsonify({'success': True})
         
     except ValueError as ve:
@@ -1322,6 +1385,7 @@ def update_maintenance(maintenance_id):
             car.is_available = False
         
         db.session.commit()
+        fleet_status.invalidate()
         return jsonify({'success': True})
         
     except ValueError as ve:
@@ -1367,6 +1431,7 @@ def delete_maintenance(maintenance_id):
         
         db.session.delete(maintenance)
         db.session.commit()
+        fleet_status.invalidate()
         return jsonify({'success': True})
         
     except Exception as e:
@@ -1380,6 +1445,21 @@ def delete_maintenance(maintenance_id):
             'error': 'An unexpected error occurred while deleting maintenance record.'
         }), 500
 
+def _selected_month():
+    """
+    Year and month chosen with the year and month query parameters, and
+    their range. Values that name no month are flashed and replaced by
+    the current month.
+    """
+    today = datetime.now()
+    year = request.args.get('year', today.year, type=int)
+    month = request.args.get('month', today.month, type=int)
+    try:
+        return year, month, month_range(year, month)
+    except ValueError:
+        flash('Invalid month selected; showing the current month instead.', 'warning')
+        return today.year, today.month, month_range(today.year, today.month)
+
 @main.route('/financial_summary')
 @login_required
 def financial_summary():
@@ -1392,70 +1472,21 @@ def financial_summary():
     today = datetime.now()
 
     # Get selected month and year from query parameters
-    selected_month = request.args.get('month', today.month, type=int)
-    selected_year = request.args.get('year', today.year, type=int)
-
-    # Query for bookings in the selected month
-    bookings = Booking.query.filter(
-        extract('year', Booking.start_date) == selected_year,
-        extract('month', Booking.start_date) == selected_month
-    ).all()
-
-    # Calculate financial metrics
-    total_bookings = len(bookings)
-    total_revenue = sum(booking.total_cost for booking in bookings)
-    total_deposit = sum(booking.deposit_amount for booking in bookings)
-
-    # Calculate total rental income for the year
-    start_of_year = today.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
-    yearly_bookings = Booking.query.filter(Booking.start_date >= start_of_year).all()
-    total_rental_income = sum(booking.total_cost for booking in yearly_bookings)
-
-    # Calculate maintenance expenses for the year
-    maintenance_records = Maintenance.query.filter(Maintenance.start_date >= start_of_year).all()
-    total_maintenance_expense = sum(record.cost for record in maintenance_records if record.cost)
-
-    # Monthly rental income trend
-    monthly_rental_income = {}
-    for month in range(1, 13):
-        month_start = today.replace(month=month, day=1, hour=0, minute=0, second=0, microsecond=0)
-        month_end = month_start.replace(month=month % 12 + 1, day=1) - timedelta(days=1)
-        
-        month_bookings = Booking.query.filter(
-            Booking.start_date >= month_start,
-            Booking.start_date <= month_end
-        ).all()
-        
-        monthly_rental_income[month] = sum(booking.total_cost for booking in month_bookings)
+    selected_year, selected_month, selected_period = _selected_month()
+
+    # Totals for bookings starting in the selected month
+    month_totals = reports.booking_totals(selected_period)
+
+    # Monthly rental income trend from the ledger
+    monthly_rental_income = ledger.yearly_by_month('booking', today.year)
+
+    # Rental income and maintenance expenses for the current year
+    total_rental_income = sum(monthly_rental_income.values())
+    maintenance_totals = reports.maintenance_totals(year_range(today.year))
+    total_maintenance_expense = maintenance_totals['total_cost']
 
     # Car rental performance
-    car_performance = {}
-    for car in Car.query.all():
-        # Bookings for this car
-        car_bookings = Booking.query.filter_by(car_id=car.id).all()
-        
-        # Maintenance records for this car
-        car_maintenance = Maintenance.query.filter_by(car_id=car.id).all()
-        
-        # Calculate total maintenance cost
-        total_maintenance_cost = sum(
-            maintenance.cost or 0 for maintenance in car_maintenance
-        )
-        
-        # Calculate total income
-        total_income = sum(booking.total_cost or 0 for booking in car_bookings)
-        
-        # Calculate net revenue
-        net_revenue = total_income - total_maintenance_cost
-        
-        car_performance[car.id] = {
-            'model': car.model or 'Unknown',
-            'license_plate': car.license_plate or 'N/A',
-            'total_rentals': len(car_bookings),
-            'total_income': total_income,
-            'total_maintenance_cost': total_maintenance_cost,
-            'net_revenue': net_revenue
-        }
+    car_performance = reports.car_performance()
 
     # Month name conversion
     month_names = {
@@ -1467,10 +1498,9 @@ def financial_summary():
 
     # Prepare context
     context = {
-        'bookings': bookings,
-        'total_bookings': total_bookings,
-        'total_revenue': total_revenue,
-        'total_deposit': total_deposit,
+        'total_bookings': month_totals['total_bookings'],
+        'total_revenue': month_totals['total_revenue'],
+        'total_deposit': month_totals['total_deposit'],
         'selected_month': selected_month,
         'selected_year': selected_year,
         'selected_month_name': month_names.get(selected_month, 'Unknown'),
@@ -1483,11 +1513,59 @@ def financial_summary():
         'net_income': total_rental_income - total_maintenance_expense,
         'monthly_rental_income': monthly_rental_income,
         'car_performance': car_performance,
-        'total_maintenance_records': len(maintenance_records)
+        'total_maintenance_records': maintenance_totals['total_records']
     }
 
     return render_template('financial_summary.html', **context)
 
+def _utilisation_args():
+    """
+    Reporting window and grouping of the utilisation views. The window
+    defaults to the current year up to today.
+    """
+    today = datetime.now()
+    first_day = datetime.strptime(request.args.get('from') or f'{today.year}-01-01', '%Y-%m-%d')
+    last_day = datetime.strptime(request.args.get('to') or today.strftime('%Y-%m-%d'), '%Y-%m-%d')
+    group_by = request.args.get('by', 'car')
+    return first_day, last_day, group_by
+
+@main.route('/api/utilisation')
+@login_required
+@manager_or_admin_required
+def api_utilisation():
+    try:
+        first_day, last_day, group_by = _utilisation_args()
+        report = reports.utilisation(first_day, last_day, group_by)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return jsonify({
+        'from': first_day.strftime('%Y-%m-%d'),
+        'to': last_day.strftime('%Y-%m-%d'),
+        'by': group_by,
+        'rows': report
+    })
+
+@main.route('/utilisation')
+@login_required
+@manager_or_admin_required
+def utilisation():
+    try:
+        first_day, last_day, group_by = _utilisation_args()
+        report = reports.utilisation(first_day, last_day, group_by)
+    except ValueError as e:
+        flash(f'Invalid report parameters: {str(e)}', 'danger')
+        return redirect(url_for('main.utilisation'))
+
+    return render_template(
+        'utilisation.html',
+        report=report,
+        first_day=first_day,
+        last_day=last_day,
+        group_by=group_by,
+        groups=reports.UTILISATION_GROUPS
+    )
+
 @main.route('/expense_management', methods=['GET'])
 @login_required
 def expense_management():
@@ -1497,22 +1575,17 @@ def expense_management():
         return redirect(url_for('main.dashboard'))
     
     # Get selected month and year from query parameters
-    selected_month = request.args.get('month', datetime.now().month, type=int)
-    selected_year = request.args.get('year', datetime.now().year, type=int)
+    selected_year, selected_month, selected_period = _selected_month()
 
     # Fetch expenses for the selected month and year
-    expenses = Expense.query.filter(
-        extract('year', Expense.date) == selected_year,
-        extract('month', Expense.date) == selected_month
+    expenses = Expense.query.options(joinedload(Expense.user)).filter(
+        within(Expense.date, selected_period)
     ).order_by(Expense.date.desc()).all()
 
-    # Calculate total expenses
-    total_expenses = sum(expense.amount for expense in expenses)
-
-    # Calculate summary by category
-    category_totals = {}
-    for expense in expenses:
-        category_totals[expense.category] = category_totals.get(expense.category, 0) + expense.amount
+    # Totals come from the monthly ledger
+    summary = ledger.month_summary('expense', selected_year, selected_month)
+    total_expenses = summary['total']
+    category_totals = summary['by_category']
 
     # Prepare context
     context = {
@@ -1535,22 +1608,17 @@ def expense_management():
 @secretary_or_admin_required
 def view_income_management():
     # Get selected month and year from query parameters
-    selected_month = request.args.get('month', datetime.now().month, type=int)
-    selected_year = request.args.get('year', datetime.now().year, type=int)
+    selected_year, selected_month, selected_period = _selected_month()
 
     # Fetch incomes for the selected month and year
     incomes = Income.query.filter(
-        extract('year', Income.date) == selected_year,
-        extract('month', Income.date) == selected_month
+        within(Income.date, selected_period)
     ).order_by(Income.date.desc()).all()
 
-    # Calculate total incomes
-    total_incomes = sum(income.amount for income in incomes)
-
-    # Calculate summary by category
-    category_totals = {}
-    for income in incomes:
-        category_totals[income.category] = category_totals.get(income.category, 0) + income.amount
+    # Totals come from the monthly ledger
+    summary = ledger.month_summary('income', selected_year, selected_month)
+    total_incomes = summary['total']
+    category_totals = summary['by_category']
 
     # Prepare context
     context = {
@@ -1599,6 +1667,8 @@ def add_income():
         
         # Add to database
         db.session.add(new_income)
+        db.session.flush()
+        ledger.record_income(new_income)
         db.session.commit()
         
         return jsonify(new_income.to_dict()), 201
@@ -1630,10 +1700,12 @@ def update_income(income_id):
             return jsonify({'error': 'Category and amount are required'}), 400
         
         # Update income
+        ledger.record_income(income, -1)
         income.category = category
         income.amount = amount
         income.description = description
         income.subcategory = subcategory  # Update subcategory
+        ledger.record_income(income)
         
         # Commit changes
         db.session.commit()
@@ -1650,6 +1722,7 @@ def update_income(income_id):
 def delete_income(income_id):
     income = Income.query.get_or_404(income_id)
     
+    ledger.record_income(income, -1)
     db.session.delete(income)
     db.session.commit()
     
@@ -1693,6 +1766,8 @@ def add_expense():
     
     try:
         db.session.add(expense)
+        db.session.flush()
+        ledger.record_expense(expense)
         db.session.commit()
         return jsonify(expense.to_dict()), 201
     except Exception as e:
@@ -1720,10 +1795,12 @@ def update_expense(expense_id):
     data = request.form
     
     # Update fields
+    ledger.record_expense(expense, -1)
     expense.amount = float(data.get('amount', expense.amount))
     expense.category = data.get('category', expense.category)
     expense.subcategory = data.get('subcategory', expense.subcategory)
     expense.description = data.get('description', expense.description)
+    ledger.record_expense(expense)
     
     db.session.commit()
     
@@ -1738,6 +1815,7 @@ def delete_expense(expense_id):
     
     expense = Expense.query.get_or_404(expense_id)
     
+    ledger.record_expense(expense, -1)
     db.session.delete(expense)
     db.session.commit()
     
@@ -1875,42 +1953,16 @@ def manage_employees():
                 }), 500
 
     # GET request: Fetch employees, agencies, and cars
-    # Fetch all users and log detailed information
-    all_users = User.query.all()
-    current_app.logger.info("DEBUG: Total number of users: %d", len(all_users))
-    
-    # Detailed logging for all users
-    for user in all_users:
-        current_app.logger.info(
-            "DEBUG User Details: ID=%d, Name=%s, Email=%s, Role=%s, Is Admin=%s, Is Active=%s", 
-            user.id, user.name, user.email, user.role, user.is_admin, user.is_active
-        )
-    
-    # Fetch employees with multiple filtering approaches
-    employees_query = User.query
-    
-    # Try different filtering strategies
-    employees = employees_query.filter(
-        User.role != 'agency'
-    ).all()
-    
-    current_app.logger.info("DEBUG: Number of employees after filtering: %d", len(employees))
-    
-    # Log details of filtered employees
-    for employee in employees:
-        current_app.logger.info(
-            "DEBUG Filtered Employee: ID=%d, Name=%s, Email=%s, Role=%s, Is Admin=%s", 
-            employee.id, employee.name, employee.email, employee.role, employee.is_admin
-        )
-    
+    employees = User.query.filter(User.role != 'agency').all()
     agencies = User.query.filter_by(role='agency').all()
+    current_app.logger.debug("Manage employees: %d employees, %d agencies", len(employees), len(agencies))
     
     # Get IDs of cars already assigned to agencies
     assigned_car_ids = db.session.query(AgencyVisibleCar.car_id).distinct().all()
     assigned_car_ids = [car_id[0] for car_id in assigned_car_ids]
     
     # Filter out cars already assigned to agencies
-    cars = Car.query.filter(~Car.id.in_(assigned_car_ids)).all()
+    cars = Car.query.options(selectinload(Car.images)).filter(~Car.id.in_(assigned_car_ids)).all()
 
     return render_template('manage_employees.html', 
                            employees=employees, 
@@ -2041,27 +2093,45 @@ def manage_clients():
         
         return redirect(url_for('main.manage_clients'))
     
-    # Get all clients with their booking details
-    clients = Customer.query.all()
-    client_details = []
-    
-    for client in clients:
-        # Get total bookings and total amount spent
-        bookings = Booking.query.filter_by(customer_id=client.id).all()
-        total_bookings = len(bookings)
-        total_amount_spent = sum(booking.total_cost for booking in bookings)
-        
-        # Get most recent booking
-        most_recent_booking = max(bookings, key=lambda x: x.created_at) if bookings else None
-        
-        client_details.append({
-            'client': client,
-            'total_bookings': total_bookings,
-            'total_amount_spent': total_amount_spent,
-            'most_recent_booking': most_recent_booking
-        })
-    
-    return render_template('manage_clients.html', client_details=client_details)
+    # One page of clients with their booking statistics
+    sort = request.args.get('sort', 'name')
+    nationality = request.args.get('nationality') or None
+    cursor = request.args.get('cursor') or None
+    try:
+        client_details, next_cursor = reports.client_stats_page(
+            sort=sort,
+            cursor=cursor,
+            per_page=CLIENTS_PER_PAGE,
+            nationality=nationality
+        )
+    except ValueError:
+        # An edited or truncated page link, or one from another sort
+        flash('Invalid page link; showing the first page instead.', 'warning')
+        cursor = None
+        client_details, next_cursor = reports.client_stats_page(
+            sort=sort,
+            per_page=CLIENTS_PER_PAGE,
+            nationality=nationality
+        )
+
+    # Most recent booking of every client on the page
+    recent = reports.latest_bookings([detail['client'].id for detail in client_details])
+    for detail in client_details:
+        detail['most_recent_booking'] = recent.get(detail['client'].id)
+
+    nationalities = [
+        row[0] for row in db.session.query(Customer.nationality)
+        .filter(Customer.nationality.isnot(None), Customer.nationality != '')
+        .distinct().order_by(Customer.nationality).all()
+    ]
+
+    return render_template('manage_clients.html',
+                           client_details=client_details,
+                           next_cursor=next_cursor,
+                           is_first_page=not cursor,
+                           sort=sort,
+                           nationality=nationality,
+                           nationalities=nationalities)
 
 @main.route('/get_client_details/<int:client_id>', methods=['GET'])
 @login_required
@@ -2073,11 +2143,9 @@ def get_client_details(client_id):
     client = Customer.query.get_or_404(client_id)
     
     # Get booking details
-    bookings = Booking.query.filter_by(customer_id=client_id).all()
-    
-    # Calculate total bookings and amount spent
-    total_bookings = len(bookings)
-    total_amount_spent = sum(booking.total_cost for booking in bookings)
+    bookings = Booking.query.options(
+        joinedload(Booking.car)
+    ).filter_by(customer_id=client_id).all()
     
     # Prepare booking details
     booking_details = []
@@ -2099,8 +2167,10 @@ def get_client_details(client_id):
         'license_number': client.license_number,
         'nin_passport_number': client.nin_passport_number,
         'nationality': client.nationality,
-        'total_bookings': total_bookings,
-        'total_amount_spent': total_amount_spent,
+        'total_bookings': client.stats.booking_count,
+        'total_amount_spent': client.stats.total_spent,
+        'active_bookings': client.stats.active_booking_count,
+        'last_booking_at': client.stats.last_booking_at.strftime('%Y-%m-%d %H:%M') if client.stats.last_booking_at else None,
         'bookings': booking_details
     })
 
@@ -2110,14 +2180,14 @@ def get_client_details(client_id):
 def update_car_order():
     try:
         car_ids = request.json
+        if not isinstance(car_ids, list):
+            return jsonify({'message': 'Expected a list of car ids', 'status': 'error'}), 400
         
-        # Update display order for each car
-        for index, car_id in enumerate(car_ids, start=1):
-            car = Car.query.get(car_id)
-            if car:
-                car.display_order = index
+        # The whole order in one statement
+        car_order.apply(car_ids)
         
         db.session.commit()
+        fleet_status.invalidate()
         
         return jsonify({
             'message': 'Car order updated successfully',
@@ -2131,6 +2201,38 @@ def update_car_order():
             'status': 'error'
         }), 500
 
+@main.route('/manage_cars/move/<int:car_id>', methods=['POST'])
+@login_required
+@manager_or_admin_required
+def move_car(car_id):
+    # One dragged row: only that car is normally rewritten
+    data = request.get_json(silent=True) or {}
+    try:
+        after_id = int(data['after_id']) if data.get('after_id') is not None else None
+        before_id = int(data['before_id']) if data.get('before_id') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'message': 'Invalid neighbour ids', 'status': 'error'}), 400
+
+    try:
+        if not car_order.move(car_id, after_id=after_id, before_id=before_id):
+            return jsonify({'message': 'Car not found', 'status': 'error'}), 404
+        db.session.commit()
+        fleet_status.invalidate()
+        return jsonify({
+            'message': 'Car order updated successfully',
+            'status': 'success'
+        }), 200
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'message': str(e), 'status': 'error'}), 400
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error moving car {car_id}: {str(e)}")
+        return jsonify({
+            'message': 'Failed to update car order',
+            'status': 'error'
+        }), 500
+
 @main.route('/add_agency', methods=['POST'])
 @secretary_or_admin_required
 def add_agency():
@@ -2427,37 +2529,20 @@ def update_agency_car_status():
                 'message': 'You do not have permission to update this car.'
             }), 403
 
-        # Check if the car is unavailable
-        car = Car.query.get(car_id)
-        if not car.is_available:
-            return jsonify({
-                'status': 'error', 
-                'message': 'Cannot change status. Car is currently unavailable.'
-            }), 403
-
-        # Check if the car is under maintenance
-        active_maintenance = Maintenance.query.filter(
-            Maintenance.car_id == car_id, 
-            Maintenance.status.in_(['pending', 'in_progress'])
-        ).first()
+        # Check whether the car is in maintenance or booked today
+        today = datetime.now()
+        bookings, maintenance_records = availability.conflicts(int(car_id), today, today)
 
-        if active_maintenance:
+        if maintenance_records:
             return jsonify({
                 'status': 'error', 
                 'message': 'Cannot change status. Car is currently under maintenance.'
             }), 403
 
-        # Check for active bookings by admin or manager
-        active_booking = Booking.query.join(User, Booking.employee_id == User.id).filter(
-            Booking.car_id == car_id,
-            Booking.status == 'active',
-            User.role.in_(['admin', 'manager'])
-        ).first()
-
-        if active_booking:
+        if bookings:
             return jsonify({
                 'status': 'error', 
-                'message': 'Car is currently booked by admin/manager and cannot be modified.'
+                'message': 'Car is currently booked and cannot be modified.'
             }), 403
 
         # Find or create agency car status
@@ -2481,6 +2566,7 @@ def update_agency_car_status():
             db.session.add(agency_car_status)
 
         db.session.commit()
+        fleet_status.invalidate()
 
         return jsonify({
             'status': 'success', 
@@ -0,0 +1,230 @@
+from flask import current_app, url_for
+import io
+import mimetypes
+import os
+import tempfile
+
+# Sent with every stored object; keys are content hashes (see app.blobs),
+# so the bytes behind a key never change
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class LocalStorage:
+    """
+    Files on local disk under root, served by the app's /media route.
+    Only suitable when every instance shares that disk.
+    """
+
+    def __init__(self, root, prefix, staging):
+        self.root = root
+        # Part of each key that the /media URL leaves out
+        self.prefix = prefix
+        # Where uploads are written before they are stored: outside root,
+        # so partial files are never served, but on the same filesystem,
+        # so put_file is a rename
+        self.staging = staging
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def staging_dir(self):
+        os.makedirs(self.staging, exist_ok=True)
+        return self.staging
+
+    def put_file(self, key, temp_path, content_type=None):
+        """
+        Store the file at temp_path under key, consuming the file.
+        """
+        target = self._path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Atomic, so readers never see a partly written file
+        os.replace(temp_path, target)
+
+    def exists(self, key):
+        return os.path.exists(self._path(key))
+
+    def touch(self, key):
+        """
+        Mark the file under key as just stored. Returns False if there is
+        no such file.
+        """
+        try:
+            os.utime(self._path(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def modified(self, key):
+        """
+        When the file under key was stored or last touched, as a timestamp,
+        or None if there is no such file.
+        """
+        try:
+            return os.path.getmtime(self._path(key))
+        except OSError:
+            return None
+
+    def keys(self, prefix):
+        """
+        Keys of the files stored under prefix.
+        """
+        for directory, _, names in os.walk(self._path(prefix)):
+            for name in names:
+                yield os.path.relpath(os.path.join(directory, name), self.root).replace(os.sep, '/')
+
+    def size(self, key):
+        try:
+            return os.path.getsize(self._path(key))
+        except OSError:
+            return None
+
+    def open(self, key):
+        return open(self._path(key), 'rb')
+
+    def delete(self, key):
+        if os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def url(self, key):
+        return url_for('main.media', filename=key[len(self.prefix):])
+
+
+class S3Storage:
+    """
+    Objects in an S3 bucket or an S3-compatible service such as MinIO
+    (endpoint_url). Browsers fetch images straight from the bucket: from
+    public_url when the bucket or a CDN in front of it is public, through
+    pre-signed URLs otherwise. Credentials come from the usual AWS
+    environment variables. Needs boto3.
+    """
+
+    def __init__(self, bucket, endpoint_url=None, region=None, public_url=None, url_expiry=3600):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError('IMAGE_STORAGE=s3 needs boto3; install it with "pip install boto3".')
+
+        self.bucket = bucket
+        self.public_url = public_url.rstrip('/') if public_url else None
+        self.url_expiry = url_expiry
+        self.client = boto3.client('s3', endpoint_url=endpoint_url, region_name=region)
+        self.not_found = self.client.exceptions.ClientError
+
+    def staging_dir(self):
+        return tempfile.gettempdir()
+
+    def put_file(self, key, temp_path, content_type=None):
+        """
+        Upload the file at temp_path under key, consuming the file.
+        """
+        extra_args = {
+            'ContentType': content_type or mimetypes.guess_type(key)[0] or 'application/octet-stream',
+            'CacheControl': CACHE_CONTROL
+        }
+        try:
+            self.client.upload_file(temp_path, self.bucket, key, ExtraArgs=extra_args)
+        finally:
+            os.remove(temp_path)
+
+    def _missing(self, error):
+        return error.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound')
+
+    def _head(self, key):
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except self.not_found as e:
+            if self._missing(e):
+                return None
+            raise
+
+    def exists(self, key):
+        return self._head(key) is not None
+
+    def touch(self, key):
+        """
+        Mark the object under key as just stored. Returns False if there
+        is no such object.
+        """
+        head = self._head(key)
+        if head is None:
+            return False
+        # Copying an object onto itself renews its LastModified
+        try:
+            self.client.copy_object(
+                Bucket=self.bucket,
+                Key=key,
+                CopySource={'Bucket': self.bucket, 'Key': key},
+                MetadataDirective='REPLACE',
+                ContentType=head.get('ContentType') or 'application/octet-stream',
+                CacheControl=CACHE_CONTROL
+            )
+        except self.not_found as e:
+            if self._missing(e):
+                return False
+            raise
+        return True
+
+    def modified(self, key):
+        """
+        When the object under key was stored or last touched, as a
+        timestamp, or None if there is no such object.
+        """
+        head = self._head(key)
+        return head['LastModified'].timestamp() if head else None
+
+    def keys(self, prefix):
+        """
+        Keys of the objects stored under prefix.
+        """
+        for page in self.client.get_paginator('list_objects_v2').paginate(Bucket=self.bucket, Prefix=prefix):
+            for item in page.get('Contents', []):
+                yield item['Key']
+
+    def size(self, key):
+        head = self._head(key)
+        return head['ContentLength'] if head else None
+
+    def open(self, key):
+        # Image decoders need to seek, which the streaming body cannot
+        body = self.client.get_object(Bucket=self.bucket, Key=key)['Body']
+        return io.BytesIO(body.read())
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def url(self, key):
+        if self.public_url:
+            return f'{self.public_url}/{key}'
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket, 'Key': key},
+            ExpiresIn=self.url_expiry
+        )
+
+
+def get():
+    """
+    The image storage backend configured by IMAGE_STORAGE, created once
+    per app.
+    """
+    backend = current_app.extensions.get('image_storage')
+    if backend is None:
+        from .blobs import BLOB_PREFIX
+
+        config = current_app.config
+        kind = config.get('IMAGE_STORAGE', 'local')
+        if kind == 's3':
+            backend = S3Storage(
+                config['S3_BUCKET'],
+                endpoint_url=config.get('S3_ENDPOINT_URL'),
+                region=config.get('S3_REGION'),
+                public_url=config.get('S3_PUBLIC_URL'),
+                url_expiry=config.get('S3_URL_EXPIRY', 3600)
+            )
+        elif kind == 'local':
+            backend = LocalStorage(current_app.static_folder, BLOB_PREFIX,
+                                   os.path.join(current_app.instance_path, 'upload-staging'))
+        else:
+            raise RuntimeError(f'Unknown IMAGE_STORAGE "{kind}"; use "local" or "s3".')
+        current_app.extensions['image_storage'] = backend
+    return backend
@@ -0,0 +1,166 @@
+from . import blobs, images
+from flask import current_app, request
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import MultipartDecoder, Field, File, Data, Epilogue, NeedData
+
+# Image formats accepted for upload, recognised by their first bytes
+# rather than by the file name: extension -> signatures at offset 0
+SIGNATURES = {
+    'jpg': (b'\xff\xd8\xff',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'gif': (b'GIF87a', b'GIF89a'),
+    'webp': (b'RIFF',)
+}
+
+# Bytes needed to recognise any of the formats above
+SNIFF_SIZE = 12
+
+
+def sniff(head):
+    """
+    Extension of the image format the given first bytes start, or None.
+    """
+    for extension, signatures in SIGNATURES.items():
+        if head.startswith(signatures):
+            # RIFF is a container; only the WEBP kind is an image
+            if extension == 'webp' and head[8:12] != b'WEBP':
+                continue
+            return extension
+    return None
+
+
+class _ImagePart:
+    """
+    One file of the upload on its way into the blob store. The first
+    bytes are held back until the format is known; unknown formats are
+    dropped without being stored.
+    """
+
+    def __init__(self, filename, max_size):
+        self.filename = filename
+        self.max_size = max_size
+        self.size = 0
+        self.extension = None
+        self.rejected = False
+        self._head = b''
+        self._writer = None
+
+    def write(self, chunk):
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            self.abort()
+            raise RequestEntityTooLarge(f'{self.filename} is larger than {self.max_size // (1024 * 1024)} MB.')
+        if self.rejected:
+            return
+        if self._writer is None:
+            self._head += chunk
+            if len(self._head) < SNIFF_SIZE:
+                return
+            self._start()
+            chunk, self._head = self._head, b''
+            if self.rejected:
+                return
+        self._writer.write(chunk)
+
+    def _start(self):
+        self.extension = sniff(self._head)
+        if self.extension is None:
+            self.rejected = True
+        else:
+            self._writer = blobs.BlobWriter(self.extension)
+
+    def finish(self):
+        """
+        Store the file. Returns the blob path, or None for an empty file or
+        one that is not a supported image.
+        """
+        if self._writer is None and not self.rejected and self._head:
+            # Shorter than SNIFF_SIZE
+            self._start()
+            if self._writer is not None:
+                self._writer.write(self._head)
+        if self._writer is None:
+            return None
+        return self._writer.commit()
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.abort()
+            self._writer = None
+
+
+def receive_images(field='images'):
+    """
+    Read the multipart body of the current request without buffering
+    files: the parts of the given file field are validated and written
+    to the blob store chunk by chunk as they arrive, so memory use does
+    not grow with the upload. MAX_CONTENT_LENGTH is enforced before and
+    while reading, MAX_IMAGE_SIZE for every file, both with a 413.
+
+    Returns (form, stored, rejected): the other fields as a dict, a list
+    of {'filename', 'path', 'size'} per stored image in upload order, and
+    the names of the files that were not supported images. If reading
+    fails, the images already stored are handed to images.collect()
+    before the error is raised; callers that give up later must collect()
+    them.
+    """
+    mimetype, options = parse_options_header(request.headers.get('Content-Type', ''))
+    boundary = options.get('boundary')
+    if mimetype != 'multipart/form-data' or not boundary:
+        raise ValueError('Expected a multipart/form-data upload.')
+
+    config = current_app.config
+    max_size = config.get('MAX_IMAGE_SIZE', 15 * 1024 * 1024)
+    decoder = MultipartDecoder(
+        boundary.encode('latin-1'),
+        max_form_memory_size=config.get('MAX_FORM_MEMORY_SIZE', 500 * 1024),
+        max_parts=config.get('MAX_FORM_PARTS', 1000)
+    )
+
+    form = {}
+    stored = []
+    rejected = []
+    part = None
+    field_data = []
+    try:
+        # request.stream stops at MAX_CONTENT_LENGTH with a 413
+        stream = request.stream
+        while True:
+            chunk = stream.read(blobs.CHUNK_SIZE)
+            decoder.receive_data(chunk or None)
+            event = decoder.next_event()
+            while not isinstance(event, (NeedData, Epilogue)):
+                if isinstance(event, File):
+                    # Other file fields, and empty file inputs, are ignored
+                    part = _ImagePart(event.filename, max_size) if event.name == field and event.filename else None
+                elif isinstance(event, Field):
+                    part = event
+                    field_data = []
+                elif isinstance(event, Data):
+                    if isinstance(part, Field):
+                        field_data.append(event.data)
+                        if not event.more_data:
+                            form[part.name] = b''.join(field_data).decode('utf-8', 'replace')
+                    elif part is not None:
+                        part.write(event.data)
+                        if not event.more_data:
+                            path = part.finish()
+                            if path:
+                                stored.append({'filename': part.filename, 'path': path, 'size': part.size})
+                            elif part.size:
+                                rejected.append(part.filename)
+                            part = None
+                event = decoder.next_event()
+            if isinstance(event, Epilogue):
+                break
+            if not chunk:
+                raise ValueError('The upload ended early.')
+    except BaseException:
+        if isinstance(part, _ImagePart):
+            part.abort()
+        if stored:
+            images.collect(item['path'] for item in stored)
+        raise
+
+    return form, stored, rejected
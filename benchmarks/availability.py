@@ -0,0 +1,95 @@
+"""
+Availability benchmark: latency of the booking availability checks on a
+database with a million bookings.
+
+    python benchmarks/availability.py [--bookings 1000000] [--cars 500]
+                                      [--years 10] [--runs 50]
+                                      [--budget-ms 50] [--json]
+
+Times car_is_free() for one car over a week, the free-car list for a week
+and GET /api/availability with and without a car_id, at random dates up
+to 90 days ahead. Exits with status 1 when the median of car_is_free()
+exceeds the budget. Pass --database-url to run against PostgreSQL instead
+of a temporary SQLite file (the database must be empty).
+"""
+from datetime import datetime, timedelta
+from fleet_data import create_benchmark_app, populate, timed
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=1000000)
+    parser.add_argument('--cars', type=int, default=500)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--budget-ms', type=float, default=50.0)
+    parser.add_argument('--database-url')
+    parser.add_argument('--json', action='store_true', help='print one JSON object')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_benchmark_app(args.database_url or 'sqlite:///' + os.path.join(directory, 'benchmark.db'))
+        from app import availability
+
+        with app.app_context():
+            admin_id = populate(args.cars, args.bookings, args.years, maintenance=args.cars * 4, ahead_days=90)
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin_id)
+            session['_fresh'] = True
+
+        rnd = random.Random(2)
+        today = datetime.now()
+
+        def week():
+            start = today + timedelta(days=rnd.randint(0, 90))
+            return start, start + timedelta(days=6)
+
+        def car_is_free():
+            return availability.car_is_free(rnd.randint(1, args.cars), *week())
+
+        def free_cars():
+            return availability.free_cars_query(*week()).all()
+
+        def api(car=False):
+            start, end = week()
+            url = f"/api/availability?start={start:%Y-%m-%d}&end={end:%Y-%m-%d}"
+            if car:
+                url += f'&car_id={rnd.randint(1, args.cars)}'
+            response = client.get(url)
+            assert response.status_code == 200, response.status_code
+            return response
+
+        result = {'bookings': args.bookings, 'cars': args.cars}
+        with app.app_context():
+            _, result['car_is_free_p50_ms'], result['car_is_free_p95_ms'] = timed(car_is_free, args.runs)
+            cars, result['free_cars_p50_ms'], result['free_cars_p95_ms'] = timed(free_cars, args.runs)
+        result['free_cars_found'] = len(cars)
+        _, result['api_car_p50_ms'], _ = timed(lambda: api(car=True), args.runs)
+        _, result['api_fleet_p50_ms'], _ = timed(api, args.runs)
+        result['budget_ms'] = args.budget_ms
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"{args.bookings} bookings, {args.cars} cars")
+        print(f"car_is_free                 p50 {result['car_is_free_p50_ms']:7.2f} ms  "
+              f"p95 {result['car_is_free_p95_ms']:7.2f} ms (budget {args.budget_ms:.0f} ms)")
+        print(f"free_cars_query             p50 {result['free_cars_p50_ms']:7.2f} ms  "
+              f"p95 {result['free_cars_p95_ms']:7.2f} ms ({result['free_cars_found']} free)")
+        print(f"/api/availability?car_id=   p50 {result['api_car_p50_ms']:7.2f} ms")
+        print(f"/api/availability           p50 {result['api_fleet_p50_ms']:7.2f} ms")
+
+    if result['car_is_free_p50_ms'] > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
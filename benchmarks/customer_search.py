@@ -0,0 +1,90 @@
+"""
+Customer search benchmark: latency of the booking form's customer
+autocomplete on a database with 100k customers.
+
+    python benchmarks/customer_search.py [--customers 100000] [--runs 50]
+                                         [--budget-ms 50] [--json]
+
+Times customer_search.search() for what a clerk types: a complete phone
+number (the equality shortcut), a phone prefix, a licence prefix, a full
+name and a name prefix, each at a random customer, and GET
+/search_customer for a name prefix. Exits with status 1 when the slowest
+kind's median exceeds the budget. Pass --database-url to run against
+PostgreSQL instead of a temporary SQLite file (the database must be
+empty); the server needs the pg_trgm extension for the name index, or
+names are searched by scan, which the output reports.
+"""
+from fleet_data import create_benchmark_app, populate, timed
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--customers', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--budget-ms', type=float, default=50.0)
+    parser.add_argument('--database-url')
+    parser.add_argument('--json', action='store_true', help='print one JSON object')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_benchmark_app(args.database_url or 'sqlite:///' + os.path.join(directory, 'benchmark.db'))
+        from app import customer_search
+
+        with app.app_context():
+            admin_id = populate(cars=50, bookings=1000, years=1, customers=args.customers)
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin_id)
+            session['_fresh'] = True
+
+        # populate() numbers its customers from 0, with these fields
+        rnd = random.Random(3)
+        kinds = {
+            'phone': lambda i: f'+269 3{i:07d}',
+            'phone_prefix': lambda i: f'3{i:07d}'[:5],
+            'licence_prefix': lambda i: f'LIC-{i:07d}'[:9],
+            'name': lambda i: f'Customer {i}',
+            'name_prefix': lambda i: f'Customer {i}'[:11]
+        }
+
+        def search(kind):
+            return customer_search.search(kinds[kind](rnd.randrange(args.customers)))
+
+        def api():
+            query = kinds['name_prefix'](rnd.randrange(args.customers))
+            response = client.get(f'/search_customer?query={query}&token=1')
+            assert response.status_code == 200, response.status_code
+            return response
+
+        result = {'customers': args.customers}
+        with app.app_context():
+            result['name_index'] = ('fts5' if customer_search.fts_available()
+                                    else 'pg_trgm' if customer_search.trgm_available() else 'scan')
+            for kind in kinds:
+                found, result[f'{kind}_p50_ms'], result[f'{kind}_p95_ms'] = timed(lambda: search(kind), args.runs)
+                result[f'{kind}_found'] = len(found)
+        _, result['api_p50_ms'], _ = timed(api, args.runs)
+        result['budget_ms'] = args.budget_ms
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"{args.customers} customers, names searched by {result['name_index']} (budget {args.budget_ms:.0f} ms)")
+        for kind in kinds:
+            print(f"{kind:<16} p50 {result[f'{kind}_p50_ms']:7.2f} ms  p95 {result[f'{kind}_p95_ms']:7.2f} ms "
+                  f"({result[f'{kind}_found']} found)")
+        print(f"/search_customer p50 {result['api_p50_ms']:7.2f} ms")
+
+    if max(result[f'{kind}_p50_ms'] for kind in kinds) > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""
+Database pool soak test: waves of concurrent requests against one app
+process, counting the connections its pool opens in each wave.
+
+    python benchmarks/db_soak.py [--concurrency 200] [--waves 5]
+                                 [--requests 1] [--pool-size N]
+                                 [--max-overflow N] [--json]
+
+Each wave starts --concurrency threads together, as a process serving
+that many requests at once would (gunicorn --threads), and each makes
+--requests requests to the dashboard, the bookings API, the customer
+search and the availability API, all checking out a database connection.
+The first wave fills the pool; after it a pool sized for the load opens
+no connection at all. Overflow connections are closed as soon as they
+are returned, so they show up here as connections opened in every wave:
+that is the churn this reports. --pool-size and --max-overflow override
+DB_POOL_SIZE and DB_MAX_OVERFLOW of the production config, which is used
+otherwise. Exits with status 1 when a wave after the first opened a
+connection, or a request failed or timed out waiting for one.
+
+Pass --database-url to run against PostgreSQL instead of a temporary
+SQLite file (the database must be empty); its max_connections bounds the
+pool sizes worth trying.
+"""
+from fleet_data import create_benchmark_app, populate
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+# What every thread requests in turn, a mix of pages and API calls
+PATHS = (
+    '/dashboard',
+    '/api/bookings?status=active',
+    '/search_customer?query=Customer 1&token=1',
+    '/api/availability?start=2031-01-01&end=2031-01-05'
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--waves', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=1, help='requests per thread and wave')
+    parser.add_argument('--pool-size', type=int)
+    parser.add_argument('--max-overflow', type=int)
+    parser.add_argument('--database-url')
+    parser.add_argument('--json', action='store_true', help='print one JSON object')
+    args = parser.parse_args()
+
+    # The config reads them when imported
+    if args.pool_size is not None:
+        os.environ['DB_POOL_SIZE'] = str(args.pool_size)
+    if args.max_overflow is not None:
+        os.environ['DB_MAX_OVERFLOW'] = str(args.max_overflow)
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_benchmark_app(args.database_url or 'sqlite:///' + os.path.join(directory, 'benchmark.db'))
+        from app import db
+        from app.db_pool import stats
+
+        with app.app_context():
+            admin_id = populate(cars=50, bookings=5000, years=1, customers=1000)
+            engine = db.engine
+        pool = engine.pool
+
+        clients = []
+        for _ in range(args.concurrency):
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(admin_id)
+                session['_fresh'] = True
+            clients.append(client)
+
+        def wave():
+            barrier = threading.Barrier(args.concurrency)
+            latencies = []
+            errors = []
+            peak = [0]
+            running = [True]
+
+            def work(index, client):
+                barrier.wait()
+                for number in range(args.requests):
+                    path = PATHS[(index + number) % len(PATHS)]
+                    started = time.perf_counter()
+                    try:
+                        status = client.get(path).status_code
+                    except Exception as e:
+                        errors.append(f'{path}: {e!r}')
+                        continue
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    if status != 200:
+                        errors.append(f'{path}: {status}')
+
+            def watch():
+                while running[0]:
+                    peak[0] = max(peak[0], pool.checkedout())
+                    time.sleep(0.001)
+
+            connects, timeouts = stats.connects, stats.timeouts
+            watcher = threading.Thread(target=watch)
+            watcher.start()
+            threads = [threading.Thread(target=work, args=(index, client)) for index, client in enumerate(clients)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            seconds = time.perf_counter() - started
+            running[0] = False
+            watcher.join()
+
+            latencies.sort()
+            return {
+                'requests': args.concurrency * args.requests,
+                'seconds': round(seconds, 2),
+                'new_connections': stats.connects - connects,
+                'timeouts': stats.timeouts - timeouts,
+                'errors': len(errors),
+                'peak_checked_out': peak[0],
+                'p50_ms': round(statistics.median(latencies), 1) if latencies else None,
+                'p95_ms': round(latencies[int(0.95 * (len(latencies) - 1))], 1) if latencies else None,
+                'first_error': errors[0] if errors else None
+            }
+
+        waves = [wave() for _ in range(args.waves)]
+        result = {
+            'concurrency': args.concurrency,
+            'pool_size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'waves': waves,
+            'churn': sum(w['new_connections'] for w in waves[1:])
+        }
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"{args.concurrency} concurrent threads, pool {result['pool_size']} + overflow {result['max_overflow']}")
+        for number, w in enumerate(waves, 1):
+            print(f"wave {number}: {w['requests']} requests in {w['seconds']:.2f} s, "
+                  f"{w['new_connections']} new connections, peak {w['peak_checked_out']} checked out, "
+                  f"p50 {w['p50_ms']} ms, p95 {w['p95_ms']} ms, {w['timeouts']} timeouts, {w['errors']} errors")
+            if w['first_error']:
+                print(f"  first error: {w['first_error']}")
+        print(f"connections opened after the first wave: {result['churn']}")
+
+    if result['churn'] or any(w['timeouts'] or w['errors'] for w in waves):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+"""
+Financial summary benchmark: SQL statements and latency of the financial
+summary page and its reports on a seeded database.
+
+    python benchmarks/financial_summary.py [--bookings 100000] [--cars 300]
+                                           [--years 3] [--runs 20]
+                                           [--budget-ms 500] [--json]
+
+The page must run the same handful of statements whatever the data size;
+the script exits with status 1 when the page's median exceeds the budget.
+Pass --database-url to run against PostgreSQL instead of a temporary
+SQLite file (the database must be empty).
+"""
+from datetime import datetime
+from fleet_data import create_benchmark_app, populate, timed
+from sqlalchemy import event
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--cars', type=int, default=300)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=500.0)
+    parser.add_argument('--database-url')
+    parser.add_argument('--json', action='store_true', help='print one JSON object')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_benchmark_app(args.database_url or 'sqlite:///' + os.path.join(directory, 'benchmark.db'))
+        from app import db, reports
+        from app.periods import month_range
+
+        with app.app_context():
+            admin_id = populate(args.cars, args.bookings, args.years, maintenance=args.cars * 10)
+            engine = db.engine
+
+        executed = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            executed.append(statement)
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin_id)
+            session['_fresh'] = True
+
+        def page():
+            response = client.get('/financial_summary')
+            assert response.status_code == 200, response.status_code
+            return response
+
+        page()
+        event.listen(engine, 'before_cursor_execute', record)
+        page()
+        event.remove(engine, 'before_cursor_execute', record)
+        statements = len(executed)
+
+        result = {'bookings': args.bookings, 'cars': args.cars, 'page_statements': statements}
+        _, result['page_p50_ms'], result['page_p95_ms'] = timed(page, args.runs)
+        with app.app_context():
+            today = datetime.now()
+            period = month_range(today.year, today.month)
+            _, result['booking_totals_p50_ms'], _ = timed(lambda: reports.booking_totals(period), args.runs)
+            _, result['car_performance_p50_ms'], _ = timed(reports.car_performance, args.runs)
+        result['budget_ms'] = args.budget_ms
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"{args.bookings} bookings, {args.cars} cars")
+        print(f"/financial_summary  {statements} statements, p50 {result['page_p50_ms']:.1f} ms, "
+              f"p95 {result['page_p95_ms']:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        print(f"booking_totals      p50 {result['booking_totals_p50_ms']:.1f} ms")
+        print(f"car_performance     p50 {result['car_performance_p50_ms']:.1f} ms")
+
+    if result['page_p50_ms'] > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
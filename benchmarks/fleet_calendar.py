@@ -0,0 +1,82 @@
+"""
+Fleet calendar benchmark: latency and payload of a year-long occupancy
+calendar of a large fleet.
+
+    python benchmarks/fleet_calendar.py [--bookings 200000] [--cars 500]
+                                        [--years 5] [--days 365] [--runs 20]
+                                        [--budget-ms 500] [--json]
+
+Times fleet_calendar() and GET /api/fleet_calendar over the next --days
+days, with bookings and maintenance spread up to a year ahead (the default
+sizes book the fleet about 75% of its days), and reports the number of
+segments and the response size. Exits with status 1 when the
+endpoint's median exceeds the budget. Pass --database-url to run against
+PostgreSQL instead of a temporary SQLite file (the database must be empty).
+"""
+from datetime import datetime, timedelta
+from fleet_data import create_benchmark_app, populate, timed
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=200000)
+    parser.add_argument('--cars', type=int, default=500)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=500.0)
+    parser.add_argument('--database-url')
+    parser.add_argument('--json', action='store_true', help='print one JSON object')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_benchmark_app(args.database_url or 'sqlite:///' + os.path.join(directory, 'benchmark.db'))
+        from app import availability
+
+        with app.app_context():
+            admin_id = populate(args.cars, args.bookings, args.years, maintenance=args.cars * 4, ahead_days=365)
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin_id)
+            session['_fresh'] = True
+
+        first_day = datetime.now()
+        last_day = first_day + timedelta(days=args.days - 1)
+        url = f"/api/fleet_calendar?from={first_day:%Y-%m-%d}&to={last_day:%Y-%m-%d}"
+
+        def api():
+            response = client.get(url)
+            assert response.status_code == 200, response.status_code
+            return response
+
+        result = {'bookings': args.bookings, 'cars': args.cars, 'days': args.days}
+        with app.app_context():
+            calendar, result['calendar_p50_ms'], result['calendar_p95_ms'] = timed(
+                lambda: availability.fleet_calendar(first_day, last_day), args.runs
+            )
+        result['segments'] = sum(len(car['segments']) for car in calendar['cars'])
+        response, result['api_p50_ms'], result['api_p95_ms'] = timed(api, args.runs)
+        result['response_bytes'] = len(response.data)
+        result['budget_ms'] = args.budget_ms
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"{args.bookings} bookings, {args.cars} cars x {args.days} days: "
+              f"{result['segments']} segments, {result['response_bytes'] / 1024:.0f} KiB")
+        print(f"fleet_calendar      p50 {result['calendar_p50_ms']:7.1f} ms  p95 {result['calendar_p95_ms']:7.1f} ms")
+        print(f"/api/fleet_calendar p50 {result['api_p50_ms']:7.1f} ms  "
+              f"p95 {result['api_p95_ms']:7.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    if result['api_p50_ms'] > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Bulk data for the reporting and availability benchmarks: an app on its own
+database with a fleet, customers and years of bookings and maintenance,
+inserted with executemany rather than one ORM object at a time.
+
+    from fleet_data import create_benchmark_app, populate, timed
+
+The benchmark scripts import it from this directory.
+"""
+from datetime import datetime, timedelta
+import os
+import random
+import statistics
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Rows per INSERT batch
+BATCH_SIZE = 10000
+
+
+def create_benchmark_app(database_url):
+    """
+    The production app on database_url, with the schema created. Logging
+    stays at WARNING so that record writing does not skew the timings.
+    """
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    os.environ.setdefault('LOG_QUEUE', '0')
+    sys.path.insert(0, PROJECT_DIR)
+    import config
+    from app import create_app, db
+
+    app = create_app(config.ProductionConfig)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def _insert(model, rows):
+    from app import db
+    from sqlalchemy import insert
+
+    for offset in range(0, len(rows), BATCH_SIZE):
+        db.session.execute(insert(model), rows[offset:offset + BATCH_SIZE])
+    db.session.commit()
+
+
+def populate(cars, bookings, years, customers=1000, maintenance=0, ahead_days=0, seed=1):
+    """
+    Fill the database of the current app context: one admin, cars in two
+    categories, customers, and bookings and maintenance records spread
+    over the years up to today and ahead_days past it, 1 to 7 days long,
+    at random (a car's bookings may overlap). Bookings ending before today
+    are completed, the rest active. The ledger, customer stats and search
+    keys are rebuilt afterwards, as the ORM hooks do not see the bulk
+    inserts, and PostgreSQL's statistics gathered. Returns the admin's id.
+    """
+    from app import customer_search, customer_stats, db, ledger
+    from app.models import Booking, Car, Customer, Maintenance, User
+    from sqlalchemy import text
+
+    rnd = random.Random(seed)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    first_day = today - timedelta(days=365 * years)
+    span = (today - first_day).days + ahead_days
+
+    _insert(User, [{
+        'email': 'admin@example.com', 'name': 'Admin', 'password': 'x', 'employee_id': 'ADMIN',
+        'role': 'admin', 'is_admin': True, 'is_active': True
+    }])
+    _insert(Car, [{
+        'model': f'Model {i % 40}', 'year': 2015 + i % 10, 'license_plate': f'BENCH-{i:06d}',
+        'daily_rate': 40 + i % 12 * 10, 'category': 'SUV' if i % 3 == 0 else 'Sedan',
+        'is_available': True, 'display_order': (i + 1) * 1024
+    } for i in range(cars)])
+    _insert(Customer, [{
+        'name': f'Customer {i}', 'phone': f'+269 3{i:07d}', 'license_number': f'LIC-{i:07d}',
+        'nin_passport_number': f'NIN-{i:07d}', 'created_at': first_day
+    } for i in range(customers)])
+
+    rows = []
+    for _ in range(bookings):
+        start = first_day + timedelta(days=rnd.randrange(span))
+        end = start + timedelta(days=rnd.randint(0, 6))
+        rows.append({
+            'employee_id': 1, 'customer_id': rnd.randint(1, customers), 'car_id': rnd.randint(1, cars),
+            'start_date': start, 'end_date': end, 'total_cost': 100.0 * ((end - start).days + 1),
+            'deposit_amount': 30.0, 'status': 'completed' if end < today else 'active',
+            'created_at': start - timedelta(days=rnd.randint(0, 30))
+        })
+    # A real table grows in the order bookings are made
+    rows.sort(key=lambda row: row['created_at'])
+    _insert(Booking, rows)
+
+    _insert(Maintenance, [{
+        'car_id': rnd.randint(1, cars), 'employee_id': 1, 'issue_description': 'Service',
+        'status': 'completed', 'cost': 50.0, 'start_date': start, 'end_date': start + timedelta(days=1)
+    } for start in (first_day + timedelta(days=rnd.randrange(span)) for _ in range(maintenance))])
+
+    ledger.rebuild()
+    customer_stats.rebuild()
+    customer_search.rebuild()
+
+    # Planner statistics, which autovacuum would have gathered by now
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute(text('ANALYZE'))
+        db.session.commit()
+    return 1
+
+
+def timed(function, runs):
+    """
+    Call function runs times; returns its last result and the median and
+    95th percentile duration in milliseconds.
+    """
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = function()
+        samples.append(1000 * (time.perf_counter() - started))
+    p95 = statistics.quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+    return result, round(statistics.median(samples), 2), round(p95, 2)
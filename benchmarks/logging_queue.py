@@ -0,0 +1,128 @@
+"""
+Logging benchmark: request latency of log-heavy routes with the logging
+queue (LOG_QUEUE=1) and with handlers writing inside the request
+(LOG_QUEUE=0), each in a fresh interpreter with the production config.
+
+    python benchmarks/logging_queue.py [--requests 200] [--users 200]
+                                [--log-level DEBUG] [--sink-delay-ms 0] [--json]
+
+Log lines go to a file, as a worker's stdout would to the platform's
+collector; --sink-delay-ms makes every write that much slower, like a
+congested log pipe. Prints the median and 95th percentile per route.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROUTES = ['/manage_employees', '/maintenance', '/dashboard']
+
+PROBE = r'''
+import json, os, sys, time
+sys.path.insert(0, os.environ['PROJECT_DIR'])
+
+delay = float(os.environ['SINK_DELAY_MS']) / 1000
+if delay:
+    class SlowStream:
+        def __init__(self, stream):
+            self.stream = stream
+        def write(self, text):
+            time.sleep(delay)
+            return self.stream.write(text)
+        def flush(self):
+            self.stream.flush()
+    sys.stdout = SlowStream(sys.stdout)
+
+import config
+from app import create_app, db
+from app.models import User
+
+app = create_app(config.ProductionConfig)
+with app.app_context():
+    db.create_all()
+    db.session.add_all(
+        User(email=f'user{i}@example.com', name=f'User {i}', password='x', employee_id=f'E{i:05d}',
+             role='admin' if i == 0 else 'secretary', is_admin=i == 0)
+        for i in range(int(os.environ['USERS']))
+    )
+    db.session.commit()
+
+client = app.test_client()
+with client.session_transaction() as session:
+    session['_user_id'] = '1'
+    session['_fresh'] = True
+
+timings = {}
+for path in json.loads(os.environ['ROUTES']):
+    client.get(path)
+    samples = []
+    for _ in range(int(os.environ['REQUESTS'])):
+        started = time.perf_counter()
+        response = client.get(path)
+        samples.append(1000 * (time.perf_counter() - started))
+        assert response.status_code == 200, (path, response.status_code)
+    timings[path] = samples
+
+with open(os.environ['RESULT_PATH'], 'w') as result:
+    json.dump(timings, result)
+'''
+
+
+def measure(project_dir, directory, queue, args):
+    result_path = os.path.join(directory, f'result-{queue}.json')
+    env = dict(
+        os.environ,
+        PROJECT_DIR=project_dir,
+        DATABASE_URL='sqlite:///' + os.path.join(directory, f'benchmark-{queue}.db'),
+        LOG_QUEUE=str(queue),
+        LOG_LEVEL=args.log_level,
+        SINK_DELAY_MS=str(args.sink_delay_ms),
+        USERS=str(args.users),
+        REQUESTS=str(args.requests),
+        ROUTES=json.dumps(ROUTES),
+        RESULT_PATH=result_path
+    )
+    with open(os.path.join(directory, f'stdout-{queue}.log'), 'w') as sink:
+        subprocess.run([sys.executable, '-c', PROBE], env=env, stdout=sink, check=True)
+    with open(result_path) as result:
+        timings = json.load(result)
+    return {
+        path: {
+            'p50_ms': round(statistics.median(samples), 2),
+            'p95_ms': round(statistics.quantiles(samples, n=20)[-1], 2)
+        }
+        for path, samples in timings.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--users', type=int, default=200, help='users in the database')
+    parser.add_argument('--log-level', default='DEBUG', help="the app logger's level (LOG_LEVEL)")
+    parser.add_argument('--sink-delay-ms', type=float, default=0.0, help='added to every write to stdout')
+    parser.add_argument('--json', action='store_true', help='print one JSON object, for CI to record')
+    args = parser.parse_args()
+
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as directory:
+        result = {
+            'direct': measure(project_dir, directory, 0, args),
+            'queued': measure(project_dir, directory, 1, args)
+        }
+
+    if args.json:
+        print(json.dumps(result))
+        return
+    print(f"{'route':20} {'direct p50':>11} {'p95':>8} {'queued p50':>11} {'p95':>8}")
+    for path in ROUTES:
+        direct, queued = result['direct'][path], result['queued'][path]
+        print(f"{path:20} {direct['p50_ms']:8.2f} ms {direct['p95_ms']:5.2f} ms "
+              f"{queued['p50_ms']:8.2f} ms {queued['p95_ms']:5.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
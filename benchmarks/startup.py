@@ -0,0 +1,84 @@
+"""
+Worker boot benchmark: cold import of the app, create_app() and the first
+request, each run in a fresh interpreter as a gunicorn worker would.
+
+    python benchmarks/startup.py [--runs 5] [--budget-ms 300] [--json]
+
+Prints the median of each phase and exits with status 1 when the median
+create_app() plus first request exceeds the budget. Imports are reported
+separately: with "gunicorn --preload" they happen once, in the master.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROBE = r'''
+import json, os, sys, time
+started = time.perf_counter()
+sys.path.insert(0, os.environ['PROJECT_DIR'])
+import config
+from app import create_app
+imported = time.perf_counter()
+app = create_app(config.ProductionConfig)
+created = time.perf_counter()
+response = app.test_client().get('/login')
+served = time.perf_counter()
+print(json.dumps({
+    'import_ms': 1000 * (imported - started),
+    'create_app_ms': 1000 * (created - imported),
+    'first_request_ms': 1000 * (served - created),
+    'status': response.status_code
+}))
+'''
+
+
+def measure(project_dir, database_url):
+    env = dict(os.environ, PROJECT_DIR=project_dir, DATABASE_URL=database_url)
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=300.0)
+    parser.add_argument('--json', action='store_true', help='print one JSON object, for CI to record')
+    args = parser.parse_args()
+
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as directory:
+        # An empty database: create_app must not need one
+        database_url = 'sqlite:///' + os.path.join(directory, 'benchmark.db')
+        runs = [measure(project_dir, database_url) for _ in range(args.runs)]
+
+    result = {
+        phase: round(statistics.median(run[phase] for run in runs), 1)
+        for phase in ('import_ms', 'create_app_ms', 'first_request_ms')
+    }
+    result['boot_ms'] = round(result['create_app_ms'] + result['first_request_ms'], 1)
+    result['budget_ms'] = args.budget_ms
+    result['runs'] = args.runs
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"import          {result['import_ms']:8.1f} ms")
+        print(f"create_app      {result['create_app_ms']:8.1f} ms")
+        print(f"first request   {result['first_request_ms']:8.1f} ms")
+        print(f"worker boot     {result['boot_ms']:8.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    if any(run['status'] != 200 for run in runs):
+        print('The first request did not succeed.', file=sys.stderr)
+        sys.exit(1)
+    if result['boot_ms'] > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
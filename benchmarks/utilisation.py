@@ -0,0 +1,83 @@
+"""
+Utilisation benchmark: latency of the utilisation report over five years
+of a 300-car fleet.
+
+    python benchmarks/utilisation.py [--bookings 100000] [--cars 300]
+                                     [--years 5] [--runs 10]
+                                     [--budget-ms 200] [--json]
+
+Times reports.utilisation() over the whole period grouped per car, per
+category and per month (61 monthly buckets, the first and last partial),
+and GET /api/utilisation per month. The default sizes book the fleet
+about 75% of its days. Exits with status 1 when the slowest grouping's
+median exceeds the budget. Pass --database-url to run against PostgreSQL
+instead of a temporary SQLite file (the database must be empty); the
+budget is for PostgreSQL, the production database, as SQLite evaluates
+the per-row date arithmetic a few times slower.
+"""
+from datetime import datetime, timedelta
+from fleet_data import create_benchmark_app, populate, timed
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--cars', type=int, default=300)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=200.0)
+    parser.add_argument('--database-url')
+    parser.add_argument('--json', action='store_true', help='print one JSON object')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_benchmark_app(args.database_url or 'sqlite:///' + os.path.join(directory, 'benchmark.db'))
+        from app import reports
+
+        with app.app_context():
+            admin_id = populate(args.cars, args.bookings, args.years, maintenance=args.cars * 10)
+
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(admin_id)
+            session['_fresh'] = True
+
+        last_day = datetime.now()
+        first_day = last_day - timedelta(days=365 * args.years)
+        url = f"/api/utilisation?from={first_day:%Y-%m-%d}&to={last_day:%Y-%m-%d}&by=month"
+
+        def api():
+            response = client.get(url)
+            assert response.status_code == 200, response.status_code
+            return response
+
+        result = {'bookings': args.bookings, 'cars': args.cars, 'years': args.years}
+        with app.app_context():
+            for group_by in reports.UTILISATION_GROUPS:
+                rows, result[f'{group_by}_p50_ms'], result[f'{group_by}_p95_ms'] = timed(
+                    lambda: reports.utilisation(first_day, last_day, group_by), args.runs
+                )
+                result[f'{group_by}_rows'] = len(rows)
+        _, result['api_month_p50_ms'], _ = timed(api, args.runs)
+        result['budget_ms'] = args.budget_ms
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print(f"{args.bookings} bookings, {args.cars} cars, {args.years} years (budget {args.budget_ms:.0f} ms)")
+        for group_by in reports.UTILISATION_GROUPS:
+            print(f"by {group_by:<9} {result[f'{group_by}_rows']:4} rows  p50 {result[f'{group_by}_p50_ms']:7.1f} ms  "
+                  f"p95 {result[f'{group_by}_p95_ms']:7.1f} ms")
+        print(f"/api/utilisation?by=month  p50 {result['api_month_p50_ms']:7.1f} ms")
+
+    if max(result[f'{group_by}_p50_ms'] for group_by in reports.UTILISATION_GROUPS) > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,68 +2,188 @@ import os
 import secrets
 import logging
 
-class Config:
-    # Generate a secure random secret key if not set
-    SECRET_KEY = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
-    
-    # Ensure the secret key is always a string
-    if not isinstance(SECRET_KEY, str):
-        SECRET_KEY = str(SECRET_KEY)
-    
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
-    
-    # Database configuration prioritizes environment variable
-    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
-        'sqlite:////' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'app.db')
+LOG_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'logs')
+
 
-    # Logging configuration
-    LOGGING_CONFIG = {
+def logging_config(app_level, formatter='standard', error_file=True):
+    """
+    A logging.config.dictConfig dictionary: the app logs at app_level,
+    everything else from WARNING, to stdout; errors also go to
+    logs/app.log when error_file is set.
+    """
+    handlers = {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'stream': 'ext://sys.stdout',
+            'formatter': formatter
+        }
+    }
+    if error_file:
+        handlers['errors'] = {
+            'class': 'logging.FileHandler',
+            'filename': os.path.join(LOG_DIR, 'app.log'),
+            # Opened on the first error rather than at startup
+            'delay': True,
+            'level': 'ERROR',
+            'formatter': 'detailed'
+        }
+    return {
         'version': 1,
         'disable_existing_loggers': False,
         'formatters': {
             'standard': {
-                'format': '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+                'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
             },
-        },
-        'handlers': {
-            'default': {
-                'level': 'DEBUG',
-                'formatter': 'standard',
-                'class': 'logging.StreamHandler',
+            'detailed': {
+                'format': '%(asctime)s - %(name)s - %(levelname)s - %(filename)s:%(lineno)d - %(message)s'
             },
+            'json': {
+                '()': 'app.log_setup.JsonFormatter'
+            }
+        },
+        'handlers': handlers,
+        'root': {
+            'handlers': list(handlers),
+            'level': 'WARNING'
         },
         'loggers': {
-            '': {  # root logger
-                'handlers': ['default'],
-                'level': 'DEBUG',
-                'propagate': True
+            # The Flask app's logger (current_app.logger)
+            'app': {
+                'level': app_level
             },
-            'flask.app': {
-                'handlers': ['default'],
-                'level': 'DEBUG',
-                'propagate': False
+            # SQLAlchemy names the pool's logger after its class in
+            # app.db_pool; its checkout chatter is not app debugging
+            'app.db_pool': {
+                'level': 'WARNING'
             },
-            'sqlalchemy.engine': {
-                'handlers': ['default'],
-                'level': 'INFO',
-                'propagate': False
+            # The development server's request lines
+            'werkzeug': {
+                'level': 'INFO'
             }
         }
     }
 
+
+class Config:
+    # Generate a secure random secret key if not set
+    SECRET_KEY = os.environ.get('SECRET_KEY') or secrets.token_hex(32)
+    
+    # Ensure the secret key is always a string
+    if not isinstance(SECRET_KEY, str):
+        SECRET_KEY = str(SECRET_KEY)
+    
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # Seconds a worker may serve a cached fleet status board
+    FLEET_STATUS_TTL = int(os.environ.get('FLEET_STATUS_TTL', 30))
+
+    # Most customers returned by one customer search
+    CUSTOMER_SEARCH_LIMIT = int(os.environ.get('CUSTOMER_SEARCH_LIMIT', 10))
+
+    # Threads resizing uploaded car images; 0 resizes inside the request
+    IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+
+    # Largest request body accepted, in bytes; bigger uploads get a 413
+    # before they are read
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 200 * 1024 * 1024))
+    # Largest single car image accepted, in bytes
+    MAX_IMAGE_SIZE = int(os.environ.get('MAX_IMAGE_SIZE', 15 * 1024 * 1024))
+
+    # Where uploaded car images are kept: 'local' (the static folder, one
+    # disk) or 's3' (a bucket shared by every instance; needs boto3)
+    IMAGE_STORAGE = os.environ.get('IMAGE_STORAGE', 'local')
+    S3_BUCKET = os.environ.get('S3_BUCKET')
+    # For S3-compatible services such as MinIO; unset for AWS
+    S3_ENDPOINT_URL = os.environ.get('S3_ENDPOINT_URL')
+    S3_REGION = os.environ.get('S3_REGION')
+    # Public base URL of the bucket or of a CDN in front of it; without
+    # one, images are linked through pre-signed URLs
+    S3_PUBLIC_URL = os.environ.get('S3_PUBLIC_URL')
+    # Seconds a pre-signed image URL stays valid
+    S3_URL_EXPIRY = int(os.environ.get('S3_URL_EXPIRY', 3600))
+    
+    # Database configuration prioritizes environment variable
+    SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
+        'sqlite:////' + os.path.join(os.path.abspath(os.path.dirname(__file__)), 'app.db')
+
+    # Database connection pool (see app.db_pool.engine_options). Each
+    # worker process has its own pool of DB_POOL_SIZE connections, plus up
+    # to DB_MAX_OVERFLOW more under load; a request waits DB_POOL_TIMEOUT
+    # seconds for one before failing. Overflow connections are closed as
+    # soon as they are returned, so a burst that uses them reconnects every
+    # time: benchmarks/db_soak.py at 200 concurrent requests opened 10 new
+    # connections per wave with 5 + 10, none after the first with 15 + 0,
+    # with the same throughput and no timeouts.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 15))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 0))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))
+    # Seconds after which a connection is replaced, below the idle limits
+    # of hosted databases and proxies
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = True
+    DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 5))
+    # Longest statement a web request may run on PostgreSQL, in ms; 0 for no limit
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+
+    # Bearer token a metrics scraper sends; without one, only admins can read them
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    # Share of requests timed for /metrics and the performance page, from
+    # 0 to 1; 0 turns the instrumentation off (see app.instrumentation)
+    METRICS_SAMPLE_RATE = float(os.environ.get('METRICS_SAMPLE_RATE', 1.0))
+
+    # Warn about requests that load one relationship lazily, or run one SQL
+    # statement, NPLUSONE_THRESHOLD times or more (see app.nplusone)
+    NPLUSONE_DETECT = os.environ.get('NPLUSONE_DETECT') == '1'
+    NPLUSONE_THRESHOLD = int(os.environ.get('NPLUSONE_THRESHOLD', 5))
+    # Raise NPlusOneError from such requests instead, failing the test
+    NPLUSONE_RAISE = False
+
+    # Logging (applied by app.log_setup): levels and sinks per environment
+    LOGGING_CONFIG = logging_config(os.environ.get('LOG_LEVEL', 'INFO'))
+    # Write logs from a background thread, so requests never wait on a sink
+    LOG_QUEUE = os.environ.get('LOG_QUEUE', '1') != '0'
+    # Records held for that thread; more are dropped rather than waited for
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    # Keep 1 in N records of a level from any one line of code
+    LOG_SAMPLE_EVERY = {'DEBUG': int(os.environ.get('LOG_DEBUG_SAMPLE_EVERY', 10))}
+
 class DevelopmentConfig(Config):
     DEBUG = True
     TESTING = False
-    SQLALCHEMY_ECHO = True  # Log SQL queries
+    # Every SQL statement on stdout; the performance page has the counts
+    SQLALCHEMY_ECHO = os.environ.get('SQLALCHEMY_ECHO') == '1'
+    LOGGING_CONFIG = logging_config(os.environ.get('LOG_LEVEL', 'DEBUG'))
+    # Every debug line, as it happens
+    LOG_SAMPLE_EVERY = {}
+    NPLUSONE_DETECT = os.environ.get('NPLUSONE_DETECT', '1') == '1'
+    # One developer: a small pool, and slow queries are left to finish
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 2))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 3))
 
 class ProductionConfig(Config):
     DEBUG = False
     TESTING = False
     SQLALCHEMY_ECHO = False
+    # JSON lines on stdout, which the platform collects from every worker
+    LOGGING_CONFIG = logging_config(os.environ.get('LOG_LEVEL', 'INFO'), formatter='json', error_file=False)
+    # gunicorn's sync workers serve one request at a time, next to the
+    # IMAGE_WORKERS threads: one connection each, and no overflow to churn.
+    # Raise DB_POOL_SIZE with --threads; 15 covered 200 concurrent
+    # requests in benchmarks/db_soak.py.
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 1 + Config.IMAGE_WORKERS))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 0))
+    # Connections are replaced before the hosted database drops them idle
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 300))
+    # A runaway query fails the request instead of holding a connection
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 15000))
 
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    LOGGING_CONFIG = logging_config('WARNING', error_file=False)
+    IMAGE_WORKERS = 0
+    NPLUSONE_DETECT = True
+    NPLUSONE_RAISE = os.environ.get('NPLUSONE_RAISE', '1') == '1'
 
 config = {
     'development': DevelopmentConfig,
@@ -0,0 +1,47 @@
+"""Add per-customer booking stats
+
+Revision ID: 3a8d1c6f4b29
+Revises: c9e2f5a81d47
+Create Date: 2026-10-18 17:10:52.904137
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a8d1c6f4b29'
+down_revision = 'c9e2f5a81d47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('customer_stats',
+        sa.Column('customer_id', sa.Integer(), nullable=False),
+        sa.Column('booking_count', sa.Integer(), nullable=False),
+        sa.Column('total_spent', sa.Float(), nullable=False),
+        sa.Column('last_booking_at', sa.DateTime(), nullable=True),
+        sa.Column('active_booking_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['customer_id'], ['customer.id'], ),
+        sa.PrimaryKeyConstraint('customer_id')
+    )
+    op.create_index('ix_customer_stats_total_spent', 'customer_stats', ['total_spent', 'customer_id'], unique=False)
+    op.create_index('ix_customer_stats_last_booking_at', 'customer_stats', ['last_booking_at', 'customer_id'], unique=False)
+
+    # Every customer needs a row for the client list; "flask customer-stats
+    # rebuild" recomputes them the same way
+    op.execute(
+        "INSERT INTO customer_stats "
+        "(customer_id, booking_count, total_spent, last_booking_at, active_booking_count) "
+        "SELECT customer.id, COUNT(booking.id), COALESCE(SUM(booking.total_cost), 0), MAX(booking.created_at), "
+        "COALESCE(SUM(CASE WHEN booking.status = 'active' THEN 1 ELSE 0 END), 0) "
+        "FROM customer LEFT OUTER JOIN booking ON booking.customer_id = customer.id "
+        "GROUP BY customer.id"
+    )
+
+
+def downgrade():
+    op.drop_index('ix_customer_stats_last_booking_at', table_name='customer_stats')
+    op.drop_index('ix_customer_stats_total_spent', table_name='customer_stats')
+    op.drop_table('customer_stats')
@@ -0,0 +1,62 @@
+"""Add monthly ledger rollup
+
+Revision ID: 5b2d8e41c9a7
+Revises: 778e0fda17c2
+Create Date: 2026-10-18 09:12:40.214518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2d8e41c9a7'
+down_revision = '778e0fda17c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('monthly_ledger',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('month', sa.Integer(), nullable=False),
+        sa.Column('source', sa.String(length=20), nullable=False),
+        sa.Column('category', sa.String(length=50), nullable=False),
+        sa.Column('subcategory', sa.String(length=100), nullable=False),
+        sa.Column('entry_count', sa.Integer(), nullable=False),
+        sa.Column('total_amount', sa.Float(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('year', 'month', 'source', 'category', 'subcategory', name='_monthly_ledger_uc')
+    )
+
+    # Roll up the existing transactions, as "flask ledger rebuild" does, so
+    # the totals read from this table are right from the start
+    ledger = sa.table('monthly_ledger',
+        sa.column('year'), sa.column('month'), sa.column('source'), sa.column('category'),
+        sa.column('subcategory'), sa.column('entry_count'), sa.column('total_amount')
+    )
+    columns = ['year', 'month', 'source', 'category', 'subcategory', 'entry_count', 'total_amount']
+    for source in ('income', 'expense'):
+        transactions = sa.table(source,
+            sa.column('id'), sa.column('date'), sa.column('category'), sa.column('subcategory'), sa.column('amount')
+        )
+        year = sa.cast(sa.extract('year', transactions.c.date), sa.Integer)
+        month = sa.cast(sa.extract('month', transactions.c.date), sa.Integer)
+        subcategory = sa.func.coalesce(transactions.c.subcategory, '')
+        op.execute(ledger.insert().from_select(columns, sa.select(
+            year, month, sa.literal(source), transactions.c.category, subcategory,
+            sa.func.count(transactions.c.id), sa.func.coalesce(sa.func.sum(transactions.c.amount), 0)
+        ).group_by(year, month, transactions.c.category, subcategory)))
+
+    booking = sa.table('booking', sa.column('id'), sa.column('start_date'), sa.column('total_cost'))
+    year = sa.cast(sa.extract('year', booking.c.start_date), sa.Integer)
+    month = sa.cast(sa.extract('month', booking.c.start_date), sa.Integer)
+    op.execute(ledger.insert().from_select(columns, sa.select(
+        year, month, sa.literal('booking'), sa.literal('Rental'), sa.literal(''),
+        sa.func.count(booking.c.id), sa.func.coalesce(sa.func.sum(booking.c.total_cost), 0)
+    ).group_by(year, month)))
+
+
+def downgrade():
+    op.drop_table('monthly_ledger')
@@ -0,0 +1,25 @@
+"""Add booking index for the paginated booking list
+
+Revision ID: 7d3a9e4b1f08
+Revises: e19b5f7a2c60
+Create Date: 2026-10-18 14:02:41.530927
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3a9e4b1f08'
+down_revision = 'e19b5f7a2c60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.create_index('ix_booking_created_at_id', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.drop_index('ix_booking_created_at_id')
@@ -0,0 +1,31 @@
+"""Lead the booking interval index with end_date
+
+Revision ID: 9b4e1d7c3a25
+Revises: f2a6c8d4e157
+Create Date: 2026-10-18 21:05:12.482913
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4e1d7c3a25'
+down_revision = 'f2a6c8d4e157'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # An overlap check bounds start_date from above and end_date from below.
+    # Nearly all of a car's bookings lie in the past, so end_date >= start
+    # is the narrow range; on start_date the index scanned the car's whole
+    # history.
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.drop_index('ix_booking_car_id_start_date_end_date')
+        batch_op.create_index('ix_booking_car_id_end_date_start_date', ['car_id', 'end_date', 'start_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.drop_index('ix_booking_car_id_end_date_start_date')
+        batch_op.create_index('ix_booking_car_id_start_date_end_date', ['car_id', 'start_date', 'end_date'], unique=False)
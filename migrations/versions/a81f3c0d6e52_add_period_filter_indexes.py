@@ -0,0 +1,37 @@
+"""Add date range indexes for period filters
+
+Revision ID: a81f3c0d6e52
+Revises: 5b2d8e41c9a7
+Create Date: 2026-10-18 10:03:17.582931
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'a81f3c0d6e52'
+down_revision = '5b2d8e41c9a7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('income', schema=None) as batch_op:
+        batch_op.create_index('ix_income_date_category', ['date', 'category'], unique=False)
+
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.create_index('ix_expense_date_category', ['date', 'category'], unique=False)
+
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.create_index('ix_booking_start_date', ['start_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.drop_index('ix_booking_start_date')
+
+    with op.batch_alter_table('expense', schema=None) as batch_op:
+        batch_op.drop_index('ix_expense_date_category')
+
+    with op.batch_alter_table('income', schema=None) as batch_op:
+        batch_op.drop_index('ix_income_date_category')
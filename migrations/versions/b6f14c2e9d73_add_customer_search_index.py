@@ -0,0 +1,114 @@
+"""Add customer search keys and name index
+
+Revision ID: b6f14c2e9d73
+Revises: 7d3a9e4b1f08
+Create Date: 2026-10-18 15:21:07.664302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import re
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f14c2e9d73'
+down_revision = '7d3a9e4b1f08'
+branch_labels = None
+depends_on = None
+
+KEY_INDEXES = (
+    ('ix_customer_phone_key', 'phone_key'),
+    ('ix_customer_license_key', 'license_key'),
+    ('ix_customer_nin_key', 'nin_key'),
+)
+
+FTS_STATEMENTS = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS customer_fts USING fts5("
+    "name, content='customer', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS customer_fts_ai AFTER INSERT ON customer BEGIN "
+    "INSERT INTO customer_fts(rowid, name) VALUES (new.id, new.name); END",
+    "CREATE TRIGGER IF NOT EXISTS customer_fts_ad AFTER DELETE ON customer BEGIN "
+    "INSERT INTO customer_fts(customer_fts, rowid, name) VALUES ('delete', old.id, old.name); END",
+    "CREATE TRIGGER IF NOT EXISTS customer_fts_au AFTER UPDATE OF name ON customer BEGIN "
+    "INSERT INTO customer_fts(customer_fts, rowid, name) VALUES ('delete', old.id, old.name); "
+    "INSERT INTO customer_fts(rowid, name) VALUES (new.id, new.name); END",
+    "INSERT INTO customer_fts(customer_fts) VALUES ('rebuild')"
+)
+
+
+def _phone_key(value):
+    return re.sub(r'\D', '', value or '') or None
+
+
+def _document_key(value):
+    return re.sub(r'[^0-9A-Z]', '', (value or '').upper()) or None
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('phone_key', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('license_key', sa.String(length=50), nullable=True))
+        batch_op.add_column(sa.Column('nin_key', sa.String(length=50), nullable=True))
+        for name, column in KEY_INDEXES:
+            batch_op.create_index(name, [column], unique=False, postgresql_ops={column: 'text_pattern_ops'})
+
+    # Backfill the keys
+    customer = sa.table(
+        'customer',
+        sa.column('id', sa.Integer),
+        sa.column('phone', sa.String),
+        sa.column('license_number', sa.String),
+        sa.column('nin_passport_number', sa.String),
+        sa.column('phone_key', sa.String),
+        sa.column('license_key', sa.String),
+        sa.column('nin_key', sa.String)
+    )
+    rows = bind.execute(sa.select(
+        customer.c.id, customer.c.phone, customer.c.license_number, customer.c.nin_passport_number
+    )).fetchall()
+    if rows:
+        bind.execute(
+            customer.update().where(customer.c.id == sa.bindparam('customer_id')).values(
+                phone_key=sa.bindparam('phone_key_value'),
+                license_key=sa.bindparam('license_key_value'),
+                nin_key=sa.bindparam('nin_key_value')
+            ),
+            [{
+                'customer_id': row.id,
+                'phone_key_value': _phone_key(row.phone),
+                'license_key_value': _document_key(row.license_number),
+                'nin_key_value': _document_key(row.nin_passport_number)
+            } for row in rows]
+        )
+
+    # Name index: trigrams on PostgreSQL, FTS5 on SQLite
+    if bind.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute('CREATE INDEX ix_customer_name_trgm ON customer USING gin (name gin_trgm_ops)')
+    elif bind.dialect.name == 'sqlite':
+        try:
+            with bind.begin_nested():
+                for statement in FTS_STATEMENTS:
+                    op.execute(statement)
+        except sa.exc.OperationalError:
+            # Without FTS5 customer names are searched by scan
+            pass
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_customer_name_trgm')
+    elif bind.dialect.name == 'sqlite':
+        for trigger in ('customer_fts_ai', 'customer_fts_ad', 'customer_fts_au'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS customer_fts')
+
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        for name, _ in KEY_INDEXES:
+            batch_op.drop_index(name)
+        batch_op.drop_column('nin_key')
+        batch_op.drop_column('license_key')
+        batch_op.drop_column('phone_key')
@@ -0,0 +1,45 @@
+"""Add foreign key and filter column indexes
+
+Revision ID: c4e7d2a9b318
+Revises: a81f3c0d6e52
+Create Date: 2026-10-18 10:41:55.903127
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4e7d2a9b318'
+down_revision = 'a81f3c0d6e52'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('user', 'ix_user_email', ['email']),
+    ('user', 'ix_user_role_is_active', ['role', 'is_active']),
+    ('car_image', 'ix_car_image_car_id', ['car_id']),
+    ('booking', 'ix_booking_car_id_status', ['car_id', 'status']),
+    ('booking', 'ix_booking_status_employee_id', ['status', 'employee_id']),
+    ('booking', 'ix_booking_customer_id', ['customer_id']),
+    ('booking', 'ix_booking_employee_id', ['employee_id']),
+    ('maintenance', 'ix_maintenance_car_id_status', ['car_id', 'status']),
+    ('maintenance', 'ix_maintenance_employee_id', ['employee_id']),
+    ('expense', 'ix_expense_user_id', ['user_id']),
+    ('income', 'ix_income_user_id', ['user_id']),
+    ('agency_visible_cars', 'ix_agency_visible_cars_car_id', ['car_id']),
+    ('agency_car_status', 'ix_agency_car_status_car_id', ['car_id']),
+    ('agency_car_status', 'ix_agency_car_status_status', ['status']),
+]
+
+
+def upgrade():
+    for table, name, columns in INDEXES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    for table, name, columns in reversed(INDEXES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(name)
@@ -0,0 +1,117 @@
+"""Normalize customer identity keys and make them unique
+
+Revision ID: c9e2f5a81d47
+Revises: b6f14c2e9d73
+Create Date: 2026-10-18 16:02:41.318574
+
+"""
+from alembic import op
+import sqlalchemy as sa
+import re
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e2f5a81d47'
+down_revision = 'b6f14c2e9d73'
+branch_labels = None
+depends_on = None
+
+UNIQUE_KEY_INDEXES = (
+    ('ix_customer_phone_key', 'phone_key'),
+    ('ix_customer_nin_key', 'nin_key'),
+)
+
+# Snapshot of app.normalization at the time of this migration
+DEFAULT_COUNTRY_CODE = '269'
+NATIONAL_NUMBER_LENGTH = 7
+
+
+def _normalize_phone(value):
+    value = (value or '').strip()
+    digits = re.sub(r'\D', '', value)
+    if not digits:
+        return None
+    if value.startswith('+'):
+        return '+' + digits
+    if digits.startswith('00'):
+        return '+' + digits[2:]
+    if digits.startswith(DEFAULT_COUNTRY_CODE) and len(digits) >= len(DEFAULT_COUNTRY_CODE) + NATIONAL_NUMBER_LENGTH:
+        return '+' + digits
+    return '+' + DEFAULT_COUNTRY_CODE + digits.lstrip('0')
+
+
+def _digits(value):
+    return re.sub(r'\D', '', value or '') or None
+
+
+def _document_key(value):
+    return re.sub(r'[^0-9A-Z]', '', (value or '').upper()) or None
+
+
+customer = sa.table(
+    'customer',
+    sa.column('id', sa.Integer),
+    sa.column('phone', sa.String),
+    sa.column('license_number', sa.String),
+    sa.column('nin_passport_number', sa.String),
+    sa.column('phone_key', sa.String),
+    sa.column('license_key', sa.String),
+    sa.column('nin_key', sa.String)
+)
+
+
+def _backfill(bind, phone_key):
+    rows = bind.execute(sa.select(
+        customer.c.id, customer.c.phone, customer.c.license_number, customer.c.nin_passport_number
+    )).fetchall()
+    if rows:
+        bind.execute(
+            customer.update().where(customer.c.id == sa.bindparam('customer_id')).values(
+                phone_key=sa.bindparam('phone_key_value'),
+                license_key=sa.bindparam('license_key_value'),
+                nin_key=sa.bindparam('nin_key_value')
+            ),
+            [{
+                'customer_id': row.id,
+                'phone_key_value': phone_key(row.phone),
+                'license_key_value': _document_key(row.license_number),
+                'nin_key_value': _document_key(row.nin_passport_number)
+            } for row in rows]
+        )
+
+
+def upgrade():
+    bind = op.get_bind()
+    _backfill(bind, _normalize_phone)
+
+    # Refuse to build the unique indexes over duplicates: they have to be
+    # merged (bookings included) by the dedupe command, not dropped here
+    for _, column in UNIQUE_KEY_INDEXES:
+        key = customer.c[column]
+        duplicates = bind.execute(
+            sa.select(sa.func.count()).select_from(
+                sa.select(key).where(key.isnot(None)).group_by(key).having(sa.func.count() > 1).subquery()
+            )
+        ).scalar()
+        if duplicates:
+            raise RuntimeError(
+                f'{duplicates} {column} values are shared by several customers. '
+                'Run "flask customers dedupe" and upgrade again.'
+            )
+
+    # Index changes only, so SQLite keeps the table (and its FTS triggers)
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        for name, column in UNIQUE_KEY_INDEXES:
+            batch_op.drop_index(name)
+            batch_op.create_index(name, [column], unique=True, postgresql_ops={column: 'text_pattern_ops'})
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    with op.batch_alter_table('customer', schema=None) as batch_op:
+        for name, column in UNIQUE_KEY_INDEXES:
+            batch_op.drop_index(name)
+            batch_op.create_index(name, [column], unique=False, postgresql_ops={column: 'text_pattern_ops'})
+
+    _backfill(bind, _digits)
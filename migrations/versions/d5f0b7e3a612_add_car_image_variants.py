@@ -0,0 +1,27 @@
+"""Add resized variants to car images
+
+Revision ID: d5f0b7e3a612
+Revises: 3a8d1c6f4b29
+Create Date: 2026-10-18 18:04:19.551830
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd5f0b7e3a612'
+down_revision = '3a8d1c6f4b29'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('car_image', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('variants', sa.Text(), nullable=True))
+    # Resize the existing uploads afterwards with "flask images backfill"
+
+
+def downgrade():
+    with op.batch_alter_table('car_image', schema=None) as batch_op:
+        batch_op.drop_column('variants')
@@ -0,0 +1,25 @@
+"""Add booking interval index for availability checks
+
+Revision ID: e19b5f7a2c60
+Revises: c4e7d2a9b318
+Create Date: 2026-10-18 11:27:08.116480
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'e19b5f7a2c60'
+down_revision = 'c4e7d2a9b318'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.create_index('ix_booking_car_id_start_date_end_date', ['car_id', 'start_date', 'end_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('booking', schema=None) as batch_op:
+        batch_op.drop_index('ix_booking_car_id_start_date_end_date')
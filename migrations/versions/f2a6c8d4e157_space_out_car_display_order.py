@@ -0,0 +1,41 @@
+"""Space out car display order and index it
+
+Revision ID: f2a6c8d4e157
+Revises: d5f0b7e3a612
+Create Date: 2026-10-18 20:02:41.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a6c8d4e157'
+down_revision = 'd5f0b7e3a612'
+branch_labels = None
+depends_on = None
+
+# app.car_order.ORDER_GAP at the time of this migration
+ORDER_GAP = 1024
+
+
+def upgrade():
+    # Keep the current order, ties broken by id, with gaps between the
+    # cars so a moved car can be placed without renumbering the others
+    connection = op.get_bind()
+    car_ids = [row[0] for row in connection.execute(sa.text(
+        'SELECT id FROM car ORDER BY COALESCE(display_order, 0), id'
+    ))]
+    if car_ids:
+        connection.execute(
+            sa.text('UPDATE car SET display_order = :position WHERE id = :id'),
+            [{'id': car_id, 'position': index * ORDER_GAP} for index, car_id in enumerate(car_ids, start=1)]
+        )
+
+    with op.batch_alter_table('car', schema=None) as batch_op:
+        batch_op.create_index('ix_car_display_order', ['display_order', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('car', schema=None) as batch_op:
+        batch_op.drop_index('ix_car_display_order')
@@ -0,0 +1,125 @@
+from app import create_app, db, customer_search, customer_stats, ledger
+from app.bootstrap import ensure_admin
+from app.fleet import fleet_status
+from app.models import Booking, Car, Customer, Expense, Income, Maintenance, User
+from config import TestingConfig
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from sqlalchemy import event
+import pytest
+import random
+
+
+def seed():
+    """
+    A small agency: an admin, a manager and a secretary, six cars, twenty
+    customers, sixty bookings over this year, and some maintenance,
+    incomes and expenses, with the ledger and the customer stats built.
+    Returns the admin.
+    """
+    admin, _ = ensure_admin('admin@carrent.com', 'admin-password')
+    employees = [
+        User(email='manager@carrent.com', name='Manager', password='x', employee_id='EMP001', role='manager'),
+        User(email='secretary@carrent.com', name='Secretary', password='x', employee_id='EMP002', role='secretary')
+    ]
+    db.session.add_all(employees)
+
+    cars = [
+        Car(model=f'Model {i}', year=2020 + i % 4, license_plate=f'PLATE-{i}', daily_rate=100 + 10 * i,
+            category='SUV' if i % 2 else 'Sedan', display_order=(i + 1) * 1024)
+        for i in range(6)
+    ]
+    customers = [
+        Customer(name=f'Customer {i}', phone=f'+269 33{i:05d}', license_number=f'LIC-{i}',
+                 nin_passport_number=f'NIN-{i}')
+        for i in range(20)
+    ]
+    db.session.add_all(cars + customers)
+    db.session.flush()
+
+    rnd = random.Random(1)
+    first_day = datetime(datetime.now().year, 1, 1)
+    for _ in range(60):
+        start = first_day + timedelta(days=rnd.randint(0, 360))
+        db.session.add(Booking(
+            employee_id=admin.id, customer_id=rnd.choice(customers).id, car_id=rnd.choice(cars).id,
+            start_date=start, end_date=start + timedelta(days=rnd.randint(1, 7)),
+            total_cost=rnd.randint(100, 900), deposit_amount=30, status=rnd.choice(['active', 'completed']),
+            created_at=start - timedelta(days=rnd.randint(0, 10))
+        ))
+    for user in [admin] + employees:
+        for _ in range(4):
+            db.session.add(Maintenance(
+                car_id=rnd.choice(cars).id, employee_id=user.id, issue_description='Service',
+                status='completed', cost=rnd.randint(10, 100), start_date=first_day + timedelta(days=rnd.randint(0, 300))
+            ))
+            db.session.add(Income(amount=rnd.randint(10, 100), category='Car Order', subcategory='Deposit',
+                                  user_id=user.id, date=datetime.now()))
+            db.session.add(Expense(amount=rnd.randint(10, 100), category='Bills', subcategory='Electricity',
+                                   user_id=user.id, date=datetime.now()))
+    db.session.commit()
+
+    ledger.rebuild()
+    customer_stats.rebuild()
+    customer_search.rebuild()
+    return admin
+
+
+@pytest.fixture
+def app():
+    # A new in-memory database for every test. No app context is left
+    # pushed, so each request gets its own session as in production.
+    app = create_app(TestingConfig)
+    with app.app_context():
+        db.create_all()
+        app.config['ADMIN_ID'] = seed().id
+    # The board is cached per process, across apps
+    fleet_status.invalidate()
+    return app
+
+
+@pytest.fixture
+def context(app):
+    """
+    An app context for tests that use the database directly. Requests
+    made inside it share its session.
+    """
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+@pytest.fixture
+def admin_id(app):
+    return app.config['ADMIN_ID']
+
+
+@pytest.fixture
+def client(app, admin_id):
+    return login(app.test_client(), admin_id)
+
+
+@contextmanager
+def statements(app):
+    """
+    Collect the SQL statements the app runs inside the block.
+    """
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        yield executed
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
@@ -0,0 +1,143 @@
+from app import availability, db
+from app.availability import rental_days
+from app.models import AgencyVisibleCar, Booking, Car, User
+from conftest import login
+from datetime import datetime, timedelta
+from flask import template_rendered
+import pytest
+
+BOOKING_FORM = {
+    'customer_name': 'New Customer',
+    'customer_phone': '+269 3400000',
+    'license_number': 'LIC-NEW',
+    'nin_passport_number': 'NIN-NEW',
+    'nationality': 'Comorian'
+}
+
+
+def test_rental_days_include_both_ends():
+    assert rental_days(datetime(2026, 3, 1), datetime(2026, 3, 1)) == 1
+    assert rental_days(datetime(2026, 3, 1), datetime(2026, 3, 4)) == 4
+    assert rental_days(datetime(2026, 2, 27, 18), datetime(2026, 3, 2, 9)) == 4
+
+
+@pytest.fixture
+def car_id(app):
+    # A car with no bookings yet
+    with app.app_context():
+        car = Car(model='Fresh', year=2025, license_plate='FRESH-1', daily_rate=50, category='Sedan', display_order=99999)
+        db.session.add(car)
+        db.session.commit()
+        return car.id
+
+
+def _book(client, car_id, start, end):
+    return client.post(f'/book/{car_id}', data=dict(BOOKING_FORM, start_date=start, end_date=end))
+
+
+def _booking(app, car_id):
+    with app.app_context():
+        return db.session.execute(
+            db.select(Booking.id, Booking.end_date, Booking.total_cost).where(Booking.car_id == car_id)
+            .order_by(Booking.start_date)
+        ).all()
+
+
+def test_changing_the_return_date_charges_like_booking(app, client, car_id):
+    _book(client, car_id, '2030-05-01', '2030-05-03')
+    [(booking_id, _, booked_cost)] = _booking(app, car_id)
+    assert booked_cost == 3 * 50
+
+    response = client.post('/update_return_date', data={'booking_id': booking_id, 'new_end_date': '2030-05-05'})
+
+    assert response.status_code == 200
+    assert _booking(app, car_id) == [(booking_id, datetime(2030, 5, 5), 5 * 50)]
+
+
+def test_return_date_cannot_overlap_another_booking(app, client, car_id):
+    _book(client, car_id, '2030-05-01', '2030-05-03')
+    _book(client, car_id, '2030-05-10', '2030-05-12')
+    (first_id, first_end, first_cost), second = _booking(app, car_id)
+
+    response = client.post('/update_return_date', data={'booking_id': first_id, 'new_end_date': '2030-05-10'})
+
+    assert response.status_code == 409
+    assert _booking(app, car_id) == [(first_id, first_end, first_cost), second]
+
+    # Up to the day before the next booking is fine
+    response = client.post('/update_return_date', data={'booking_id': first_id, 'new_end_date': '2030-05-09'})
+    assert response.status_code == 200
+
+
+def _reservation_reached(app, car_id, admin_id):
+    # A reservation made earlier whose dates have come: nothing flipped
+    # the car's is_available flag
+    with app.app_context():
+        today = datetime.now()
+        db.session.add(Booking(employee_id=admin_id, customer_id=1, car_id=car_id, start_date=today - timedelta(days=1),
+                               end_date=today + timedelta(days=1), total_cost=150, deposit_amount=45, status='active'))
+        db.session.commit()
+        assert db.session.get(Car, car_id).is_available
+
+
+def _dashboard_available_cars(app, client):
+    rendered = []
+
+    def record(sender, template, context, **extra):
+        rendered.append(context)
+
+    with template_rendered.connected_to(record, app):
+        assert client.get('/dashboard').status_code == 200
+    return rendered[0]['available_cars']
+
+
+def test_dashboard_counts_cars_free_today(app, client, car_id, admin_id):
+    available = _dashboard_available_cars(app, client)
+    with app.app_context():
+        today = datetime.now()
+        assert available == sum(availability.car_is_free(car.id, today, today) for car in Car.query.all())
+
+    _reservation_reached(app, car_id, admin_id)
+
+    assert _dashboard_available_cars(app, client) == available - 1
+
+
+@pytest.fixture
+def agency(app, car_id):
+    with app.app_context():
+        agency = User(email='agency@carrent.com', name='Agency', password='x', employee_id='AG001', role='agency')
+        db.session.add(agency)
+        db.session.flush()
+        db.session.add(AgencyVisibleCar(agency_id=agency.id, car_id=car_id))
+        db.session.commit()
+        return login(app.test_client(), agency.id)
+
+
+def test_agencies_cannot_mark_a_car_booked_today(app, agency, car_id, admin_id):
+    _reservation_reached(app, car_id, admin_id)
+
+    response = agency.post('/agency/update_car_status', data={'car_id': car_id, 'status': 'booked'})
+
+    assert response.status_code == 403
+    assert response.json['message'] == 'Car is currently booked and cannot be modified.'
+
+
+def test_agencies_can_mark_a_free_car_whatever_its_flag(app, agency, car_id):
+    with app.app_context():
+        db.session.get(Car, car_id).is_available = False
+        db.session.commit()
+
+    response = agency.post('/agency/update_car_status', data={'car_id': car_id, 'status': 'booked'})
+
+    assert response.status_code == 200
+
+
+def test_overlap_checks_search_the_interval_index_by_end_date(context):
+    # Bookings mostly lie in the past: end_date >= start is the narrow range
+    week = (datetime(2030, 5, 1), datetime(2030, 5, 7))
+    query = availability.free_cars_query(*week).statement
+    sql = str(query.compile(db.engine, compile_kwargs={'literal_binds': True}))
+
+    plan = ' '.join(row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+
+    assert 'USING INDEX ix_booking_car_id_end_date_start_date (car_id=? AND end_date>?)' in plan
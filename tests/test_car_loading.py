@@ -0,0 +1,61 @@
+from app import db
+from app.fleet import fleet_status
+from app.models import Booking, Car, Customer
+from conftest import statements
+from datetime import datetime, timedelta
+from sqlalchemy import event
+import pytest
+
+# SQL statements each car listing runs, the logged-in user's lookup
+# included, whatever the fleet size and booking history; none of them
+# loads a booking row
+VIEW_STATEMENTS = {
+    '/': 2,
+    '/dashboard': 6,
+    '/maintenance': 3,
+    '/manage_cars': 3,
+    '/manage_employees': 6,
+    '/get_agency_cars/{admin}': 3,
+    '/financial_summary': 5
+}
+
+
+def _grow(admin_id):
+    # Ten more cars with twenty bookings each
+    customer = Customer.query.first()
+    cars = [Car(model=f'Extra {i}', year=2024, license_plate=f'EXTRA-{i}', daily_rate=80, category='Sedan',
+                display_order=100000 + i) for i in range(10)]
+    db.session.add_all(cars)
+    db.session.flush()
+    start = datetime(datetime.now().year, 1, 1)
+    db.session.add_all([
+        Booking(employee_id=admin_id, customer_id=customer.id, car_id=car.id,
+                start_date=start + timedelta(days=10 * i), end_date=start + timedelta(days=10 * i + 2),
+                total_cost=160, deposit_amount=48, status='completed')
+        for car in cars for i in range(20)
+    ])
+    db.session.commit()
+    fleet_status.invalidate()
+
+
+@pytest.mark.parametrize('grown', [False, True], ids=['seeded', 'grown'])
+@pytest.mark.parametrize('url', list(VIEW_STATEMENTS))
+def test_car_listing_statements(app, client, admin_id, url, grown):
+    if grown:
+        with app.app_context():
+            _grow(admin_id)
+    loaded = []
+
+    def count_load(target, context):
+        loaded.append(target)
+
+    event.listen(Booking, 'load', count_load)
+    try:
+        with statements(app) as executed:
+            response = client.get(url.format(admin=admin_id))
+    finally:
+        event.remove(Booking, 'load', count_load)
+
+    assert response.status_code == 200
+    assert len(executed) == VIEW_STATEMENTS[url]
+    assert loaded == []
@@ -0,0 +1,96 @@
+from app import car_order, db
+from app.models import Car
+from conftest import statements
+import pytest
+
+
+def _order(app):
+    with app.app_context():
+        return [row[0] for row in db.session.query(Car.id).order_by(Car.display_order, Car.id)]
+
+
+def _updates(executed):
+    return [statement for statement in executed if statement.lstrip().upper().startswith('UPDATE')]
+
+
+def _move(client, car_id, after_id=None, before_id=None):
+    return client.post(f'/manage_cars/move/{car_id}', json={'after_id': after_id, 'before_id': before_id})
+
+
+def test_reorder_is_one_update(app, client):
+    order = list(reversed(_order(app)))
+
+    with statements(app) as executed:
+        response = client.post('/manage_cars/update_order', json=order)
+
+    assert response.status_code == 200
+    assert len(_updates(executed)) == 1
+    assert _order(app) == order
+
+
+@pytest.mark.parametrize('after, before', [(1, 2), (None, 0), (-1, None)], ids=['between', 'first', 'last'])
+def test_move_writes_only_the_moved_car(app, client, after, before):
+    order = _order(app)
+    car_id = order.pop(3)
+    after_id = order[after] if after is not None else None
+    before_id = order[before] if before is not None else None
+
+    with statements(app) as executed:
+        response = _move(client, car_id, after_id, before_id)
+
+    assert response.status_code == 200
+    [update] = _updates(executed)
+    assert 'CASE' not in update
+    expected = list(order)
+    expected.insert(expected.index(before_id) if before_id else len(expected), car_id)
+    assert _order(app) == expected
+
+
+def test_move_between_adjacent_cars_renumbers_in_one_update(app, client):
+    order = _order(app)
+    with app.app_context():
+        # No value left between the first two cars
+        Car.query.get(order[1]).display_order = Car.query.get(order[0]).display_order + 1
+        db.session.commit()
+
+    with statements(app) as executed:
+        response = _move(client, order[4], order[0], order[1])
+
+    assert response.status_code == 200
+    assert len(_updates(executed)) == 1
+    assert _order(app) == [order[0], order[4], order[1], order[2], order[3], order[5]]
+    with app.app_context():
+        positions = [row[0] for row in db.session.query(Car.display_order).order_by(Car.display_order)]
+    assert positions == [index * car_order.ORDER_GAP for index in range(1, 7)]
+
+
+@pytest.mark.parametrize('neighbour', ['after_id', 'before_id'])
+def test_move_next_to_a_car_without_position_renumbers(app, client, neighbour):
+    with app.app_context():
+        unplaced = _order(app)[2]
+        Car.query.get(unplaced).display_order = None
+        db.session.commit()
+    order = _order(app)
+    moved = order[-1]
+
+    response = _move(client, moved, **{neighbour: unplaced})
+
+    assert response.status_code == 200
+    expected = [car_id for car_id in order if car_id != moved]
+    index = expected.index(unplaced)
+    expected.insert(index + 1 if neighbour == 'after_id' else index, moved)
+    assert _order(app) == expected
+    with app.app_context():
+        assert Car.query.filter(Car.display_order.is_(None)).count() == 0
+
+
+@pytest.mark.parametrize('after, before', [('self', None), (None, 'self'), ('other', 'other')])
+def test_move_next_to_itself_is_rejected(app, client, after, before):
+    order = _order(app)
+    car_id, other = order[2], order[0]
+    names = {'self': car_id, 'other': other, None: None}
+
+    response = _move(client, car_id, names[after], names[before])
+
+    assert response.status_code == 400
+    assert _order(app) == order
@@ -0,0 +1,77 @@
+from app import customer_search, db
+from app.models import Customer
+from conftest import statements
+import pytest
+
+
+def _names(customers):
+    return [customer.name for customer in customers]
+
+
+@pytest.mark.parametrize('query', ['3300005', '+269 330 00 05', '00269 3300005', 'nin-5', 'NIN 5'])
+def test_a_complete_phone_or_id_number_is_looked_up_by_equality(app, context, query):
+    with statements(app) as executed:
+        found = customer_search.search(query)
+
+    assert _names(found) == ['Customer 5']
+    # Neither the prefix nor the name search runs
+    assert len(executed) <= 2
+    assert all('customer_fts' not in statement and '>=' not in statement for statement in executed)
+
+
+def test_find_by_identity_returns_each_match(context):
+    by_nin, by_phone = customer_search.find_by_identity(phone='333 00 07', nin_passport_number='nin-3')
+
+    assert (by_nin.name, by_phone) == ('Customer 3', None)
+    by_nin, by_phone = customer_search.find_by_identity(phone='+269 3300007', nin_passport_number='')
+    assert (by_nin, by_phone.name) == (None, 'Customer 7')
+
+
+def test_phone_prefixes_use_a_range_on_sqlite(app, context):
+    with statements(app) as executed:
+        found = customer_search.search('+269 330001')
+
+    assert _names(found) == [f'Customer {i}' for i in range(10, 20)]
+    key_search = next(statement for statement in executed if 'phone_key >=' in statement)
+    assert 'phone_key <' in key_search
+    assert 'LIKE' not in key_search.upper()
+
+
+def test_prefix_range_covers_the_key_itself_and_nothing_past_it(context):
+    customer = Customer(name='Edge', phone='+269 3309999', license_number='LIC-E', nin_passport_number='NIN-E')
+    db.session.add(customer)
+    db.session.commit()
+
+    def matching(prefix):
+        return db.session.query(Customer.id).filter(customer_search._startswith(Customer.phone_key, prefix)).all()
+
+    assert matching('+2693309999') == [(customer.id,)]
+    assert matching('+26933099') == [(customer.id,)]
+    assert matching('+2693310') == []
+
+
+def test_exact_licence_matches_come_first_and_results_are_capped(context):
+    found = customer_search.search('lic-1', limit=3)
+
+    assert _names(found) == ['Customer 1', 'Customer 10', 'Customer 11']
+
+
+def test_names_are_matched_by_word_prefix(context):
+    assert _names(customer_search.search('Customer 7')) == ['Customer 7']
+    assert len(customer_search.search('custom')) == 10
+
+
+def test_short_queries_return_nothing_without_a_query(app, context):
+    with statements(app) as executed:
+        assert customer_search.search(' a ') == []
+
+    assert executed == []
+
+
+def test_the_endpoint_echoes_its_token_and_caps_results(app, client):
+    app.config['CUSTOMER_SEARCH_LIMIT'] = 4
+
+    response = client.get('/search_customer?query=customer&token=42')
+
+    assert response.json['token'] == '42'
+    assert len(response.json['customers']) == 4
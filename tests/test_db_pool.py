@@ -0,0 +1,33 @@
+from app import db_pool
+from sqlalchemy import exc
+import pytest
+import sqlite3
+
+
+def _counts():
+    return db_pool.stats.wait_count, db_pool.stats.timeouts
+
+
+def test_a_full_pool_counts_a_timeout():
+    pool = db_pool.TimedQueuePool(lambda: sqlite3.connect(':memory:'), pool_size=1, max_overflow=0, timeout=0.05)
+    held = pool.connect()
+    waits, timeouts = _counts()
+
+    with pytest.raises(exc.TimeoutError):
+        pool.connect()
+
+    assert _counts() == (waits + 1, timeouts + 1)
+    held.close()
+
+
+def test_a_failed_connect_is_not_a_timeout():
+    def refuse():
+        raise sqlite3.OperationalError('connection refused')
+
+    pool = db_pool.TimedQueuePool(refuse, pool_size=1, max_overflow=0, timeout=0.05)
+    waits, timeouts = _counts()
+
+    with pytest.raises(sqlite3.OperationalError):
+        pool.connect()
+
+    assert _counts() == (waits + 1, timeouts)
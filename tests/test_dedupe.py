@@ -0,0 +1,97 @@
+from app import customer_stats, db, dedupe
+from app.models import Booking, Car, Customer, CustomerStats
+from datetime import datetime
+from sqlalchemy import func, insert
+import pytest
+
+
+def _add_customer(**values):
+    # Legacy rows, written before the keys and the unique key indexes
+    return db.session.execute(insert(Customer.__table__).values(**values)).inserted_primary_key[0]
+
+
+def _book(customer_id, admin_id, cost):
+    db.session.add(Booking(employee_id=admin_id, customer_id=customer_id, car_id=Car.query.first().id,
+                           start_date=datetime(2031, 3, 1), end_date=datetime(2031, 3, 2), total_cost=cost,
+                           deposit_amount=30, status='completed'))
+
+
+@pytest.fixture
+def ali(context, admin_id):
+    """
+    Three records of one customer: the first two share a phone written
+    two ways, the last two an email in different cases. The first has the
+    longest name; the last two tie on name and email length, and the last
+    has an address.
+    """
+    ids = (
+        _add_customer(name='Ali Said', phone='+269 333 44 55', license_number='LIC-A', nin_passport_number='NIN-A'),
+        _add_customer(name='Ali S.', phone='3334455', license_number='LIC-B', nin_passport_number='NIN-B',
+                      email='ali@example.com'),
+        _add_customer(name='Ali M.', phone='+269 3990000', license_number='LIC-C', nin_passport_number='NIN-C',
+                      email='ALI@EXAMPLE.COM', address='Moroni')
+    )
+    for customer_id, cost in zip(ids, (100, 200, 300)):
+        _book(customer_id, admin_id, cost)
+    db.session.commit()
+    return ids
+
+
+def _owners():
+    return dict(db.session.query(Booking.id, Booking.customer_id).all())
+
+
+def test_groups_join_transitively_most_complete_first(ali):
+    first, second, third = ali
+
+    assert dedupe.find_duplicate_groups() == [[first, third, second]]
+
+
+def test_documents_join_customers_too(context):
+    first = _add_customer(name='Nassim', phone='+269 3770001', license_number='LIC-N1', nin_passport_number='ab-12 345')
+    second = _add_customer(name='Nassim A', phone='+269 3770002', license_number='LIC-N2', nin_passport_number='AB12345')
+    db.session.commit()
+
+    assert dedupe.find_duplicate_groups() == [[second, first]]
+
+
+def test_merge_moves_bookings_and_keeps_contact_details(ali):
+    first, second, third = ali
+    moved = [booking_id for booking_id, owner in _owners().items() if owner in (second, third)]
+
+    report = dedupe.merge(dedupe.find_duplicate_groups(), chunk_size=1)
+
+    assert report == {'groups': 1, 'customers_merged': 2, 'bookings_moved': 2}
+    db.session.expire_all()
+    owners = _owners()
+    assert all(owners[booking_id] == first for booking_id in moved)
+    assert db.session.query(Customer.id).filter(Customer.id.in_(ali)).all() == [(first,)]
+    kept = db.session.get(Customer, first)
+    # Missing details come from the secondaries, most complete first
+    assert (kept.email, kept.address) == ('ALI@EXAMPLE.COM', 'Moroni')
+    stats = db.session.get(CustomerStats, first)
+    assert (stats.booking_count, stats.total_spent) == (3, 600)
+    assert db.session.query(CustomerStats).filter(CustomerStats.customer_id.in_([second, third])).count() == 0
+    assert customer_stats.check() == []
+
+
+def test_dry_run_reports_without_writing(ali):
+    owners = _owners()
+    customers = db.session.query(func.count(Customer.id)).scalar()
+
+    report = dedupe.merge(dedupe.find_duplicate_groups(), dry_run=True)
+
+    assert report == {'groups': 1, 'customers_merged': 2, 'bookings_moved': 2}
+    # Read through the same session, so uncommitted writes would show
+    assert _owners() == owners
+    assert db.session.query(func.count(Customer.id)).scalar() == customers
+
+
+def test_dedupe_command(app, ali):
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['customers', 'dedupe', '--dry-run', '--verbose'])
+
+    first, second, third = ali
+    assert result.output == (f'keep {first}, merge {third}, {second}\n'
+                             'Would merge 2 customers in 1 groups, moving 2 bookings.\n')
@@ -0,0 +1,86 @@
+from app import db, reports
+from app.models import Booking, Car, Customer, Maintenance
+from app.periods import month_range
+from conftest import statements
+from datetime import datetime
+import pytest
+
+
+def _book(car, customer, admin_id, start, end, cost, deposit):
+    db.session.add(Booking(employee_id=admin_id, customer_id=customer.id, car_id=car.id, start_date=start,
+                           end_date=end, total_cost=cost, deposit_amount=deposit, status='completed'))
+
+
+@pytest.fixture
+def may_2031(context, admin_id):
+    # Three bookings starting in May 2031, and one either side of it
+    car = Car(model='Report', year=2024, license_plate='REPORT-1', daily_rate=50, category='SUV')
+    db.session.add(car)
+    db.session.flush()
+    customer = Customer.query.first()
+    _book(car, customer, admin_id, datetime(2031, 4, 30), datetime(2031, 5, 2), 150, 45)
+    _book(car, customer, admin_id, datetime(2031, 5, 1), datetime(2031, 5, 1), 100, 30)
+    _book(car, customer, admin_id, datetime(2031, 5, 15, 9, 30), datetime(2031, 5, 17), 200, 60)
+    _book(car, customer, admin_id, datetime(2031, 5, 31, 23, 59), datetime(2031, 6, 2), 300, 90)
+    _book(car, customer, admin_id, datetime(2031, 6, 1), datetime(2031, 6, 3), 400, 120)
+    db.session.add_all([
+        Maintenance(car_id=car.id, employee_id=admin_id, issue_description='Tyres', status='completed', cost=70,
+                    start_date=datetime(2031, 5, 3)),
+        Maintenance(car_id=car.id, employee_id=admin_id, issue_description='Check', status='completed', cost=None,
+                    start_date=datetime(2031, 5, 4))
+    ])
+    db.session.commit()
+    return car
+
+
+def test_booking_totals_count_bookings_starting_in_the_month(may_2031):
+    assert reports.booking_totals(month_range(2031, 5)) == {
+        'total_bookings': 3,
+        'total_revenue': 600.0,
+        'total_deposit': 180.0
+    }
+
+
+def test_booking_totals_of_an_empty_month(context):
+    assert reports.booking_totals(month_range(2040, 1)) == {
+        'total_bookings': 0,
+        'total_revenue': 0.0,
+        'total_deposit': 0.0
+    }
+
+
+def test_maintenance_totals(may_2031):
+    assert reports.maintenance_totals(month_range(2031, 5)) == {'total_records': 2, 'total_cost': 70.0}
+
+
+def test_car_performance(may_2031):
+    performance = reports.car_performance()
+
+    assert performance[may_2031.id] == {
+        'model': 'Report',
+        'license_plate': 'REPORT-1',
+        'total_rentals': 5,
+        'total_income': 1150.0,
+        'total_maintenance_cost': 70.0,
+        'net_revenue': 1080.0
+    }
+    # Every car is listed, with or without bookings, and agrees with its rows
+    assert sorted(performance) == sorted(car.id for car in Car.query.all())
+    for car in Car.query.all():
+        bookings = Booking.query.filter_by(car_id=car.id).all()
+        costs = [record.cost or 0 for record in Maintenance.query.filter_by(car_id=car.id)]
+        assert performance[car.id]['total_rentals'] == len(bookings)
+        assert performance[car.id]['total_income'] == pytest.approx(sum(booking.total_cost for booking in bookings))
+        assert performance[car.id]['total_maintenance_cost'] == pytest.approx(sum(costs))
+
+
+@pytest.mark.parametrize('report', [
+    lambda: reports.booking_totals(month_range(2031, 5)),
+    lambda: reports.maintenance_totals(month_range(2031, 5)),
+    reports.car_performance
+], ids=['booking_totals', 'maintenance_totals', 'car_performance'])
+def test_reports_run_one_statement(app, may_2031, report):
+    with statements(app) as executed:
+        report()
+
+    assert len(executed) == 1
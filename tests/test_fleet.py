@@ -0,0 +1,68 @@
+from app import db
+from app.fleet import fleet_status
+from app.models import Car
+from conftest import statements
+
+
+def _models():
+    return {car['id']: car['model'] for car in fleet_status.snapshot()['cars']}
+
+
+def _rename(car_id, model):
+    db.session.get(Car, car_id).model = model
+    db.session.commit()
+
+
+def test_snapshot_is_served_from_the_cache(app, context):
+    _models()
+
+    with statements(app) as executed:
+        _models()
+
+    assert executed == []
+
+
+def test_invalidate_rebuilds_the_snapshot(context):
+    car_id = Car.query.first().id
+    _models()
+    _rename(car_id, 'Renamed')
+
+    assert _models()[car_id] != 'Renamed'
+    fleet_status.invalidate()
+    assert _models()[car_id] == 'Renamed'
+
+
+def test_writes_invalidate_the_snapshot(app, client):
+    with app.app_context():
+        car_id = Car.query.first().id
+        _models()
+
+    response = client.post(f'/manage_cars/edit/{car_id}', data={
+        'model': 'Edited', 'year': '2024', 'daily_rate': '90', 'category': 'SUV', 'is_available': 'true'
+    })
+
+    assert response.status_code == 200
+    with app.app_context():
+        assert _models()[car_id] == 'Edited'
+
+
+def test_invalidate_during_a_build_is_not_lost(app, context, monkeypatch):
+    car_id = Car.query.first().id
+    build = fleet_status._build
+
+    def build_then_write():
+        # A write commits and invalidates after the rows were read
+        snapshot = build()
+        _rename(car_id, 'Renamed')
+        fleet_status.invalidate()
+        return snapshot
+
+    monkeypatch.setattr(fleet_status, '_build', build_then_write)
+    assert _models()[car_id] != 'Renamed'
+    monkeypatch.undo()
+
+    with statements(app) as executed:
+        models = _models()
+
+    assert executed != []
+    assert models[car_id] == 'Renamed'
@@ -0,0 +1,84 @@
+from app import availability, db
+from app.availability import _segments
+from app.models import AgencyCarStatus, Booking, Car, Maintenance, User
+from datetime import datetime, timedelta
+import pytest
+
+
+def test_segments_run_length_encode_busy_days():
+    assert _segments(list('FBBMMMFFA')) == [['B', 1, 2], ['M', 3, 3], ['A', 8, 1]]
+    assert _segments(list('BBFB')) == [['B', 0, 2], ['B', 3, 1]]
+    assert _segments(list('FFF')) == []
+    assert _segments([]) == []
+
+
+@pytest.fixture
+def car(context, admin_id):
+    # A car with bookings and maintenance around May 2030
+    car = Car(model='Calendar', year=2025, license_plate='CAL-1', daily_rate=50, category='Sedan')
+    db.session.add(car)
+    db.session.flush()
+
+    def book(start, end, status='active'):
+        db.session.add(Booking(employee_id=admin_id, customer_id=1, car_id=car.id, start_date=start,
+                               end_date=end, total_cost=100, deposit_amount=30, status=status))
+
+    book(datetime(2030, 4, 28), datetime(2030, 5, 1))
+    book(datetime(2030, 5, 2, 15), datetime(2030, 5, 4, 9))
+    book(datetime(2030, 5, 6), datetime(2030, 5, 6), status='cancelled')
+    db.session.add_all([
+        Maintenance(car_id=car.id, employee_id=admin_id, issue_description='Brakes', status='in_progress',
+                    start_date=datetime(2030, 5, 4), end_date=datetime(2030, 5, 5)),
+        Maintenance(car_id=car.id, employee_id=admin_id, issue_description='Engine', status='pending',
+                    start_date=datetime(2030, 5, 9)),
+        Maintenance(car_id=car.id, employee_id=admin_id, issue_description='Done', status='completed',
+                    start_date=datetime(2030, 5, 7), end_date=datetime(2030, 5, 7))
+    ])
+    db.session.commit()
+    return car
+
+
+def _segments_of(calendar, car_id):
+    [row] = [row for row in calendar['cars'] if row['id'] == car_id]
+    return row['segments']
+
+
+def test_fleet_calendar_segments(car):
+    calendar = availability.fleet_calendar(datetime(2030, 5, 1), datetime(2030, 5, 10), car_ids=[car.id])
+
+    assert calendar['from'] == '2030-05-01'
+    assert calendar['to'] == '2030-05-10'
+    assert calendar['days'] == 10
+    # May 1st from the booking straddling the window start, May 2nd-3rd
+    # booked, May 4th booked and in maintenance (maintenance wins), May
+    # 5th in maintenance, the cancelled booking and the completed
+    # maintenance free, and the open-ended maintenance to the window end
+    assert _segments_of(calendar, car.id) == [['B', 0, 3], ['M', 3, 2], ['M', 8, 2]]
+
+
+def test_fleet_calendar_marks_agency_statuses_today_only(car):
+    agency = User(email='agency@carrent.com', name='Agency', password='x', employee_id='AG001', role='agency')
+    db.session.add(agency)
+    db.session.flush()
+    db.session.add(AgencyCarStatus(agency_id=agency.id, car_id=car.id, status='unavailable'))
+    db.session.commit()
+    today = datetime.now()
+
+    calendar = availability.fleet_calendar(today - timedelta(days=2), today + timedelta(days=2), car_ids=[car.id])
+
+    assert _segments_of(calendar, car.id) == [['A', 2, 1]]
+
+
+def test_fleet_calendar_lists_every_car(context):
+    calendar = availability.fleet_calendar(datetime(2030, 1, 1), datetime(2030, 12, 31))
+
+    assert calendar['days'] == 365
+    assert [row['id'] for row in calendar['cars']] == [
+        car.id for car in Car.query.order_by(Car.display_order, Car.id)
+    ]
+
+
+@pytest.mark.parametrize('last_day', [datetime(2029, 12, 31), datetime(2031, 1, 2)])
+def test_fleet_calendar_window_is_bounded(context, last_day):
+    with pytest.raises(ValueError):
+        availability.fleet_calendar(datetime(2030, 1, 1), last_day)
@@ -0,0 +1,141 @@
+from app import blobs, db, images
+from app.models import Car, CarImage
+from app.storage import LocalStorage
+import io
+import os
+import pytest
+import time
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'image bytes'
+
+
+@pytest.fixture
+def store(app, context, tmp_path):
+    backend = LocalStorage(str(tmp_path / 'static'), blobs.BLOB_PREFIX, str(tmp_path / 'staging'))
+    app.extensions['image_storage'] = backend
+    return backend
+
+
+def _age(store, path, seconds=2 * images.COLLECT_GRACE):
+    past = time.time() - seconds
+    os.utime(store._path(path), (past, past))
+
+
+def _reference(path):
+    db.session.add(CarImage(car_id=Car.query.first().id, image_path=path))
+    db.session.commit()
+
+
+def test_uploads_are_staged_outside_the_served_folder(store):
+    writer = blobs.BlobWriter('png')
+    writer.write(PNG)
+
+    assert not writer._temp_path.startswith(store.root)
+    assert os.path.dirname(writer._temp_path) == store.staging
+
+    path = writer.commit()
+    assert store.exists(path)
+    assert os.listdir(store.staging) == []
+
+
+def test_reused_blobs_are_touched(store):
+    path = blobs.put_bytes(PNG, 'png')
+    _age(store, path)
+
+    assert blobs.put_bytes(PNG, 'png') == path
+    assert store.modified(path) > time.time() - 60
+
+
+def test_collect_deletes_old_unreferenced_blobs(store):
+    path = blobs.put_bytes(PNG, 'png')
+    _age(store, path)
+
+    assert images.collect([path]) == 1
+    assert not store.exists(path)
+
+
+def test_collect_keeps_referenced_blobs(store):
+    path = blobs.put_bytes(PNG, 'png')
+    _age(store, path)
+    _reference(path)
+
+    assert images.collect([path]) == 0
+    assert store.exists(path)
+
+
+def test_collect_keeps_a_blob_an_upload_just_reused(store):
+    # An image is deleted while an identical upload, not yet committed,
+    # finds its blob already stored
+    path = blobs.put_bytes(PNG, 'png')
+    _age(store, path)
+    assert blobs.put_bytes(PNG, 'png') == path
+
+    assert images.collect([path]) == 0
+    assert store.exists(path)
+
+    # The upload commits; its image keeps the blob for good
+    _reference(path)
+    _age(store, path)
+    assert images.collect([path]) == 0
+    assert store.exists(path)
+
+
+def test_collect_command_sweeps_what_collect_kept(app, store):
+    kept = blobs.put_bytes(PNG, 'png')
+    unused = blobs.put_bytes(PNG + b'2', 'png')
+    _reference(kept)
+    assert images.collect([unused]) == 0
+
+    _age(store, unused)
+    result = app.test_cli_runner().invoke(args=['images', 'collect'])
+
+    assert 'Deleted 1 unused images.' in result.output
+    assert store.exists(kept)
+    assert not store.exists(unused)
+
+
+class _CountingStream(io.BytesIO):
+    """A request body that counts the bytes the app reads from it."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.consumed = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.consumed += len(chunk)
+        return chunk
+
+
+def _multipart(boundary, files):
+    body = b''
+    for filename, data in files:
+        body += (f'--{boundary}\r\nContent-Disposition: form-data; name="images"; filename="{filename}"\r\n'
+                 f'Content-Type: image/png\r\n\r\n').encode() + data + b'\r\n'
+    return body + f'--{boundary}--\r\n'.encode()
+
+
+def test_an_oversized_upload_is_stopped_mid_stream_without_leftovers(app, store, client):
+    app.config['MAX_IMAGE_SIZE'] = 4 * blobs.CHUNK_SIZE
+    car = Car.query.first()
+    images_before = CarImage.query.count()
+    small = PNG + b'small'
+    body = _multipart('boundary', [('small.png', small), ('huge.png', PNG + b'x' * (64 * blobs.CHUNK_SIZE))])
+    stream = _CountingStream(body)
+
+    response = client.post(f'/manage_cars/upload_images/{car.id}', input_stream=stream,
+                           content_type='multipart/form-data; boundary=boundary', content_length=len(body))
+
+    assert response.status_code == 413
+    assert response.get_json()['error'].startswith('Upload too large: huge.png is larger than')
+    # Stopped a chunk or so past the cap, not at the end of the body
+    assert stream.consumed <= 6 * blobs.CHUNK_SIZE < len(body)
+    # Nothing staged is left behind, and only the small file got a blob
+    assert os.listdir(store.staging) == []
+    small_path = blobs.put_bytes(small, 'png')
+    assert list(store.keys(blobs.BLOB_PREFIX)) == [small_path]
+    db.session.expire_all()
+    assert CarImage.query.count() == images_before
+    # which nothing references: collect() sweeps it once the grace is over
+    _age(store, small_path)
+    assert images.collect([small_path]) == 1
@@ -0,0 +1,27 @@
+from app import db
+import pytest
+
+
+def _leading_columns(table):
+    """
+    Column names of every index on the table, unique constraints and the
+    primary key included, as tuples in index order.
+    """
+    indexes = [tuple(column.name for column in index.columns) for index in table.indexes]
+    indexes += [tuple(column.name for column in constraint.columns)
+                for constraint in table.constraints
+                if isinstance(constraint, (db.UniqueConstraint, db.PrimaryKeyConstraint))]
+    indexes += [(column.name,) for column in table.columns if column.index or column.unique]
+    return indexes
+
+
+@pytest.mark.parametrize('table', sorted(db.metadata.tables.values(), key=lambda table: table.name), ids=lambda table: table.name)
+def test_foreign_keys_lead_an_index(table):
+    indexes = _leading_columns(table)
+    unindexed = []
+    for constraint in table.foreign_key_constraints:
+        columns = tuple(column.name for column in constraint.columns)
+        if not any(index[:len(columns)] == columns for index in indexes):
+            unindexed.append(', '.join(columns))
+
+    assert not unindexed, f'{table.name}: no index starts with {unindexed}'
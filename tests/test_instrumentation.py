@@ -0,0 +1,82 @@
+from app.instrumentation import Recorder, RequestTiming, percentile
+import os
+import pytest
+
+
+@pytest.mark.parametrize('values, fraction, expected', [
+    (range(1, 101), 0.95, 95),
+    (range(1, 101), 0.99, 99),
+    (range(1, 101), 0.50, 50),
+    (range(1, 11), 0.5, 5),
+    (range(1, 11), 0.95, 10),
+    ([7], 0.5, 7),
+    (range(1, 11), 0, 1),
+    (range(1, 11), 1, 10),
+    ([], 0.5, None)
+])
+def test_percentile_is_the_nearest_rank(values, fraction, expected):
+    assert percentile(values, fraction) == expected
+
+
+def _timing(sql_count=0, sql_seconds=0.0, rows=0, render_seconds=0.0):
+    timing = RequestTiming()
+    timing.sql_count, timing.sql_seconds, timing.rows, timing.render_seconds = (
+        sql_count, sql_seconds, rows, render_seconds
+    )
+    return timing
+
+
+@pytest.fixture
+def recorder():
+    """
+    100 requests to main.dashboard, taking 1 to 100 ms and running 1 to
+    100 statements, and 2 to main.home under the 5 ms bucket.
+    """
+    recorder = Recorder()
+    for i in range(1, 101):
+        recorder.record('main.dashboard', _timing(i, i / 10000, 2 * i, 0.0005), i / 1000)
+    for _ in range(2):
+        recorder.record('main.home', _timing(1, 0.001, 3), 0.002)
+    return recorder
+
+
+def test_summary_is_slowest_first_with_percentiles_and_averages(recorder):
+    dashboard, home = recorder.summary()
+
+    assert dashboard['endpoint'] == 'main.dashboard'
+    assert (dashboard['count'], dashboard['window']) == (100, 100)
+    assert (dashboard['p50_ms'], dashboard['p95_ms'], dashboard['p99_ms']) == pytest.approx((50, 95, 99))
+    assert (dashboard['sql_avg'], dashboard['sql_p95']) == (50.5, 95)
+    assert dashboard['sql_ms_avg'] == pytest.approx(5.05)
+    assert dashboard['rows_avg'] == 101
+    assert dashboard['render_ms_avg'] == pytest.approx(0.5)
+    assert home['endpoint'] == 'main.home'
+    assert (home['count'], home['p95_ms'], home['sql_avg'], home['rows_avg']) == (2, pytest.approx(2), 1, 3)
+
+
+def test_reset_forgets_every_endpoint(recorder):
+    recorder.reset()
+
+    assert recorder.summary() == []
+
+
+def test_prometheus_text(recorder):
+    lines = recorder.prometheus_text(0.5).splitlines()
+
+    labels = f'endpoint="main.dashboard",pid="{os.getpid()}"'
+    assert f'http_requests_sample_rate{{pid="{os.getpid()}"}} 0.5' in lines
+    assert '# TYPE http_request_duration_seconds histogram' in lines
+    # Cumulative buckets: requests at or under each bound
+    for bound, count in (('0.005', 5), ('0.01', 10), ('0.025', 25), ('0.05', 50), ('0.1', 100), ('10.0', 100)):
+        assert f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {count}' in lines
+    assert f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} 100' in lines
+    assert f'http_request_duration_seconds_sum{{{labels}}} 5.050000' in lines
+    assert f'http_request_duration_seconds_count{{{labels}}} 100' in lines
+    assert f'http_request_sql_statements_total{{{labels}}} 5050' in lines
+    assert f'http_request_sql_seconds_total{{{labels}}} 0.505000' in lines
+    assert f'http_request_rows_total{{{labels}}} 10100' in lines
+    assert f'http_request_render_seconds_total{{{labels}}} 0.050000' in lines
+    # Endpoints in name order, each metric declared once
+    home = f'http_request_duration_seconds_count{{endpoint="main.home",pid="{os.getpid()}"}} 2'
+    assert lines.index(f'http_request_duration_seconds_count{{{labels}}} 100') < lines.index(home)
+    assert sum(line == '# TYPE http_request_rows_total counter' for line in lines) == 1
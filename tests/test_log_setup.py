@@ -0,0 +1,63 @@
+from app import log_setup
+import logging
+import os
+import pytest
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    """
+    Records of the root logger queued for a file under tmp_path, with the
+    logging configuration of the session put back afterwards.
+    """
+    root = logging.getLogger()
+    handlers, level = root.handlers[:], root.level
+    path = tmp_path / 'app.log'
+
+    class App:
+        config = {
+            'LOGGING_CONFIG': {
+                'version': 1,
+                'disable_existing_loggers': False,
+                'handlers': {'file': {'class': 'logging.FileHandler', 'filename': str(path)}},
+                'root': {'level': 'INFO', 'handlers': ['file']}
+            },
+            'LOG_QUEUE': True
+        }
+
+    log_setup.configure(App)
+    yield path
+    log_setup._stop()
+    for handler in root.handlers:
+        handler.close()
+    root.handlers, root.level = handlers, level
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork()')
+def test_a_forked_worker_writes_through_new_listeners(log_file):
+    parent_listeners = list(log_setup._pipeline.listeners)
+    logging.getLogger().info('from the parent')
+
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # A gunicorn --preload worker
+        try:
+            listeners = log_setup._pipeline.listeners
+            fresh = (len(listeners) == len(parent_listeners)
+                     and not any(listener in parent_listeners for listener in listeners))
+            logging.getLogger().info('from the child')
+            log_setup._stop()
+            os.write(write, b'1' if fresh else b'0')
+        finally:
+            os._exit(0)
+    os.close(write)
+    fresh = os.read(read, 1)
+    os.close(read)
+    os.waitpid(pid, 0)
+
+    assert fresh == b'1'
+    # The parent's listener carries on too
+    logging.getLogger().info('from the parent again')
+    log_setup._stop()
+    assert log_file.read_text().splitlines() == ['from the parent', 'from the child', 'from the parent again']
@@ -0,0 +1,135 @@
+from alembic.script import ScriptDirectory
+from app import create_app, db
+from app.models import Booking, Car, Customer, CustomerStats, User
+from datetime import datetime
+from config import TestingConfig
+from sqlalchemy import inspect, insert, text
+import flask_migrate
+import logging.config
+import os
+import pytest
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+HEAD = ScriptDirectory(MIGRATIONS).get_current_head()
+
+# The revision before the customer identity keys were made unique
+BEFORE_UNIQUE_KEYS = 'b6f14c2e9d73'
+
+# What the later revisions change, undone on a schema from create_all()
+REWIND_STATEMENTS = (
+    'DROP TABLE customer_stats',
+    'DROP INDEX ix_customer_phone_key',
+    'CREATE INDEX ix_customer_phone_key ON customer (phone_key)',
+    'DROP INDEX ix_customer_nin_key',
+    'CREATE INDEX ix_customer_nin_key ON customer (nin_key)',
+    'ALTER TABLE car_image DROP COLUMN variants',
+    'DROP INDEX ix_car_display_order',
+    'DROP INDEX ix_booking_car_id_end_date_start_date',
+    'CREATE INDEX ix_booking_car_id_start_date_end_date ON booking (car_id, start_date, end_date)'
+)
+
+
+@pytest.fixture
+def legacy(tmp_path, monkeypatch):
+    """
+    An app context on a database file at revision BEFORE_UNIQUE_KEYS,
+    without customers.
+    """
+    # migrations/env.py would replace the logging configuration of the
+    # whole test session
+    monkeypatch.setattr(logging.config, 'fileConfig', lambda *args, **kwargs: None)
+
+    class LegacyConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'legacy.db'}"
+
+    app = create_app(LegacyConfig)
+    with app.app_context():
+        db.create_all()
+        for statement in REWIND_STATEMENTS:
+            db.session.execute(text(statement))
+        db.session.commit()
+        flask_migrate.stamp(MIGRATIONS, revision=BEFORE_UNIQUE_KEYS)
+        yield app
+        db.session.remove()
+
+
+def add_customer(name, phone, nin):
+    # Through Core: the ORM hooks write the customer_stats table, which
+    # does not exist yet at this revision
+    db.session.execute(insert(Customer.__table__).values(
+        name=name, phone=phone, license_number=f'LIC-{nin}', nin_passport_number=nin
+    ))
+    db.session.commit()
+
+
+def add_booking(customer_phone):
+    # Through Core too, as the booking hooks keep customer_stats up
+    user_id = db.session.execute(insert(User.__table__).values(
+        email='clerk@carrent.com', name='Clerk', password='x', employee_id='EMP-M', role='admin'
+    )).inserted_primary_key[0]
+    car_id = db.session.execute(insert(Car.__table__).values(
+        model='Legacy', year=2020, license_plate='LEGACY-1', daily_rate=50, category='SUV'
+    )).inserted_primary_key[0]
+    customer_id = db.session.execute(text('SELECT id FROM customer WHERE phone = :phone'),
+                                     {'phone': customer_phone}).scalar()
+    db.session.execute(insert(Booking.__table__).values(
+        employee_id=user_id, customer_id=customer_id, car_id=car_id, start_date=datetime(2031, 1, 1),
+        end_date=datetime(2031, 1, 3), total_cost=150, deposit_amount=30, status='completed'
+    ))
+    db.session.commit()
+
+
+def revision():
+    return db.session.execute(text('SELECT version_num FROM alembic_version')).scalar()
+
+
+def unique_indexes(table):
+    return {index['name'] for index in inspect(db.engine).get_indexes(table) if index['unique']}
+
+
+def test_upgrade_backfills_unique_identity_keys(legacy):
+    add_customer('Ali', '+269 333 44 55', 'nin-1')
+    add_customer('Said', '777 88 99', 'NIN 2')
+
+    flask_migrate.upgrade(MIGRATIONS)
+
+    assert revision() == HEAD
+    keys = db.session.execute(text('SELECT phone_key, nin_key FROM customer ORDER BY id')).all()
+    assert keys == [('+2693334455', 'NIN1'), ('+2697778899', 'NIN2')]
+    assert {'ix_customer_phone_key', 'ix_customer_nin_key'} <= unique_indexes('customer')
+
+
+def test_upgrade_stops_at_duplicate_identity_keys(legacy, caplog):
+    add_customer('Ali Said', '+269 333 44 55', 'NIN-1')
+    add_customer('Ali', '3334455', 'NIN-2')
+
+    with pytest.raises(SystemExit):
+        flask_migrate.upgrade(MIGRATIONS)
+
+    assert ('1 phone_key values are shared by several customers. '
+            'Run "flask customers dedupe" and upgrade again.') in caplog.text
+    db.session.rollback()
+    assert revision() == BEFORE_UNIQUE_KEYS
+    assert 'ix_customer_phone_key' not in unique_indexes('customer')
+
+
+def test_following_the_upgrade_error_merges_and_upgrades(legacy, caplog):
+    add_customer('Ali Said', '+269 333 44 55', 'NIN-1')
+    add_customer('Ali', '3334455', 'NIN-2')
+    add_booking('3334455')
+    with pytest.raises(SystemExit):
+        flask_migrate.upgrade(MIGRATIONS)
+    db.session.rollback()
+
+    # 'Run "flask customers dedupe" and upgrade again.'
+    result = legacy.test_cli_runner().invoke(args=['customers', 'dedupe'])
+    assert result.exit_code == 0, result.output
+    assert result.output == 'Merged 1 customers in 1 groups, moving 1 bookings.\n'
+    flask_migrate.upgrade(MIGRATIONS)
+
+    assert revision() == HEAD
+    customers = db.session.execute(text('SELECT id, name, phone_key FROM customer')).all()
+    assert [(name, phone_key) for _, name, phone_key in customers] == [('Ali Said', '+2693334455')]
+    # The stats table, created after the merge, counts the moved booking
+    stats = db.session.get(CustomerStats, customers[0].id)
+    assert (stats.booking_count, stats.total_spent) == (1, 150)
@@ -0,0 +1,51 @@
+from app.normalization import normalize_document, normalize_email, normalize_phone
+import pytest
+
+
+@pytest.mark.parametrize('value', [
+    '+269 333 44 55', '+269-333-4455', '00269 333 44 55', '269 333 44 55', '2693334455', '333 44 55', '3334455',
+    '(333) 44-55', ' 03334455 '
+])
+def test_phone_numbers_written_every_way_agree(value):
+    assert normalize_phone(value) == '+2693334455'
+
+
+@pytest.mark.parametrize('value, expected', [
+    # Other countries keep their own code
+    ('+33 6 12 34 56 78', '+33612345678'),
+    ('0033 6 12 34 56 78', '+33612345678'),
+    # Too short to carry the country code already
+    ('269 12', '+26926912'),
+    ('', None),
+    (None, None),
+    ('n/a', None)
+])
+def test_phone_edge_cases(value, expected):
+    assert normalize_phone(value) == expected
+
+
+def test_phone_default_country_code_can_be_changed():
+    assert normalize_phone('612 34 56 78', country_code='33') == '+33612345678'
+
+
+@pytest.mark.parametrize('value, expected', [
+    ('ab-12 345', 'AB12345'),
+    (' AB12345 ', 'AB12345'),
+    ('nin/000.123', 'NIN000123'),
+    ('é-12', '12'),
+    ('--', None),
+    ('', None),
+    (None, None)
+])
+def test_documents_keep_upper_cased_letters_and_digits(value, expected):
+    assert normalize_document(value) == expected
+
+
+@pytest.mark.parametrize('value, expected', [
+    (' Ali@Example.COM ', 'ali@example.com'),
+    ('ali@example.com', 'ali@example.com'),
+    ('   ', None),
+    (None, None)
+])
+def test_emails_are_trimmed_and_lower_cased(value, expected):
+    assert normalize_email(value) == expected
@@ -0,0 +1,47 @@
+from app import db
+from app.models import Booking, Car
+from app.nplusone import NPlusOneError
+from sqlalchemy.orm import joinedload
+import pytest
+
+
+@pytest.fixture
+def routes(app):
+    # Throwaway views doing what real ones might
+    def lazy():
+        # Loads each booking's car with a query of its own
+        return ', '.join(booking.car.model for booking in Booking.query.limit(20).all())
+
+    def eager():
+        return ', '.join(booking.car.model for booking in Booking.query.options(joinedload(Booking.car)).limit(20).all())
+
+    def writes():
+        db.session.execute(db.update(Car).where(Car.id == 1).values(daily_rate=Car.daily_rate + 1))
+        db.session.execute(db.delete(Booking).where(Booking.id == -1))
+        db.session.execute(db.text('SELECT 1'))
+        db.session.commit()
+        return 'ok'
+
+    for view in (lazy, eager, writes):
+        app.add_url_rule(f'/test/{view.__name__}', view.__name__, view, methods=['GET', 'POST'])
+    return app.test_client()
+
+
+def test_lazy_loads_in_a_loop_raise(routes):
+    with pytest.raises(NPlusOneError, match='Booking.car loaded lazily'):
+        routes.get('/test/lazy')
+
+
+def test_eager_loads_pass(routes):
+    assert routes.get('/test/eager').status_code == 200
+
+
+def test_writes_and_text_statements_pass(routes):
+    assert routes.post('/test/writes').status_code == 200
+
+
+def test_without_raise_the_request_is_logged(app, routes, caplog):
+    app.config['NPLUSONE_RAISE'] = False
+
+    assert routes.get('/test/lazy').status_code == 200
+    assert 'Possible N+1 queries in lazy' in caplog.text
@@ -0,0 +1,45 @@
+from app import db
+from app.models import Booking, Expense, Income
+from app.periods import month_range, quarter_range, within
+from datetime import datetime
+import pytest
+
+
+def test_month_range_covers_the_month():
+    assert month_range(2026, 2) == (datetime(2026, 2, 1), datetime(2026, 3, 1))
+    assert month_range(2026, 12) == (datetime(2026, 12, 1), datetime(2027, 1, 1))
+
+
+@pytest.mark.parametrize('month', [0, 13, -1])
+def test_month_range_rejects_invalid_months(month):
+    with pytest.raises(ValueError):
+        month_range(2026, month)
+
+
+def test_quarter_range_covers_three_months():
+    assert quarter_range(2026, 4) == (datetime(2026, 10, 1), datetime(2027, 1, 1))
+    with pytest.raises(ValueError):
+        quarter_range(2026, 5)
+
+
+@pytest.mark.parametrize('endpoint', ['/financial_summary', '/expense_management', '/income_management'])
+@pytest.mark.parametrize('query', ['month=13', 'month=0', 'year=0', 'year=10000&month=12'])
+def test_invalid_month_falls_back_to_the_current_one(client, endpoint, query):
+    response = client.get(f'{endpoint}?{query}')
+
+    assert response.status_code == 200
+    assert b'Invalid month selected' in response.data
+
+
+@pytest.mark.parametrize('model, column, index', [
+    (Booking, Booking.start_date, 'ix_booking_start_date'),
+    (Income, Income.date, 'ix_income_date_category'),
+    (Expense, Expense.date, 'ix_expense_date_category')
+])
+def test_month_filter_uses_the_date_index(context, model, column, index):
+    query = db.select(model).where(within(column, month_range(2026, 3)))
+    sql = str(query.compile(db.engine, compile_kwargs={'literal_binds': True}))
+
+    plan = ' '.join(row[-1] for row in db.session.execute(db.text(f'EXPLAIN QUERY PLAN {sql}')))
+
+    assert f'USING INDEX {index}' in plan
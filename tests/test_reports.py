@@ -0,0 +1,51 @@
+from app import reports
+from app.models import Customer
+from datetime import datetime
+import base64
+import pytest
+
+
+def _cursor(payload):
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def test_cursor_round_trip():
+    cursor = reports.encode_cursor(datetime(2026, 3, 4, 5, 6), 42)
+
+    assert reports.decode_cursor(cursor) == ('2026-03-04T05:06:00', 42)
+
+
+@pytest.mark.parametrize('cursor', [
+    'not base64!', _cursor('not json'), _cursor('[1, 2, 3]'), _cursor('{"a": 1}'), _cursor('7'),
+    _cursor('["name", "x"]'), _cursor('[{"a": 1}, 3]'), _cursor('["name"')
+])
+def test_invalid_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError):
+        reports.decode_cursor(cursor)
+
+
+@pytest.mark.parametrize('sort', ['name', 'spent', 'recent'])
+def test_client_pages_cover_every_client_once(context, sort):
+    seen = []
+    cursor = None
+    while True:
+        rows, cursor = reports.client_stats_page(sort=sort, cursor=cursor, per_page=7)
+        seen += [row['client'].id for row in rows]
+        if cursor is None:
+            break
+
+    assert sorted(seen) == sorted(customer.id for customer in Customer.query.all())
+
+
+@pytest.mark.parametrize('sort, cursor', [
+    ('name', 'garbage'),
+    ('name', _cursor('[1, 2]')),
+    ('spent', reports.encode_cursor('Customer 3', 4)),
+    ('recent', reports.encode_cursor('yesterday', 4)),
+    ('recent', reports.encode_cursor(12.5, 4))
+])
+def test_manage_clients_falls_back_to_the_first_page(client, sort, cursor):
+    response = client.get('/manage_clients', query_string={'sort': sort, 'cursor': cursor})
+
+    assert response.status_code == 200
+    assert b'Invalid page link' in response.data
@@ -0,0 +1,234 @@
+from app import blobs, db
+from app.models import AgencyVisibleCar, Booking, Car, CarImage, Customer, Expense, Income, Maintenance, User
+from conftest import login, statements
+from datetime import timedelta
+from PIL import Image
+import io
+import os
+import pytest
+import shutil
+
+# Every route, GET and POST, against the seeded database. N+1 detection
+# raises in tests (see TestingConfig), so a view loading a relationship
+# per row fails here. Each request must answer with its status and run
+# exactly its number of SQL statements, the logged-in user's lookup
+# included; a change that moves a count should say why in its diff.
+#
+# (endpoint, method, URL, request keyword arguments, user, status, statements)
+# URLs are formatted with the ids of the routes fixture.
+ROUTES = [
+    ('main.home', 'GET', '/', {}, 'admin', 200, 2),
+    ('main.dashboard', 'GET', '/dashboard', {}, 'admin', 200, 6),
+    ('main.api_bookings', 'GET', '/api/bookings', {}, 'admin', 200, 3),
+    ('main.api_bookings', 'GET', '/api/bookings?status=active&customer=Customer&from=2020-01-01&to=2099-12-31', {}, 'admin', 200, 3),
+    ('main.car_details', 'GET', '/car/{car}', {}, 'admin', 200, 2),
+    ('main.book_car', 'GET', '/book/{spare_car}', {}, 'admin', 200, 3),
+    ('main.book_car', 'POST', '/book/{spare_car}', {'data': {
+        'customer_name': 'Route Customer', 'customer_phone': '+269 3499999', 'license_number': 'LIC-R',
+        'nin_passport_number': 'NIN-R', 'nationality': 'Comorian', 'start_date': '2031-01-01', 'end_date': '2031-01-03'
+    }}, 'admin', 302, 13),
+    ('main.search_customer', 'GET', '/search_customer?query=Customer&token=1', {}, 'admin', 200, 4),
+    ('main.api_availability', 'GET', '/api/availability?start=2031-01-01&end=2031-01-05', {}, 'admin', 200, 2),
+    ('main.api_fleet_calendar', 'GET', '/api/fleet_calendar?from=2030-01-01&to=2030-01-31', {}, 'admin', 200, 4),
+    ('main.fleet_calendar', 'GET', '/fleet_calendar', {}, 'admin', 200, 1),
+    ('main.customer_history', 'GET', '/customer_history/{customer}', {}, 'admin', 200, 4),
+    ('main.manage_cars', 'GET', '/manage_cars', {}, 'admin', 200, 3),
+    ('main.manage_cars', 'POST', '/manage_cars', {'data': {
+        'model': 'Route Car', 'year': '2025', 'license_plate': 'ROUTE-1', 'daily_rate': '70', 'category': 'SUV',
+        'description': '', 'features': '', 'images': 'png'
+    }}, 'admin', 302, 10),
+    ('main.upload_car_images', 'POST', '/manage_cars/upload_images/{spare_car}', {'data': {'images': 'png'}}, 'admin', 200, 8),
+    ('main.delete_car_image', 'DELETE', '/manage_cars/delete_image/{image}', {}, 'admin', 200, 6),
+    ('main.edit_car', 'POST', '/manage_cars/edit/{car}', {'data': {
+        'model': 'Renamed', 'year': '2024', 'daily_rate': '120', 'category': 'Sedan', 'is_available': 'true'
+    }}, 'admin', 200, 4),
+    ('main.delete_car', 'POST', '/manage_cars/delete/{spare_car}', {}, 'admin', 200, 11),
+    ('main.get_car_images', 'GET', '/manage_cars/get_images/{spare_car}', {}, 'admin', 200, 3),
+    ('main.metrics', 'GET', '/metrics', {}, 'admin', 200, 1),
+    ('main.db_pool_metrics', 'GET', '/metrics/db_pool', {}, 'admin', 200, 1),
+    ('main.performance', 'GET', '/admin/performance', {}, 'admin', 200, 1),
+    ('main.performance', 'POST', '/admin/performance', {}, 'admin', 302, 1),
+    ('main.media', 'GET', '/media/{media}', {}, 'admin', 200, 0),
+    ('main.set_main_image', 'POST', '/manage_cars/set_main_image/{image}', {}, 'admin', 200, 6),
+    ('main.update_return_date', 'POST', '/update_return_date', {'data': {
+        'booking_id': '{booking}', 'new_end_date': '{booking_new_end}'
+    }}, 'admin', 200, 11),
+    ('main.delete_booking', 'POST', '/delete_booking/{booking}', {}, 'admin', 200, 10),
+    ('main.maintenance', 'GET', '/maintenance', {}, 'admin', 200, 3),
+    ('main.get_maintenance', 'GET', '/get_maintenance/{maintenance}', {}, 'admin', 200, 2),
+    ('main.add_maintenance', 'POST', '/add_maintenance', {'data': {
+        'car_id': '{spare_car}', 'status': 'pending', 'start_date': '2031-02-01', 'issue_description': 'Brakes', 'cost': '50'
+    }}, 'admin', 200, 4),
+    ('main.update_maintenance', 'POST', '/update_maintenance/{maintenance}', {'data': {
+        'car_id': '{car}', 'status': 'completed', 'start_date': '2030-02-01', 'end_date': '2030-02-02',
+        'issue_description': 'Tyres', 'cost': '80'
+    }}, 'admin', 200, 4),
+    ('main.delete_maintenance', 'POST', '/delete_maintenance/{maintenance}', {}, 'admin', 200, 3),
+    ('main.financial_summary', 'GET', '/financial_summary', {}, 'admin', 200, 5),
+    ('main.api_utilisation', 'GET', '/api/utilisation?by=category', {}, 'admin', 200, 4),
+    ('main.utilisation', 'GET', '/utilisation', {}, 'admin', 200, 4),
+    ('main.expense_management', 'GET', '/expense_management', {}, 'admin', 200, 3),
+    ('main.view_income_management', 'GET', '/income_management', {}, 'admin', 200, 3),
+    ('main.add_income', 'POST', '/add_income', {'data': {
+        'category': 'Car Order', 'subcategory': 'Deposit', 'amount': '40', 'description': 'Deposit'
+    }}, 'admin', 201, 5),
+    ('main.get_income', 'GET', '/get_income/{income}', {}, 'admin', 200, 2),
+    ('main.update_income', 'POST', '/update_income/{income}', {'data': {'amount': '45', 'category': 'Car Order'}}, 'admin', 200, 8),
+    ('main.delete_income', 'POST', '/delete_income/{income}', {}, 'admin', 200, 5),
+    ('main.add_expense', 'POST', '/add_expense', {'data': {
+        'category': 'Bills', 'subcategory': 'Water', 'amount': '20', 'description': 'Water bill'
+    }}, 'admin', 201, 5),
+    ('main.get_expense', 'GET', '/get_expense/{expense}', {}, 'admin', 200, 2),
+    ('main.update_expense', 'POST', '/update_expense/{expense}', {'data': {'amount': '25'}}, 'admin', 200, 8),
+    ('main.delete_expense', 'POST', '/delete_expense/{expense}', {}, 'admin', 200, 5),
+    ('main.add_employee', 'GET', '/add_employee', {}, 'admin', 200, 1),
+    ('main.add_employee', 'POST', '/add_employee', {'data': {
+        'name': 'New Employee', 'email': 'new@carrent.com', 'employee_id': 'EMP100', 'password': 'a-password',
+        'role': 'secretary', 'salary': '1000', 'phone_number': '+269 3200000', 'is_active': 'on'
+    }}, 'admin', 302, 3),
+    ('main.manage_employees', 'GET', '/manage_employees', {}, 'admin', 200, 6),
+    ('main.manage_employees', 'POST', '/manage_employees', {'data': {
+        'action': 'update_employee', 'id': '{spare_employee}', 'name': 'Renamed', 'email': 'spare@carrent.com',
+        'employee_id': 'EMP009', 'role': 'manager', 'salary': '1200'
+    }}, 'admin', 302, 3),
+    ('main.delete_employee', 'POST', '/delete_employee/{spare_employee}', {'headers': {'X-Requested-With': 'XMLHttpRequest'}}, 'admin', 200, 9),
+    ('main.manage_clients', 'GET', '/manage_clients', {}, 'admin', 200, 4),
+    ('main.manage_clients', 'GET', '/manage_clients?sort=recent', {}, 'admin', 200, 5),
+    ('main.manage_clients', 'POST', '/manage_clients', {'data': {'action': 'delete', 'client_id': '{spare_customer}'}}, 'admin', 302, 7),
+    ('main.get_client_details', 'GET', '/get_client_details/{customer}', {}, 'admin', 200, 4),
+    ('main.update_car_order', 'POST', '/manage_cars/update_order', {'json': '{car_order}'}, 'admin', 200, 2),
+    ('main.move_car', 'POST', '/manage_cars/move/{spare_car}', {'json': {'after_id': None, 'before_id': '{car}'}}, 'admin', 200, 3),
+    ('main.add_agency', 'POST', '/add_agency', {'data': {
+        'name': 'New Agency', 'email': 'new-agency@carrent.com', 'employee_id': 'AG100', 'password': 'a-password',
+        'confirm_password': 'a-password', 'visible_cars': ['{car}', '{spare_car}']
+    }}, 'admin', 201, 7),
+    ('main.edit_agency', 'POST', '/edit_agency/{agency}', {'data': {
+        'name': 'Renamed Agency', 'email': 'agency@carrent.com', 'employee_id': 'AG001', 'status': 'active',
+        'visible_cars': ['{car}']
+    }}, 'admin', 200, 10),
+    ('main.delete_agency', 'POST', '/delete_agency/{agency}', {}, 'admin', 200, 11),
+    ('main.update_agency_car_status', 'POST', '/agency/update_car_status', {'data': {
+        'car_id': '{spare_car}', 'status': 'booked'
+    }}, 'agency', 200, 6),
+    ('main.toggle_user_status', 'POST', '/toggle_user_status', {'data': {'user_id': '{spare_employee}'}}, 'admin', 200, 4),
+    ('main.activate_user', 'POST', '/activate_user', {'data': {'user_id': '{spare_employee}'}}, 'admin', 302, 4),
+    ('main.edit_employee', 'POST', '/edit_employee/{spare_employee}', {'data': {
+        'name': 'Edited', 'email': 'spare@carrent.com', 'employee_id': 'EMP009', 'role': 'secretary', 'salary': '900'
+    }}, 'admin', 200, 6),
+    ('main.get_agency_cars', 'GET', '/get_agency_cars/{agency}', {}, 'admin', 200, 4),
+    ('main.get_agencies', 'GET', '/get_agencies', {}, 'admin', 200, 2),
+    ('main.favicon', 'GET', '/favicon.ico', {}, 'admin', 200, 0),
+    ('main.bank_statement', 'GET', '/bank_statement', {}, 'admin', 200, 3),
+    ('main.home', 'GET', '/', {}, 'agency', 200, 3),
+    ('auth.login', 'GET', '/login', {}, None, 200, 0),
+    ('auth.login', 'POST', '/login', {'data': {'email': 'admin@carrent.com', 'password': 'admin-password'}}, None, 302, 1),
+    ('auth.register', 'GET', '/register', {}, None, 200, 0),
+    ('auth.register', 'POST', '/register', {'data': {
+        'email': 'registered@carrent.com', 'name': 'Registered', 'password': 'a-password', 'employee_id': 'EMP200'
+    }}, None, 302, 5),
+    ('auth.logout', 'GET', '/logout', {}, 'admin', 302, 1),
+    ('static', 'GET', '/static/css/style.css', {}, None, 200, 0)
+]
+
+
+def _png():
+    picture = io.BytesIO()
+    Image.new('RGB', (40, 30), 'red').save(picture, 'PNG')
+    return picture.getvalue()
+
+
+@pytest.fixture
+def routes(app, tmp_path):
+    """
+    Ids for the ROUTES URLs and payloads, and the id of each user, with
+    images stored under tmp_path.
+    """
+    # Uploads and their staging stay out of the source tree
+    shutil.copytree(os.path.join(app.static_folder, 'css'), tmp_path / 'static' / 'css')
+    app.static_folder = str(tmp_path / 'static')
+    app.instance_path = str(tmp_path / 'instance')
+
+    with app.app_context():
+        booking = Booking.query.order_by(Booking.id).first()
+        spare_car = Car(model='Spare', year=2025, license_plate='SPARE-1', daily_rate=60, category='Sedan',
+                        display_order=99999)
+        spare_customer = Customer(name='Never Booked', phone='+269 3488888', license_number='LIC-S',
+                                  nin_passport_number='NIN-S')
+        spare_employee = User(email='spare@carrent.com', name='Spare', password='x', employee_id='EMP009',
+                              role='secretary', is_active=False)
+        agency = User(email='agency@carrent.com', name='Agency', password='x', employee_id='AG001', role='agency')
+        db.session.add_all([spare_car, spare_customer, spare_employee, agency])
+        db.session.flush()
+        image = CarImage(car_id=spare_car.id, image_path=blobs.put_bytes(_png(), 'png'))
+        db.session.add_all([image, AgencyVisibleCar(agency_id=agency.id, car_id=spare_car.id)])
+        db.session.commit()
+
+        ids = {
+            'car': Car.query.order_by(Car.id).first().id,
+            'spare_car': spare_car.id,
+            'car_order': [row[0] for row in db.session.query(Car.id).order_by(Car.id.desc())],
+            'booking': booking.id,
+            'booking_new_end': (booking.start_date + timedelta(days=1)).strftime('%Y-%m-%d'),
+            'customer': booking.customer_id,
+            'spare_customer': spare_customer.id,
+            'maintenance': Maintenance.query.first().id,
+            'income': Income.query.first().id,
+            'expense': Expense.query.first().id,
+            'spare_employee': spare_employee.id,
+            'agency': agency.id,
+            'image': image.id,
+            'media': image.image_path[len(blobs.BLOB_PREFIX):]
+        }
+        users = {'admin': app.config['ADMIN_ID'], 'agency': agency.id}
+    return ids, users
+
+
+def _fill(value, ids):
+    # Placeholders in payloads; a lone placeholder keeps the id's type
+    if isinstance(value, str):
+        if value.startswith('{') and value.endswith('}') and value[1:-1] in ids:
+            return ids[value[1:-1]]
+        return value.format(**ids)
+    if isinstance(value, list):
+        return [_fill(item, ids) for item in value]
+    if isinstance(value, dict):
+        return {key: _fill(item, ids) for key, item in value.items()}
+    return value
+
+
+def _request_options(options, ids):
+    options = _fill(options, ids)
+    if 'data' in options:
+        # Form fields are strings; 'png' in images uploads a picture
+        data = {key: [str(item) for item in value] if isinstance(value, list) else str(value)
+                for key, value in options['data'].items()}
+        if data.get('images') == 'png':
+            data['images'] = (io.BytesIO(_png()), 'car.png')
+        options = dict(options, data=data)
+    return options
+
+
+def test_every_route_is_covered(app):
+    tested = {(endpoint, method) for endpoint, method, *_ in ROUTES}
+    routes = {(rule.endpoint, method) for rule in app.url_map.iter_rules()
+              for method in rule.methods - {'HEAD', 'OPTIONS'}}
+
+    assert routes - tested == set()
+
+
+@pytest.mark.parametrize('endpoint, method, url, options, user, status, expected', ROUTES,
+                         ids=[f'{method} {url} as {user or "anonymous"}' for _, method, url, _, user, *_ in ROUTES])
+def test_route(app, routes, endpoint, method, url, options, user, status, expected):
+    ids, users = routes
+    client = app.test_client()
+    if user:
+        login(client, users[user])
+
+    with statements(app) as executed:
+        response = client.open(url.format(**ids), method=method, **_request_options(options, ids))
+
+    assert response.status_code == status, response.get_data()[:500]
+    # Form posts answer with a redirect either way; a failure flashes danger
+    with client.session_transaction() as session:
+        assert [message for category, message in session.get('_flashes', []) if category == 'danger'] == []
+    assert len(executed) == expected
@@ -0,0 +1,105 @@
+from app import blobs
+from app.storage import CACHE_CONTROL, S3Storage
+import os
+import pytest
+import time
+
+moto = pytest.importorskip('moto')
+
+BUCKET = 'car-images'
+PNG = b'\x89PNG\r\n\x1a\n' + b'image bytes'
+
+
+@pytest.fixture
+def s3(app, context, monkeypatch):
+    """
+    The S3 backend on an in-process bucket, installed as the app's image
+    storage.
+    """
+    for name, value in (('AWS_ACCESS_KEY_ID', 'testing'), ('AWS_SECRET_ACCESS_KEY', 'testing'),
+                        ('AWS_DEFAULT_REGION', 'us-east-1')):
+        monkeypatch.setenv(name, value)
+    with moto.mock_aws():
+        backend = S3Storage(BUCKET, region='us-east-1')
+        backend.client.create_bucket(Bucket=BUCKET)
+        app.extensions['image_storage'] = backend
+        yield backend
+
+
+def _put(s3, tmp_path, key, data=PNG):
+    temp_path = tmp_path / 'upload'
+    temp_path.write_bytes(data)
+    s3.put_file(key, str(temp_path))
+    return temp_path
+
+
+def test_put_file_uploads_and_consumes_the_file(s3, tmp_path):
+    temp_path = _put(s3, tmp_path, 'static/blobs/ab/abc.png')
+
+    assert not temp_path.exists()
+    assert s3.exists('static/blobs/ab/abc.png')
+    with s3.open('static/blobs/ab/abc.png') as stored:
+        assert stored.read() == PNG
+        # Image decoders seek
+        stored.seek(0)
+    assert s3.size('static/blobs/ab/abc.png') == len(PNG)
+    head = s3.client.head_object(Bucket=BUCKET, Key='static/blobs/ab/abc.png')
+    assert (head['ContentType'], head['CacheControl']) == ('image/png', CACHE_CONTROL)
+
+
+def test_missing_objects(s3):
+    assert not s3.exists('static/blobs/none.png')
+    assert s3.size('static/blobs/none.png') is None
+    assert s3.modified('static/blobs/none.png') is None
+    assert s3.touch('static/blobs/none.png') is False
+    # Deleting what is not there is not an error
+    s3.delete('static/blobs/none.png')
+
+
+def test_keys_lists_a_prefix(s3, tmp_path):
+    for key in ('static/blobs/ab/one.png', 'static/blobs/cd/two.jpg', 'static/uploads/three.png'):
+        _put(s3, tmp_path, key)
+
+    assert sorted(s3.keys('static/blobs/')) == ['static/blobs/ab/one.png', 'static/blobs/cd/two.jpg']
+
+
+def test_delete(s3, tmp_path):
+    _put(s3, tmp_path, 'static/blobs/ab/abc.png')
+
+    s3.delete('static/blobs/ab/abc.png')
+
+    assert not s3.exists('static/blobs/ab/abc.png')
+    assert list(s3.keys('static/blobs/')) == []
+
+
+def test_modified_and_touch(s3, tmp_path):
+    started = time.time()
+    _put(s3, tmp_path, 'static/blobs/ab/abc.png')
+
+    # LastModified has a one second resolution
+    assert started - 1 <= s3.modified('static/blobs/ab/abc.png') <= time.time() + 1
+    assert s3.touch('static/blobs/ab/abc.png') is True
+    head = s3.client.head_object(Bucket=BUCKET, Key='static/blobs/ab/abc.png')
+    assert (head['ContentType'], head['CacheControl']) == ('image/png', CACHE_CONTROL)
+    assert s3.size('static/blobs/ab/abc.png') == len(PNG)
+
+
+def test_urls(s3):
+    url = s3.url('static/blobs/ab/abc.png')
+    assert BUCKET in url and 'static/blobs/ab/abc.png' in url and 'Signature' in url
+
+    s3.public_url = 'https://cdn.example.com'
+    assert s3.url('static/blobs/ab/abc.png') == 'https://cdn.example.com/static/blobs/ab/abc.png'
+
+
+def test_blobs_are_stored_in_the_bucket(s3):
+    writer = blobs.BlobWriter('png')
+    writer.write(PNG)
+    # Staged in the temporary directory, and gone once uploaded
+    assert os.path.dirname(writer._temp_path) == s3.staging_dir()
+    path = writer.commit()
+
+    assert not os.path.exists(writer._temp_path)
+    assert s3.exists(path)
+    assert blobs.put_bytes(PNG, 'png') == path
+    assert list(s3.keys(blobs.BLOB_PREFIX)) == [path]
@@ -0,0 +1,121 @@
+from app import db, reports
+from app.models import Booking, Car, Maintenance
+from conftest import statements
+from datetime import datetime
+import pytest
+
+SPRING_2032 = (datetime(2032, 3, 1), datetime(2032, 4, 30))
+
+
+@pytest.fixture
+def van(context, admin_id):
+    """
+    The only van, booked and serviced around March and April 2032.
+    """
+    car = Car(model='Utility', year=2025, license_plate='VAN-1', daily_rate=100, category='Van')
+    db.session.add(car)
+    db.session.flush()
+
+    def book(start, end, cost, created, status='completed'):
+        db.session.add(Booking(employee_id=admin_id, customer_id=1, car_id=car.id, start_date=start, end_date=end,
+                               total_cost=cost, deposit_amount=0, status=status, created_at=created))
+
+    def service(start, end, status='completed'):
+        db.session.add(Maintenance(car_id=car.id, employee_id=admin_id, issue_description='Service',
+                                   status=status, start_date=start, end_date=end))
+
+    # Across the window start: 2 of its 5 days inside
+    book(datetime(2032, 2, 27), datetime(2032, 3, 2), 500, datetime(2032, 2, 20))
+    # Across the month edge: 2 days in March, 2 in April
+    book(datetime(2032, 3, 30), datetime(2032, 4, 2), 400, datetime(2032, 3, 20))
+    # One day, booked on the day
+    book(datetime(2032, 4, 10), datetime(2032, 4, 10), 100, datetime(2032, 4, 10))
+    book(datetime(2032, 4, 15), datetime(2032, 4, 20), 600, datetime(2032, 4, 1), status='cancelled')
+    # Across the window end: 2 of its 5 days inside
+    book(datetime(2032, 4, 29), datetime(2032, 5, 3), 500, datetime(2032, 4, 1), status='active')
+
+    service(datetime(2032, 2, 1), datetime(2032, 2, 5))
+    service(datetime(2032, 3, 10), datetime(2032, 3, 12))
+    # Completed without an end date: its start day only
+    service(datetime(2032, 3, 20), None)
+    # Still open: runs to the end of the window
+    service(datetime(2032, 4, 25), None, status='in_progress')
+    db.session.commit()
+    return car
+
+
+def test_utilisation_per_car(van):
+    [entry] = [entry for entry in reports.utilisation(*SPRING_2032) if entry['car_id'] == van.id]
+
+    assert entry['calendar_days'] == 61
+    assert entry['maintenance_days'] == 3 + 1 + 6
+    assert entry['available_days'] == 51
+    assert entry['rented_days'] == 2 + 4 + 1 + 2
+    assert entry['utilisation'] == pytest.approx(9 / 51)
+    assert entry['revenue'] == pytest.approx(200 + 400 + 100 + 200)
+    assert entry['revenue_per_available_day'] == pytest.approx(900 / 51)
+    # Only the bookings starting in the window count towards the averages
+    assert entry['bookings'] == 3
+    assert entry['avg_booking_days'] == pytest.approx((4 + 1 + 5) / 3)
+    assert entry['avg_lead_days'] == pytest.approx((10 + 0 + 28) / 3)
+
+
+def test_utilisation_per_category_matches_the_only_van(van):
+    report = reports.utilisation(*SPRING_2032, group_by='category')
+    [per_car] = [entry for entry in reports.utilisation(*SPRING_2032) if entry['car_id'] == van.id]
+    [per_category] = [entry for entry in report if entry['category'] == 'Van']
+
+    assert per_category['cars'] == 1
+    for key in ('calendar_days', 'maintenance_days', 'rented_days', 'utilisation', 'revenue', 'bookings'):
+        assert per_category[key] == pytest.approx(per_car[key])
+
+
+def test_utilisation_per_month_clips_to_each_month(van):
+    cars = Car.query.count()
+
+    march, april = reports.utilisation(*SPRING_2032, group_by='month')
+
+    assert (march['month'], april['month']) == ('2032-03', '2032-04')
+    assert (march['calendar_days'], april['calendar_days']) == (31 * cars, 30 * cars)
+    assert (march['maintenance_days'], april['maintenance_days']) == (4, 6)
+    assert (march['rented_days'], april['rented_days']) == (4, 5)
+    assert march['revenue'] == pytest.approx(200 + 200)
+    assert april['revenue'] == pytest.approx(200 + 100 + 200)
+    assert (march['bookings'], april['bookings']) == (1, 2)
+    assert (march['avg_booking_days'], april['avg_booking_days']) == (4, 3)
+    assert (march['avg_lead_days'], april['avg_lead_days']) == (10, 14)
+
+
+def test_booking_times_count_calendar_days(context, admin_id):
+    # From the afternoon of the window's last day to the next morning
+    car = Car(model='Late', year=2025, license_plate='LATE-1', daily_rate=100, category='Van')
+    db.session.add(car)
+    db.session.flush()
+    db.session.add(Booking(employee_id=admin_id, customer_id=1, car_id=car.id, start_date=datetime(2032, 6, 30, 15),
+                           end_date=datetime(2032, 7, 1, 9), total_cost=200, deposit_amount=0, status='active',
+                           created_at=datetime(2032, 6, 29, 18)))
+    db.session.commit()
+
+    [entry] = [entry for entry in reports.utilisation(datetime(2032, 6, 1), datetime(2032, 6, 30)) if entry['car_id'] == car.id]
+
+    assert (entry['rented_days'], entry['revenue'], entry['bookings']) == (1, 100.0, 1)
+    assert (entry['avg_booking_days'], entry['avg_lead_days']) == (2, 1)
+
+
+def test_month_buckets_are_clipped_to_the_window():
+    assert reports._buckets(datetime(2032, 1, 15), datetime(2032, 3, 10), by_month=True) == [
+        (datetime(2032, 1, 15), 0, 16),
+        (datetime(2032, 2, 1), 17, 45),
+        (datetime(2032, 3, 1), 46, 55)
+    ]
+    assert reports._buckets(datetime(2032, 1, 15), datetime(2032, 3, 10), by_month=False) == [
+        (datetime(2032, 1, 15), 0, 55)
+    ]
+
+
+def test_utilisation_runs_three_statements(app, van):
+    # The cars, the bookings and the maintenance records
+    with statements(app) as executed:
+        reports.utilisation(*SPRING_2032, group_by='month')
+
+    assert len(executed) == 3
@@ -5,9 +5,6 @@ import sys
 project_dir = os.path.abspath(os.path.dirname(__file__))
 sys.path.insert(0, project_dir)
 
-# Debugging: print Python path
-print("Python path:", sys.path)
-
 # Import config
 import config
 